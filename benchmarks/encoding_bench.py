@@ -0,0 +1,62 @@
+"""Encoding Benchmark - 对比 json.dumps(indent=2) 与紧凑编码的耗时和体积
+
+运行: python -m benchmarks.encoding_bench
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict
+
+from src.encoding import ResponseEncoder
+from src.types import Plan, PlanStep
+
+
+def _make_plan(step_count: int) -> Plan:
+    steps = [
+        PlanStep(
+            step_id=f"step_{i}",
+            tool_name=f"tool_{i % 17}",
+            domain=f"domain_{i % 5}",
+            parameters={"path": f"/data/项目/{i}.txt", "limit": i, "flags": ["a", "b", "c"]},
+            depends_on=[f"step_{i - 1}"] if i else [],
+            reasoning="读取上一步的输出并进行汇总 " * 3,
+            expected_output="summary text",
+        )
+        for i in range(step_count)
+    ]
+    return Plan(context_id="ctx_bench", query="benchmark query", steps=steps)
+
+
+def _legacy(plan: Plan) -> str:
+    result = {"success": True, "plan_id": plan.plan_id, "steps": [s.model_dump() for s in plan.steps]}
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
+
+def _bench(fn: Callable[[], str], rounds: int) -> Dict[str, Any]:
+    text = fn()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = (time.perf_counter() - start) / rounds
+    return {"us": elapsed * 1e6, "bytes": len(text.encode("utf-8"))}
+
+
+def main():
+    compact = ResponseEncoder()
+    pretty = ResponseEncoder(["*"])
+    print(f"{'steps':>6} {'variant':<10} {'us/op':>10} {'bytes':>10}")
+    for step_count in (1, 10, 100, 1000):
+        plan = _make_plan(step_count)
+        rounds = max(10, 20000 // step_count)
+        variants = {
+            "legacy": lambda: _legacy(plan),
+            "pretty": lambda: pretty.encode({"success": True, "plan_id": plan.plan_id, "steps": plan.steps}),
+            "compact": lambda: compact.encode({"success": True, "plan_id": plan.plan_id, "steps": plan.steps}),
+        }
+        for name, fn in variants.items():
+            stats = _bench(fn, rounds)
+            print(f"{step_count:>6} {name:<10} {stats['us']:>10.1f} {stats['bytes']:>10}")
+
+
+if __name__ == "__main__":
+    main()
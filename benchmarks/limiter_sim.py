@@ -0,0 +1,98 @@
+"""Limiter Simulation - 用注入延迟的本地桩后端验证自适应并发上限的收敛
+
+桩后端有固定的处理能力：并发不超过 capacity 时延迟为 base_latency，超过后按排队比例
+升高，超过 2*capacity 时返回429。固定并发（与 thread_pool_max_workers 相同的4）与
+自适应限制器在同样的客户端压力下对比吞吐、429数量与延迟。
+
+运行: python -m benchmarks.limiter_sim
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List
+
+from src.memory.limiter import AdaptiveLimiter
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class StubBackend:
+    """注入延迟的桩后端"""
+
+    def __init__(self, capacity: int, base_latency: float):
+        self.capacity = capacity
+        self.base_latency = base_latency
+        self.inflight = 0
+
+    async def call(self):
+        self.inflight += 1
+        try:
+            if self.inflight > 2 * self.capacity:
+                await asyncio.sleep(self.base_latency / 10)
+                raise RateLimitError("too many requests")
+            await asyncio.sleep(self.base_latency * max(1.0, self.inflight / self.capacity))
+        finally:
+            self.inflight -= 1
+
+
+class FixedLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def run(self):
+        async with self._semaphore:
+            yield
+
+
+async def _drive(backend: StubBackend, limiter, clients: int, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    limits: List[int] = []
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with limiter.run():
+                    await backend.call()
+                latencies.append(time.perf_counter() - start)
+            except RateLimitError:
+                errors += 1
+
+    async def sample_limit():
+        while time.perf_counter() < deadline:
+            limits.append(limiter.limit)
+            await asyncio.sleep(duration / 20)
+
+    await asyncio.gather(sample_limit(), *(client() for _ in range(clients)))
+    latencies.sort()
+    return {
+        "throughput": round(len(latencies) / duration, 1),
+        "errors_429": errors,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+        "limit_trace": limits,
+    }
+
+
+async def main():
+    for capacity in (2, 16):
+        print(f"== backend capacity={capacity}, 64 clients ==")
+        for name, limiter in (
+            ("fixed(4)", FixedLimiter(4)),
+            ("adaptive", AdaptiveLimiter("stub", initial_limit=4, max_limit=64)),
+        ):
+            backend = StubBackend(capacity=capacity, base_latency=0.02)
+            result = await _drive(backend, limiter, clients=64, duration=3.0)
+            print(f"{name:>10}: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
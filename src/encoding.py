@@ -0,0 +1,48 @@
+"""Encoding - MCP工具响应的JSON编码"""
+
+import os
+from typing import Any, Iterable, Optional
+
+from pydantic_core import to_json
+
+
+class ResponseEncoder:
+    """响应编码器 - 默认紧凑输出，可按客户端开启缩进
+
+    基于 pydantic_core.to_json，结果中的 BaseModel 直接序列化，无需先 model_dump 成中间字典；
+    非ASCII字符原样输出（等同 ensure_ascii=False）。
+    """
+
+    def __init__(self, pretty_clients: Optional[Iterable[str]] = None, indent: int = 2):
+        """初始化响应编码器
+
+        Args:
+            pretty_clients: 需要缩进输出的客户端名称（clientInfo.name），"*" 表示全部客户端
+            indent: 缩进空格数
+        """
+        self.pretty_clients = frozenset(name.strip().lower() for name in (pretty_clients or ()) if name.strip())
+        self.indent = indent
+
+    @classmethod
+    def from_env(cls) -> "ResponseEncoder":
+        """从环境变量 MCP_PRETTY_JSON_CLIENTS（逗号分隔的客户端名称）创建"""
+        return cls(os.getenv("MCP_PRETTY_JSON_CLIENTS", "").split(","))
+
+    def is_pretty(self, client_name: Optional[str]) -> bool:
+        """判断客户端是否需要缩进输出"""
+        if not self.pretty_clients:
+            return False
+        return "*" in self.pretty_clients or (client_name or "").lower() in self.pretty_clients
+
+    def encode(self, result: Any, client_name: Optional[str] = None) -> str:
+        """编码工具调用结果
+
+        Args:
+            result: 结果（字典/列表/BaseModel及其任意嵌套）
+            client_name: 客户端名称
+
+        Returns:
+            JSON字符串
+        """
+        indent = self.indent if self.is_pretty(client_name) else None
+        return to_json(result, indent=indent, fallback=str).decode("utf-8")
@@ -0,0 +1,144 @@
+"""EventBus - 变更事件的合并、节流与推送"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+
+class ServerEvent:
+    """已发布的事件"""
+
+    __slots__ = ("seq", "kind", "context_id", "data")
+
+    def __init__(self, seq: int, kind: str, context_id: str, data: Any):
+        self.seq = seq
+        self.kind = kind
+        self.context_id = context_id
+        self.data = data
+
+    def to_sse(self) -> str:
+        """编码为SSE消息"""
+        payload = to_json({"seq": self.seq, "context_id": self.context_id, "data": self.data},
+                          fallback=str).decode("utf-8")
+        return f"id: {self.seq}\nevent: {self.kind}\ndata: {payload}\n\n"
+
+
+class EventBus:
+    """事件总线 - 发布时按key合并，按固定间隔批量推送给订阅者
+
+    同一窗口内相同key的事件只保留最后一次，数据可以是延迟求值的函数（推送时才计算）。
+    订阅者队列溢出时不阻塞发布方，而是在下一批推送 resync 事件让其全量刷新。
+    没有订阅者时发布为空操作。
+    """
+
+    def __init__(self, interval: float = 0.5, history_size: int = 1024, queue_size: int = 256):
+        """初始化事件总线
+
+        Args:
+            interval: 推送间隔（秒）
+            history_size: 保留的已推送事件数量，用于断线重连（Last-Event-ID）补发
+            queue_size: 每个订阅者的队列长度
+        """
+        self.interval = interval
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple, Tuple[str, str, Any]] = {}
+        self._history: Deque[ServerEvent] = deque(maxlen=history_size)
+        self._subscribers: List[asyncio.Queue] = []
+        self._seq = 0
+        self._flusher: Optional[asyncio.Task] = None
+        self._stats = {"published": 0, "coalesced": 0, "delivered": 0, "resyncs": 0}
+
+    def publish(self, kind: str, context_id: str, data: Any = None, key: Optional[str] = None):
+        """发布事件
+
+        Args:
+            kind: 事件类型，如 context.created / context.deleted / tools.changed / plan.created / memory.write
+            context_id: 所属Context ID
+            data: 事件数据，或返回数据的无参函数（推送时求值）
+            key: 合并键，默认同一Context的同类事件合并
+        """
+        if not self._subscribers:
+            return
+        coalesce_key = (kind, context_id, key)
+        with self._lock:
+            if coalesce_key in self._pending:
+                self._stats["coalesced"] += 1
+            self._pending[coalesce_key] = (kind, context_id, data)
+            self._stats["published"] += 1
+
+    def _drain(self) -> List[ServerEvent]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        events = []
+        for kind, context_id, data in pending.values():
+            if callable(data):
+                try:
+                    data = data()
+                except Exception as e:
+                    print(f"Error building event {kind} for {context_id}: {str(e)}")
+                    continue
+            self._seq += 1
+            event = ServerEvent(self._seq, kind, context_id, data)
+            self._history.append(event)
+            events.append(event)
+        return events
+
+    async def _flush_loop(self):
+        """定时推送合并后的事件，订阅者全部断开后退出"""
+        while self._subscribers:
+            await asyncio.sleep(self.interval)
+            events = self._drain()
+            if not events:
+                continue
+            for queue in list(self._subscribers):
+                self._deliver(queue, events)
+        self._flusher = None
+
+    def _deliver(self, queue: asyncio.Queue, events: List[ServerEvent]):
+        if queue.qsize() + len(events) > self.queue_size:
+            # 订阅者跟不上，丢弃积压并要求全量刷新
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(ServerEvent(self._seq, "resync", "", None))
+            self._stats["resyncs"] += 1
+            return
+        for event in events:
+            queue.put_nowait(event)
+        self._stats["delivered"] += len(events)
+
+    async def subscribe(self, last_event_id: Optional[int] = None) -> AsyncIterator[ServerEvent]:
+        """订阅事件流
+
+        Args:
+            last_event_id: 客户端最后收到的事件序号，能补发时先补发，否则先推送resync
+
+        Yields:
+            事件
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        if last_event_id is not None and last_event_id < self._seq:
+            missed = [e for e in self._history if e.seq > last_event_id]
+            if missed and missed[0].seq == last_event_id + 1:
+                self._deliver(queue, missed)
+            else:
+                queue.put_nowait(ServerEvent(self._seq, "resync", "", None))
+        self._subscribers.append(queue)
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+
+    def subscriber_count(self) -> int:
+        """当前订阅者数量"""
+        return len(self._subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        """获取发布/合并/推送计数"""
+        return {**self._stats, "seq": self._seq, "subscribers": len(self._subscribers)}
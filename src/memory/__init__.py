@@ -1,7 +1,9 @@
 """Memory模块 - 封装ReMe的memory操作"""
 
 from .manager import MemoryManager
+from .resilience import FlowUnavailableError
 
 __all__ = [
     "MemoryManager",
+    "FlowUnavailableError",
 ]
@@ -0,0 +1,77 @@
+"""受限后端 - 为ReMe注册经自适应并发限制的LLM与Embedding后端
+
+注册名为 adaptive_openai_compatible，MemoryManager通过配置覆盖把默认后端切换为它。
+限制作用在单次请求上（flowllm的重试循环之内），每次重试都是一次独立的观测。
+Embedding后端另外合并并发请求为批量调用，并缓存最近的向量（见 embedding_batcher.py）。
+"""
+
+import os
+from typing import List
+
+from flowllm.core.context import C
+from flowllm.core.embedding_model import OpenAICompatibleEmbeddingModel
+from flowllm.core.llm import OpenAICompatibleLLM
+
+from .embedding_batcher import EmbeddingBatcher, get_batcher
+from .limiter import AdaptiveLimiter, get_limiter
+
+ADAPTIVE_BACKEND = "adaptive_openai_compatible"
+
+
+def _limiter(name: str) -> AdaptiveLimiter:
+    return get_limiter(
+        name,
+        initial_limit=int(os.getenv("ADAPTIVE_LIMIT_INITIAL", "4")),
+        max_limit=int(os.getenv("ADAPTIVE_LIMIT_MAX", "64")),
+    )
+
+
+@C.register_llm(ADAPTIVE_BACKEND)
+class AdaptiveOpenAICompatibleLLM(OpenAICompatibleLLM):
+    """并发受限的OpenAI兼容LLM"""
+
+    def __init__(self, model_name: str, **kwargs):
+        super().__init__(model_name=model_name, **kwargs)
+        self.limiter = _limiter(f"llm:{model_name}")
+
+    def _chat(self, *args, **kwargs):
+        with self.limiter.run_sync():
+            return super()._chat(*args, **kwargs)
+
+    async def _achat(self, *args, **kwargs):
+        async with self.limiter.run():
+            return await super()._achat(*args, **kwargs)
+
+
+@C.register_embedding_model(ADAPTIVE_BACKEND)
+class AdaptiveOpenAICompatibleEmbeddingModel(OpenAICompatibleEmbeddingModel):
+    """并发受限的OpenAI兼容Embedding模型"""
+
+    def __init__(self, model_name: str = "", **kwargs):
+        super().__init__(model_name=model_name, **kwargs)
+        self.limiter = _limiter(f"embedding:{model_name}")
+        self.batcher: EmbeddingBatcher = get_batcher(
+            f"{model_name}:{self.dimensions}",
+            lambda texts: OpenAICompatibleEmbeddingModel.get_embeddings(self, texts),
+            max_batch_size=self.max_batch_size,
+            max_wait=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")) / 1000,
+            cache_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+        )
+
+    def get_embeddings(self, input_text: str | List[str]):
+        if isinstance(input_text, str):
+            return self.batcher.embed([input_text])[0]
+        return self.batcher.embed(input_text)
+
+    async def async_get_embeddings(self, input_text: str | List[str]):
+        if isinstance(input_text, str):
+            return (await self.batcher.async_embed([input_text]))[0]
+        return await self.batcher.async_embed(input_text)
+
+    def _get_embeddings(self, input_text: str | List[str]):
+        with self.limiter.run_sync():
+            return super()._get_embeddings(input_text)
+
+    async def _async_get_embeddings(self, input_text: str | List[str]):
+        async with self.limiter.run():
+            return await super()._async_get_embeddings(input_text)
@@ -0,0 +1,185 @@
+"""EmbeddingBatcher - 合并并发请求的Embedding调用，并按内容哈希缓存最近的向量"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+class EmbeddingCache:
+    """按内容哈希的LRU缓存，向量以float32数组保存（每个1024维向量约4KB）"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return vector.tolist()
+
+    def put(self, key: str, vector: List[float]):
+        if self.max_entries <= 0:
+            return
+        packed = array("f", vector)
+        with self._lock:
+            self._data[key] = packed
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EmbeddingBatcher:
+    """Embedding微批处理器
+
+    并发调用方（线程池中的同步op与事件循环中的异步op）提交的文本先查缓存，未命中的文本
+    进入待处理队列；队列达到 max_batch_size 或最早的文本等待超过 max_wait 时，合并为
+    一次批量请求，结果按文本分发回各调用方。同一文本在请求中时只请求一次。
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], Optional[List[List[float]]]], namespace: str,
+                 max_batch_size: int = 10, max_wait: float = 0.005, cache_size: int = 4096,
+                 max_inflight_batches: int = 8):
+        """初始化
+
+        Args:
+            embed_batch: 批量获取向量的函数（同步），失败时抛出异常或返回None
+            namespace: 缓存键前缀（模型名与维度），不同模型的向量互不混用
+            max_batch_size: 单次请求最多包含的文本数
+            max_wait: 凑批的最长等待时间（秒）
+            cache_size: 缓存的向量数量
+            max_inflight_batches: 同时进行中的批量请求数
+        """
+        self.embed_batch = embed_batch
+        self.namespace = namespace
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cache = EmbeddingCache(cache_size)
+        self._pending: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_inflight_batches,
+                                            thread_name_prefix="embedding-batch")
+        self._stats = {"requests": 0, "texts": 0, "deduplicated": 0, "batches": 0, "batched_texts": 0,
+                       "batch_errors": 0}
+        self._flusher = threading.Thread(target=self._flush_loop, name="embedding-batcher", daemon=True)
+        self._flusher.start()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def submit(self, texts: List[str]) -> List[Future]:
+        """提交文本，返回与文本一一对应的Future（结果为向量）"""
+        futures = []
+        with self._condition:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+            for text in texts:
+                key = self._key(text)
+                vector = self.cache.get(key)
+                if vector is not None:
+                    future = Future()
+                    future.set_result(vector)
+                elif key in self._inflight:
+                    self._stats["deduplicated"] += 1
+                    future = self._inflight[key]
+                else:
+                    future = Future()
+                    self._inflight[key] = future
+                    self._pending[key] = (text, future, time.monotonic())
+                futures.append(future)
+            self._condition.notify()
+        return futures
+
+    def embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """同步获取向量"""
+        return [future.result() for future in self.submit(texts)]
+
+    async def async_embed(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """异步获取向量"""
+        return list(await asyncio.gather(*(asyncio.wrap_future(future) for future in self.submit(texts))))
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                oldest = next(iter(self._pending.values()))[2]
+                remaining = self.max_wait - (time.monotonic() - oldest)
+                if len(self._pending) < self.max_batch_size and remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                batch = []
+                while self._pending and len(batch) < self.max_batch_size:
+                    key, (text, future, _) = self._pending.popitem(last=False)
+                    batch.append((key, text, future))
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[tuple]):
+        try:
+            vectors = self.embed_batch([text for _, text, _ in batch])
+            error = None if vectors is not None and len(vectors) == len(batch) else \
+                RuntimeError("embedding backend returned no result")
+        except Exception as e:
+            vectors, error = None, e
+        with self._condition:
+            for key, _, _ in batch:
+                self._inflight.pop(key, None)
+            self._stats["batches"] += 1
+            self._stats["batched_texts"] += len(batch)
+            if error is not None:
+                self._stats["batch_errors"] += 1
+        for index, (key, _, future) in enumerate(batch):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                self.cache.put(key, vectors[index])
+                future.set_result(vectors[index])
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        return {
+            "namespace": self.namespace,
+            **self._stats,
+            "avg_batch_size": round(self._stats["batched_texts"] / batches, 2) if batches else 0.0,
+            "pending": len(self._pending),
+            "cache_entries": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(namespace: str, embed_batch: Callable[[List[str]], Optional[List[List[float]]]],
+                **kwargs) -> EmbeddingBatcher:
+    """获取（或创建）指定模型的批处理器，同一模型的所有实例共享批次与缓存"""
+    with _batchers_lock:
+        batcher = _batchers.get(namespace)
+        if batcher is None:
+            batcher = _batchers[namespace] = EmbeddingBatcher(embed_batch, namespace, **kwargs)
+        return batcher
+
+
+def batcher_stats() -> List[Dict[str, Any]]:
+    """本进程内全部批处理器的状态"""
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+    return [batcher.stats() for batcher in batchers]
@@ -0,0 +1,224 @@
+"""AdaptiveLimiter - 根据观测到的延迟与错误自适应调整后端并发上限"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+# 视为后端过载的HTTP状态码
+_OVERLOAD_STATUS = frozenset({429, 502, 503, 504})
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """判断异常是否表示后端过载（限流、超时、网关错误），其余异常不参与并发调整"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in _OVERLOAD_STATUS:
+        return True
+    name = type(error).__name__
+    return "RateLimit" in name or "Timeout" in name or "Connection" in name
+
+
+class _Waiter:
+    __slots__ = ("event", "loop", "future", "granted")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+        self.granted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdaptiveLimiter:
+    """梯度式自适应并发限制器
+
+    - 调用成功：以最近窗口内的最小延迟作为无负载基线（Vegas），比较短期延迟与基线，
+      延迟未升高时按 log10(limit)+1 增加上限，升高时按 基线/短期 的比例收缩（梯度）；
+      并发未用满一半时不调整
+    - 后端过载（429/超时/网关错误）：上限乘以 backoff_ratio（乘性减）
+
+    ReMe的op既有线程池中的同步调用也有事件循环中的异步调用，因此同时提供两种获取方式，
+    状态由线程锁保护。
+    """
+
+    def __init__(self, name: str, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 smoothing: float = 0.2, backoff_ratio: float = 0.75, tolerance: float = 1.2,
+                 baseline_window: int = 100):
+        """初始化限制器
+
+        Args:
+            name: 后端名称
+            initial_limit: 初始并发上限
+            min_limit: 并发上限下限
+            max_limit: 并发上限上限
+            smoothing: 每次成功调用对上限的调整幅度（0-1）
+            backoff_ratio: 过载时上限的乘性衰减系数
+            tolerance: 短期延迟超过基线的容忍倍数，在此范围内不收缩
+            baseline_window: 计算基线（最小）延迟的最近调用数，窗口滚动使基线能跟随后端变化
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self._limit = float(initial_limit)
+        self._inflight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+        self._short_rtt: Optional[float] = None
+        self._recent_rtts: Deque[float] = deque(maxlen=baseline_window)
+        self._stats = {"calls": 0, "drops": 0, "errors": 0, "limit_min": self._limit, "limit_max": self._limit}
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _try_acquire(self, waiter: Optional[_Waiter] = None) -> bool:
+        """尝试直接获取；失败时排队（需持有锁）"""
+        if not self._waiters and self._inflight < self.limit:
+            self._inflight += 1
+            return True
+        if waiter is not None:
+            self._waiters.append(waiter)
+        return False
+
+    def _grant_waiters(self):
+        """把空出的并发名额交给排队者（需持有锁）"""
+        while self._waiters and self._inflight < self.limit:
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._inflight += 1
+            waiter.wake()
+
+    def acquire_sync(self):
+        """在线程中获取一个并发名额（阻塞）"""
+        waiter = _Waiter()
+        with self._lock:
+            if self._try_acquire(waiter):
+                return
+        waiter.event.wait()
+
+    async def acquire(self):
+        """在事件循环中获取一个并发名额"""
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self._lock:
+            if self._try_acquire(waiter):
+                return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._inflight -= 1
+                    self._grant_waiters()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+
+    def release(self, rtt: Optional[float], dropped: bool = False):
+        """归还并发名额并根据本次调用结果调整上限
+
+        Args:
+            rtt: 本次调用耗时（秒），调用因非过载原因失败时传None（不参与调整）
+            dropped: 是否因后端过载失败
+        """
+        with self._lock:
+            inflight = self._inflight
+            self._inflight -= 1
+            self._stats["calls"] += 1
+            if dropped:
+                self._stats["drops"] += 1
+                self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+            elif rtt is None:
+                self._stats["errors"] += 1
+            else:
+                self._on_sample(rtt, inflight)
+            self._stats["limit_min"] = min(self._stats["limit_min"], self._limit)
+            self._stats["limit_max"] = max(self._stats["limit_max"], self._limit)
+            self._grant_waiters()
+
+    def _on_sample(self, rtt: float, inflight: int):
+        self._short_rtt = rtt if self._short_rtt is None else 0.5 * self._short_rtt + 0.5 * rtt
+        self._recent_rtts.append(rtt)
+        # 并发未用满一半时，延迟无法反映上限是否合适
+        if inflight < self._limit / 2:
+            return
+        baseline = min(self._recent_rtts)
+        gradient = max(0.5, min(1.0, self.tolerance * baseline / self._short_rtt))
+        new_limit = self._limit * gradient + math.log10(self._limit) + 1
+        self._limit = self._limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self._limit = max(self.min_limit, min(self.max_limit, self._limit))
+
+    @contextmanager
+    def run_sync(self):
+        """在线程中执行一次受限调用"""
+        self.acquire_sync()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.release(None, dropped=isinstance(e, Exception) and is_overload_error(e))
+            raise
+        self.release(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def run(self):
+        """在事件循环中执行一次受限调用"""
+        await self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.release(None, dropped=isinstance(e, Exception) and is_overload_error(e))
+            raise
+        self.release(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "limit": self.limit,
+                "inflight": self._inflight,
+                "queued": len(self._waiters),
+                "rtt_short_ms": round(self._short_rtt * 1000, 2) if self._short_rtt is not None else None,
+                "rtt_baseline_ms": round(min(self._recent_rtts) * 1000, 2) if self._recent_rtts else None,
+                **{key: round(value, 2) if isinstance(value, float) else value for key, value in self._stats.items()},
+            }
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, **kwargs) -> AdaptiveLimiter:
+    """获取（或创建）指定后端的限制器，同一后端的所有模型实例共享一个限制器"""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = AdaptiveLimiter(name, **kwargs)
+        return limiter
+
+
+def limiter_stats() -> List[Dict[str, Any]]:
+    """本进程内全部限制器的状态"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
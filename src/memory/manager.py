@@ -1,9 +1,21 @@
 """Memory管理器 - 封装ReMe的memory操作，支持Context隔离"""
 
+import asyncio
+import contextvars
+import hashlib
 import json
-from typing import List, Dict, Any, Optional
-
-from reme_ai import ReMeApp
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Iterable, List, Dict, Any, Optional, Set, Tuple
+
+from .embedding_batcher import batcher_stats
+from .limiter import limiter_stats
+from .pruning import TaskMemoryPruner
+from .resilience import FlowGuard, FlowUnavailableError
+from .scheduler import INTERACTIVE, FlowScheduler
+from .shards import LocalShard, ProcessShard, ShardSet
+from .tiers import RetrievalModeSelector
 
 from ..types import (
     ContextConfig,
@@ -12,41 +24,444 @@ from ..types import (
     generate_context_id,
 )
 
+# 会修改工作区内容的flow（vector_store按action区分），用于增量快照
+WRITE_FLOWS = frozenset({
+    "summary_task_memory",
+    "summary_task_memory_simple",
+    "summary_personal_memory",
+    "add_tool_call_result",
+    "summary_tool_memory",
+    "record_task_memory",
+    "delete_task_memory",
+})
+WRITE_VECTOR_STORE_ACTIONS = frozenset({"copy", "delete", "delete_ids", "load"})
+
+# 当前调用是否来自工作区水合本身（水合中的load调用不再等待水合）
+_hydrating = contextvars.ContextVar("memory_hydrating", default=False)
+
 
 class MemoryManager:
     """Memory管理器 - 支持Context隔离的memory操作"""
 
-    def __init__(self, llm_model: str, embedding_model: str, vector_store_backend: str = "memory", tool_registry = None):
+    def __init__(self, llm_model: str, embedding_model: str, vector_store_backend: str = "memory", tool_registry = None,
+                 shard_count: int = 1, shard_threads: Optional[int] = None, adaptive_concurrency: bool = True,
+                 lazy_start: bool = False):
+        """初始化
+
+        Args:
+            lazy_start: 快速启动，reme_ai的导入与ReMeApp启动推迟到第一次flow调用
+        """
         self.llm_model = llm_model
         self.embedding_model = embedding_model
         self.vector_store_backend = vector_store_backend
         self._base_workspace_id = "reme_mcp_workspace"
         self._contexts: Dict[str, ContextConfig] = {}
         self._tool_registry = tool_registry
+        # 多worker部署时的共享状态存储（SharedStateStore），单进程时为None
+        self._shared_state = None
+        # Context删除（本worker或其他worker）后的回调，用于清理其他组件中按Context保存的数据
+        self._removal_listeners: List[Callable[[str], None]] = []
 
         import os
         current_dir = os.path.dirname(os.path.abspath(__file__))
         config_file_path = os.path.join(current_dir, "config.yaml")
-        self._app = ReMeApp(
+        app_args = [
             f"llm.default.model_name={self.llm_model}",
             f"embedding_model.default.model_name={self.embedding_model}",
             f"vector_store.default.backend={self.vector_store_backend}",
-            config_path=config_file_path
+        ]
+        if shard_threads:
+            app_args.append(f"thread_pool_max_workers={shard_threads}")
+        self._app_args = app_args
+        self._config_path = config_file_path
+        self._shard_count = shard_count
+        self._adaptive_concurrency = adaptive_concurrency
+        self._app = None
+        self._shards: Optional[ShardSet] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._startup: Dict[str, Any] = {"state": "not_started", "lazy": lazy_start, "phases": {}}
+        # 交互类调用（检索、规划）优先于后台写入（总结、工具结果评估）占用LLM后端
+        self._scheduler = FlowScheduler.from_env(default_concurrency=(shard_threads or 4) * shard_count)
+        # 截止时间、对冲与熔断
+        self._guard = FlowGuard.from_env()
+        # 最近一次成功检索的记忆: (context_id, 记忆类型) -> 内容，后端不可用时作为降级结果
+        self._memory_cache: Dict[Tuple[str, str], str] = {}
+        # 自上次快照以来工作区被修改过的Context
+        self._dirty_contexts: Set[str] = set()
+        # 首次访问时才加载的持久化工作区: context_id -> 加载函数 / 进行中的加载
+        self._pending_hydration: Dict[str, Callable[[str], Awaitable[Any]]] = {}
+        self._hydrations: Dict[str, asyncio.Task] = {}
+        self._hydration_stats = {"hydrated": 0, "failed": 0, "total_ms": 0.0}
+        # 写时复制的fork: 子context_id -> 源context_id（首次写入子或源工作区前，子Context读取源工作区）
+        self._forks: Dict[str, str] = {}
+        self._materializing: Dict[str, asyncio.Task] = {}
+        self._fork_stats = {"forks": 0, "materialized": 0, "copy_ms": 0.0}
+        # 共享的智能体画像：profile_id -> 是否已写入画像工作区；相同画像的Context共用一个工作区
+        self._profiles: Dict[str, bool] = {}
+        self._profile_tasks: Dict[str, asyncio.Task] = {}
+        self._profile_stats = {"ingested": 0, "deduplicated": 0, "failed": 0, "pending_reads": 0,
+                               "raw_fallbacks": 0}
+        # 画像尚未写入时的检索方式：raw 直接使用画像原文；wait 触发写入并最多等待 profile_wait 秒，超时后使用原文
+        self._profile_pending_mode = os.getenv("PROFILE_PENDING_MODE", "raw")
+        self._profile_wait = float(os.getenv("PROFILE_PENDING_WAIT_MS", "2000")) / 1000
+        # 按质量档位、延迟预算与负载选择完整或快速检索flow
+        self._selector = RetrievalModeSelector(self._guard.p95, self._scheduler.overloaded,
+                                               probe_interval=float(os.getenv("RETRIEVAL_PROBE_INTERVAL", "30")))
+        self._migration_dir = os.path.join(tempfile.gettempdir(), "task-plan-mcp-server", "shard-migrations")
+        # 记录任务记忆的检索/使用情况，并定期删除低效用的任务记忆（尚未水合的工作区与未复制的fork不参与修剪）
+        self._pruner = TaskMemoryPruner.from_env(
+            self._execute,
+            lambda: {context_id: self._get_workspace_id(context_id) for context_id in self._contexts
+                     if context_id not in self._pending_hydration and context_id not in self._forks},
         )
-        self._app.start()
-
-    async def _get_app(self) -> ReMeApp:
-        """获取ReMeApp实例"""
+        if not lazy_start:
+            app = self._build_app()
+            with self._phase("app_start"):
+                app.start()
+            self._install_app(app)
+
+    @contextmanager
+    def _phase(self, name: str):
+        """记录启动阶段耗时"""
+        start = time.perf_counter()
+        yield
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        self._startup["phases"][name] = elapsed
+        print(f"Memory startup phase {name}: {elapsed}ms")
+
+    def _build_app(self):
+        """导入reme_ai并创建ReMeApp（分片0）"""
+        with self._phase("import_reme"):
+            from reme_ai import ReMeApp
+            # 注册自适应后端与自定义op（分片子进程在 _shard_main 中同样导入）
+            from . import ops  # noqa: F401
+            from .backends import ADAPTIVE_BACKEND
+        if self._adaptive_concurrency and ADAPTIVE_BACKEND not in "".join(self._app_args):
+            # LLM与Embedding请求经自适应并发限制，Embedding请求另外合并批处理（见 backends.py）
+            self._app_args.append(f"llm.default.backend={ADAPTIVE_BACKEND}")
+            self._app_args.append(f"embedding_model.default.backend={ADAPTIVE_BACKEND}")
+        with self._phase("app_init"):
+            return ReMeApp(*self._app_args, config_path=self._config_path)
+
+    def _install_app(self, app):
+        # 分片0使用本进程的ReMeApp，其余分片各自运行在子进程中
+        with self._phase("shards_start"):
+            shards = [LocalShard(app)]
+            shards.extend(ProcessShard(i, self._app_args, self._config_path) for i in range(1, self._shard_count))
+        self._app = app
+        self._shards = ShardSet(shards)
+        self._startup["state"] = "started"
+        self._startup["started_at"] = time.time()
+        self._startup.pop("error", None)
+
+    async def _ensure_started(self):
+        """快速启动模式下，第一次flow调用时导入reme_ai并启动ReMeApp
+
+        Raises:
+            FlowUnavailableError: 启动失败（下一次调用会重试）
+        """
+        if self._shards is not None:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._shards is not None:
+                return
+            self._startup["state"] = "starting"
+            try:
+                app = self._build_app()
+                with self._phase("app_start"):
+                    await app.async_start()
+                self._install_app(app)
+            except Exception as e:
+                self._startup["state"] = "failed"
+                self._startup["error"] = str(e)
+                print(f"Error starting memory backend: {str(e)}")
+                raise FlowUnavailableError("memory_backend", str(e)) from e
+
+    async def _get_app(self):
+        """获取ReMeApp实例（分片0）"""
+        await self._ensure_started()
         return self._app
 
+    def startup_status(self) -> Dict[str, Any]:
+        """记忆后端的启动状态、各阶段耗时与工作区水合统计"""
+        hydrated = self._hydration_stats["hydrated"]
+        return {
+            **self._startup,
+            "hydration": {
+                "pending": len(self._pending_hydration),
+                "in_progress": len(self._hydrations),
+                "hydrated": hydrated,
+                "failed": self._hydration_stats["failed"],
+                "avg_ms": round(self._hydration_stats["total_ms"] / hydrated, 2) if hydrated else 0.0,
+            },
+        }
+
+    def defer_hydration(self, context_id: str, loader: Callable[[str], Awaitable[Any]]):
+        """登记首次访问时才加载的持久化工作区
+
+        Args:
+            context_id: Context ID
+            loader: 加载函数，参数为context_id（内部通过load_memory写入工作区）
+        """
+        self._pending_hydration[context_id] = loader
+
+    async def _hydrate(self, context_id: str):
+        """等待Context的工作区加载完成，并发访问共享同一次加载
+
+        Raises:
+            FlowUnavailableError: 加载失败（下一次访问会重试）
+        """
+        if _hydrating.get():
+            return
+        task = self._hydrations.get(context_id)
+        if task is None:
+            loader = self._pending_hydration.pop(context_id, None)
+            if loader is None:
+                return
+            token = _hydrating.set(True)
+            try:
+                task = asyncio.ensure_future(self._run_hydration(context_id, loader))
+            finally:
+                _hydrating.reset(token)
+            self._hydrations[context_id] = task
+        await asyncio.shield(task)
+
+    async def _run_hydration(self, context_id: str, loader: Callable[[str], Awaitable[Any]]):
+        start = time.perf_counter()
+        try:
+            await loader(context_id)
+        except Exception as e:
+            self._hydration_stats["failed"] += 1
+            self._pending_hydration.setdefault(context_id, loader)
+            print(f"Error hydrating workspace for {context_id}: {str(e)}")
+            raise FlowUnavailableError("hydrate", str(e)) from e
+        finally:
+            self._hydrations.pop(context_id, None)
+        # 加载的内容与快照一致，无需重新导出
+        self._dirty_contexts.discard(context_id)
+        self._hydration_stats["hydrated"] += 1
+        self._hydration_stats["total_ms"] += (time.perf_counter() - start) * 1000
+
+    async def _execute(self, name: str, context_id: str, priority_class: Optional[str] = None, **kwargs) -> dict:
+        """经优先级调度后在Context所在的分片上执行flow，所有ReMe调用都经过这里
+
+        Args:
+            name: flow名称
+            context_id: Context ID，决定路由到哪个分片
+            priority_class: 优先级类别（interactive/background），默认按flow名称确定
+            **kwargs: flow参数
+
+        Returns:
+            flow结果（FlowResponse字典）
+
+        Raises:
+            FlowUnavailableError: 超过截止时间、flow处于熔断状态，或记忆后端/工作区尚不可用
+        """
+        await self._ensure_started()
+        action = kwargs.get("action") if name == "vector_store" else None
+        writes = name in WRITE_FLOWS or action in WRITE_VECTOR_STORE_ACTIONS
+        if writes or action == "dump":
+            await self._hydrate(context_id)
+            # 写时复制：写入前先为自身（未复制的fork）及以本工作区为源的fork复制工作区；
+            # dump不修改工作区，只需复制自身，仍共享本工作区的fork保持不复制
+            await self._materialize_fork(context_id)
+            if writes:
+                for child in [child for child, source in self._forks.items() if source == context_id]:
+                    await self._materialize_fork(child)
+            return await self._run(name, context_id, priority_class, writes, kwargs)
+        # 未复制的fork直接读取源工作区
+        route = self._forks.get(context_id, context_id)
+        if route != context_id and kwargs.get("workspace_id") == self._get_workspace_id(context_id):
+            kwargs["workspace_id"] = self._get_workspace_id(route)
+        await self._hydrate(route)
+        return await self._run(name, route, priority_class, False, kwargs)
+
+    async def _run(self, name: str, context_id: str, priority_class: Optional[str], writes: bool,
+                   kwargs: Dict[str, Any]) -> dict:
+        action = kwargs.get("action") if name == "vector_store" else None
+
+        def call():
+            return self._shards.execute(context_id, name, **kwargs)
+
+        async def hedge_call():
+            # 对冲调用同样占用后端，另占一个调度槽位
+            async with self._scheduler.slot(name, priority_class, action):
+                return await call()
+
+        try:
+            async with self._scheduler.slot(name, priority_class, action):
+                return await self._guard.execute(name, call, hedge_call)
+        finally:
+            if writes:
+                # 调用结束后标记，快照导出期间完成的写入会留到下一次快照
+                self._dirty_contexts.add(context_id)
+
+    def fork_source(self, context_id: str) -> Optional[str]:
+        """未复制工作区的fork读取的源Context，已复制或不是fork时返回None"""
+        return self._forks.get(context_id)
+
+    def restore_fork(self, context_id: str, source_context_id: str):
+        """恢复未复制工作区的fork关系（从快照恢复时调用）"""
+        self._forks[context_id] = source_context_id
+
+    async def _materialize_fork(self, context_id: str):
+        """为未复制的fork复制源工作区，并发调用共享同一次复制"""
+        task = self._materializing.get(context_id)
+        if task is None:
+            source = self._forks.get(context_id)
+            if source is None:
+                return
+            task = self._materializing[context_id] = asyncio.ensure_future(self._copy_workspace(source, context_id))
+        await asyncio.shield(task)
+
+    async def _copy_workspace(self, source: str, context_id: str):
+        """复制工作区：同一分片上使用vector_store copy，跨分片时源分片dump、目标分片load"""
+        start = time.perf_counter()
+        try:
+            await self._hydrate(source)
+            src_workspace_id = self._get_workspace_id(source)
+            workspace_id = self._get_workspace_id(context_id)
+            if self._shards.shard_for(source) == self._shards.shard_for(context_id):
+                await self._run("vector_store", context_id, None, True, {
+                    "workspace_id": workspace_id, "action": "copy", "src_workspace_id": src_workspace_id})
+            else:
+                import os
+                os.makedirs(self._migration_dir, exist_ok=True)
+                with tempfile.TemporaryDirectory(prefix="fork-", dir=self._migration_dir) as directory:
+                    # 跨分片复制的dump同样由等待fork的调用阻塞，按交互类别调度
+                    await self._run("vector_store", source, INTERACTIVE, False, {
+                        "workspace_id": src_workspace_id, "action": "dump", "path": directory})
+                    dumped = os.path.join(directory, f"{src_workspace_id}.jsonl")
+                    if os.path.exists(dumped):
+                        os.replace(dumped, os.path.join(directory, f"{workspace_id}.jsonl"))
+                        await self._run("vector_store", context_id, None, True, {
+                            "workspace_id": workspace_id, "action": "load", "path": directory})
+            self._forks.pop(context_id, None)
+            self._fork_stats["materialized"] += 1
+            self._fork_stats["copy_ms"] += (time.perf_counter() - start) * 1000
+        finally:
+            self._materializing.pop(context_id, None)
+
+    def fork_stats(self) -> Dict[str, Any]:
+        """fork数量、仍共享源工作区的fork数与工作区复制耗时"""
+        materialized = self._fork_stats["materialized"]
+        return {
+            "forks": self._fork_stats["forks"],
+            "sharing_source": len(self._forks),
+            "materialized": materialized,
+            "avg_copy_ms": round(self._fork_stats["copy_ms"] / materialized, 2) if materialized else 0.0,
+        }
+
+    def dirty_contexts(self) -> Set[str]:
+        """自上次快照以来工作区被修改过的Context"""
+        return set(self._dirty_contexts)
+
+    def take_dirty_contexts(self) -> Set[str]:
+        """取出并清空被修改过的Context集合（快照开始时调用）"""
+        dirty, self._dirty_contexts = self._dirty_contexts, set()
+        return dirty
+
+    def mark_dirty_contexts(self, context_ids: Iterable[str]):
+        """重新标记Context为已修改（快照导出失败时调用）"""
+        self._dirty_contexts.update(context_ids)
+
+    def scheduler_stats(self) -> Dict[str, Any]:
+        """各优先级类别的排队、运行与等待时间统计"""
+        return self._scheduler.stats()
+
+    def flow_p95(self, name: str) -> Optional[float]:
+        """flow近期p95延迟（秒），无样本时返回None"""
+        return self._guard.p95(name)
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        """各flow的p95延迟、对冲次数与熔断状态"""
+        return self._guard.stats()
+
+    def embedding_stats(self) -> List[Dict[str, Any]]:
+        """Embedding批处理与向量缓存统计（本进程分片）"""
+        return batcher_stats()
+
+    def limiter_stats(self) -> List[Dict[str, Any]]:
+        """LLM/Embedding后端的当前并发上限与延迟统计（本进程分片）"""
+        return limiter_stats()
+
+    def pruning_stats(self) -> Dict[str, Any]:
+        """任务记忆使用记录与修剪统计（含各工作区修剪前后的规模）"""
+        return self._pruner.stats()
+
+    def start_pruner(self):
+        """启动后台修剪（需在事件循环中调用）"""
+        self._pruner.start()
+
+    def bind_task_memories(self, context_id: str, plan_id: str):
+        """把Context最近一次检索返回的任务记忆绑定到计划，等待执行反馈"""
+        self._pruner.bind(context_id, plan_id)
+
+    def record_plan_feedback(self, plan_id: str, success: bool):
+        """计划执行反馈：全部步骤成功时，计划所用的任务记忆记为有效"""
+        self._pruner.feedback(plan_id, success)
+
+    async def prune_task_memory(self, context_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """立即写入使用记录并修剪任务记忆
+
+        Args:
+            context_id: 只修剪指定Context（可选），默认全部
+
+        Returns:
+            context_id -> 修剪前后的工作区规模
+        """
+        if context_id is None:
+            return await self._pruner.run_once()
+        await self._pruner.flush()
+        return {context_id: await self._pruner.prune(context_id, self._get_workspace_id(context_id))}
+
+    def shard_stats(self) -> List[Dict[str, Any]]:
+        """各分片负载（调用数、进行中、平均耗时、承载的Context数等）"""
+        if self._shards is None:
+            return []
+        return self._shards.load_report(list(self._contexts.keys()))
+
+    async def move_context(self, context_id: str, shard: int) -> bool:
+        """将Context的工作区迁移到指定分片（通过vector_store dump/load），用于隔离重负载租户
+
+        Args:
+            context_id: Context ID
+            shard: 目标分片编号
+
+        Returns:
+            是否发生了迁移
+        """
+        await self._ensure_started()
+        if not 0 <= shard < len(self._shards.shards):
+            raise ValueError(f"shard {shard} does not exist")
+        return await self._shards.move(context_id, self._get_workspace_id(context_id), shard,
+                                       self._migration_dir)
+
+    async def add_shard(self) -> Dict[str, int]:
+        """新增一个子进程分片并重新平衡哈希环
+
+        Returns:
+            被迁移的 context_id（或画像ID） -> 目标分片编号
+        """
+        await self._ensure_started()
+        index = len(self._shards.shards)
+        self._shards.add_shard(ProcessShard(index, self._app_args, self._config_path))
+        # 共享画像工作区同样按profile_id路由，需与Context工作区一起迁移
+        workspaces = {key: self._get_workspace_id(key) for key in [*self._contexts, *self.profile_ids()]}
+        return await self._shards.rebalance(workspaces, self._migration_dir)
+
     def _get_workspace_id(self, context_id: str) -> str:
         """根据context_id生成workspace_id"""
         return f"{self._base_workspace_id}_{context_id}"
 
     async def close(self):
-        """关闭App实例"""
-        if self._app:
-            await self._app.stop()
+        """关闭App实例及全部分片"""
+        await self._pruner.stop()
+        if self._shards is not None:
+            await self._shards.close()
+            self._shards = None
             self._app = None
 
     def create_context(self, name: str = "", description: str = "", agent_info: Optional[Dict[str, Any]] = None,
@@ -73,9 +488,148 @@ class MemoryManager:
             metadata=metadata or {},
             parent_context_id=parent_context_id,
         )
+        if agent_info:
+            # 引用共享画像工作区，画像内容由 ensure_agent_profile 写入
+            profile_id = self.agent_profile_id(agent_info)
+            config.metadata["agent_profile"] = profile_id
+            self._profiles.setdefault(profile_id, False)
         self._contexts[context_id] = config
+        if self._shared_state is not None:
+            self._shared_state.put_context(config)
+        if self._tool_registry and parent_context_id:
+            # 子Context沿父链继承工具，无需客户端重复注册
+            self._tool_registry.set_parent(context_id, parent_context_id)
+        return config
+
+    def fork_context(self, source_context_id: str, name: str = "", description: str = "",
+                     metadata: Optional[Dict[str, Any]] = None) -> ContextConfig:
+        """从已有Context派生新Context，子Agent无需重新总结或递归检索即可使用源Context的记忆
+
+        工具：源Context（含继承）的工具直接登记到新Context，定义按内容哈希驻留，不重复占用内存。
+        记忆：写时复制，新Context在其自身或源Context首次写入前直接读取源工作区，
+        首次写入时通过vector_store copy复制工作区（含personal/task/tool记忆）。
+
+        Args:
+            source_context_id: 源Context ID
+            name: 新Context名称，默认沿用源名称
+            description: 新Context描述，默认沿用源描述
+            metadata: 元数据（与源元数据合并）
+
+        Returns:
+            新Context配置，metadata.forked_from 记录源Context
+        """
+        source = self.get_context(source_context_id)
+        if source is None:
+            raise ValueError(f"context {source_context_id} does not exist")
+        config = self.create_context(
+            name=name or source.name,
+            description=description or source.description,
+            agent_info=source.agent_info,
+            metadata={**source.metadata, **(metadata or {}), "forked_from": source_context_id},
+        )
+        # 源Context自身也是未复制的fork时，直接指向最初的源工作区
+        self._forks[config.context_id] = self._forks.get(source_context_id, source_context_id)
+        self._fork_stats["forks"] += 1
+        if self._tool_registry:
+            tools = list(self._tool_registry.list_tools(source_context_id))
+            if tools:
+                self._tool_registry.register_batch(tools, config.context_id)
         return config
 
+    @staticmethod
+    def agent_profile_text(agent_info: Dict[str, Any]) -> str:
+        """由智能体信息生成画像文本（不含Context描述，相同智能体/终端的画像文本相同）"""
+        env_info = agent_info.get("environment", {})
+        env_str = ", ".join([f"{k.replace('_version', '')}: {v}" for k, v in env_info.items() if v]) if env_info else None
+        content_parts = [
+            f"Agent Name: {agent_info.get('name', 'N/A')}",
+            f"Agent Role: {agent_info.get('role', 'N/A')}",
+            f"Terminal User: {agent_info.get('terminal_user', 'N/A')}",
+            f"Terminal Type: {agent_info.get('terminal_type', 'N/A')}",
+            f"Environment: {env_str if env_str else 'N/A'}",
+        ]
+        return "\n".join(content_parts)
+
+    @classmethod
+    def agent_profile_id(cls, agent_info: Dict[str, Any]) -> str:
+        """画像ID：画像文本的哈希，同时作为画像工作区的路由键"""
+        digest = hashlib.sha256(cls.agent_profile_text(agent_info).encode("utf-8")).hexdigest()
+        return f"profile_{digest[:16]}"
+
+    async def ensure_agent_profile(self, context_id: str,
+                                   metadata: Optional[Dict[str, Any]] = None) -> Optional[MemoryOperationResult]:
+        """把Context引用的智能体画像写入共享画像工作区，画像已存在时直接复用
+
+        相同画像只经 summary_personal_memory 总结一次，并发调用共享同一次写入。
+
+        Args:
+            context_id: Context ID
+            metadata: 元数据
+
+        Returns:
+            操作结果，Context没有智能体信息时返回None
+        """
+        config = self.get_context(context_id)
+        profile_id = config.metadata.get("agent_profile") if config else None
+        if not profile_id:
+            return None
+        if self._profiles.get(profile_id):
+            self._profile_stats["deduplicated"] += 1
+            return MemoryOperationResult(success=True, message="Agent profile already stored",
+                                         memory_type="personal", context_id=context_id)
+        task = self._profile_tasks.get(profile_id)
+        if task is None:
+            task = self._profile_tasks[profile_id] = asyncio.ensure_future(
+                self._ingest_profile(profile_id, self.agent_profile_text(config.agent_info), metadata))
+        else:
+            self._profile_stats["deduplicated"] += 1
+        result = await asyncio.shield(task)
+        return result.model_copy(update={"context_id": context_id})
+
+    async def _ingest_profile(self, profile_id: str, text: str,
+                              metadata: Optional[Dict[str, Any]]) -> MemoryOperationResult:
+        try:
+            result = await self.set_personal_memory(profile_id, [{"role": "assistant", "content": text}], metadata)
+            if result.success:
+                self._profiles[profile_id] = True
+                self._profile_stats["ingested"] += 1
+            else:
+                self._profile_stats["failed"] += 1
+            return result
+        except Exception:
+            self._profile_stats["failed"] += 1
+            raise
+        finally:
+            self._profile_tasks.pop(profile_id, None)
+
+    def profile_ids(self) -> Set[str]:
+        """当前Context引用、且已写入的画像ID（画像工作区随快照保存）"""
+        referenced = {config.metadata.get("agent_profile") for config in self._contexts.values()}
+        return {profile_id for profile_id in referenced if profile_id and self._profiles.get(profile_id)}
+
+    def _context_profile(self, context_id: str) -> Optional[str]:
+        config = self.get_context(context_id)
+        profile_id = config.metadata.get("agent_profile") if config else None
+        return profile_id if profile_id and self._profiles.get(profile_id) else None
+
+    def profile_pending(self, context_id: str) -> bool:
+        """Context引用的画像是否尚未写入共享画像工作区"""
+        config = self.get_context(context_id)
+        profile_id = config.metadata.get("agent_profile") if config else None
+        return bool(profile_id) and not self._profiles.get(profile_id)
+
+    def profile_stats(self) -> Dict[str, Any]:
+        """共享画像数、引用画像的Context数与去重次数"""
+        referencing = sum(1 for config in self._contexts.values() if config.metadata.get("agent_profile"))
+        return {
+            **self._profile_stats,
+            "profiles": sum(1 for stored in self._profiles.values() if stored),
+            "pending": sum(1 for stored in self._profiles.values() if not stored),
+            "ingesting": len(self._profile_tasks),
+            "pending_mode": self._profile_pending_mode,
+            "referencing_contexts": referencing,
+        }
+
     def get_context(self, context_id: str) -> Optional[ContextConfig]:
         """获取Context配置
 
@@ -114,9 +668,88 @@ class MemoryManager:
         """
         if context_id in self._contexts:
             del self._contexts[context_id]
+            self._drop_memory_cache(context_id)
+            self._pruner.forget(context_id)
+            self._pending_hydration.pop(context_id, None)
+            self._forks.pop(context_id, None)
+            if self._shared_state is not None:
+                self._shared_state.delete_context(context_id)
+            self._notify_removed(context_id)
             return True
         return False
 
+    def subscribe_context_removed(self, listener: Callable[[str], None]):
+        """订阅Context删除，listener(context_id)"""
+        self._removal_listeners.append(listener)
+
+    def _notify_removed(self, context_id: str):
+        for listener in self._removal_listeners:
+            try:
+                listener(context_id)
+            except Exception as e:
+                print(f"Error notifying removal of context {context_id}: {str(e)}")
+
+    def attach_shared_state(self, shared_state):
+        """启用多worker共享状态，之后Context的创建/删除写穿到共享存储
+
+        Args:
+            shared_state: SharedStateStore实例
+        """
+        self._shared_state = shared_state
+
+    def adopt_context(self, config: ContextConfig):
+        """登记其他worker创建或快照恢复的Context（不写回共享存储）"""
+        self._contexts[config.context_id] = config
+        profile_id = config.metadata.get("agent_profile")
+        if profile_id:
+            # 画像工作区只存在于写入它的worker上：未在本worker写入或恢复的画像，由 ensure_agent_profile 在本地写入
+            self._profiles.setdefault(profile_id, False)
+
+    def restore_context(self, config: ContextConfig):
+        """登记从本worker快照恢复的Context，并写回共享存储（归属为本worker，其他worker据此转发调用）"""
+        self.adopt_context(config)
+        if self._shared_state is not None:
+            self._shared_state.put_context(config)
+
+    def restore_profile(self, profile_id: str):
+        """登记从本worker快照恢复（或延迟加载）的共享画像工作区"""
+        self._profiles[profile_id] = True
+
+    def forget_context(self, context_id: str):
+        """移除其他worker已删除的Context（不写回共享存储）"""
+        self._contexts.pop(context_id, None)
+        self._drop_memory_cache(context_id)
+        self._pruner.forget(context_id)
+        self._pending_hydration.pop(context_id, None)
+        self._forks.pop(context_id, None)
+        self._notify_removed(context_id)
+
+    def _drop_memory_cache(self, context_id: str):
+        for key in [key for key in self._memory_cache if key[0] == context_id]:
+            del self._memory_cache[key]
+
+    async def _retrieve_or_cached(self, context_id: str, kind: str, retrieve: Callable[[], Awaitable[str]],
+                                  degraded: List[str]) -> str:
+        """检索记忆，flow不可用时返回该Context最近一次成功检索的结果
+
+        Args:
+            context_id: Context ID
+            kind: 记忆类型
+            retrieve: 检索函数
+            degraded: 使用了缓存结果的记忆类型会追加到此列表
+
+        Returns:
+            记忆内容
+        """
+        try:
+            value = await retrieve()
+        except FlowUnavailableError as e:
+            print(f"Error retrieving {kind} for {context_id}, using cached memory: {str(e)}")
+            degraded.append(kind)
+            return self._memory_cache.get((context_id, kind), "")
+        self._memory_cache[(context_id, kind)] = value
+        return value
+
     async def clear_context(self, context_id: str) -> bool:
         """清空指定Context的所有记忆
 
@@ -126,10 +759,10 @@ class MemoryManager:
         Returns:
             是否成功
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        await app.async_execute(
-            name="vector_store",
+        await self._execute(
+            "vector_store",
+            context_id,
             workspace_id=workspace_id,
             action="delete",
         )
@@ -147,10 +780,10 @@ class MemoryManager:
         Returns:
             操作结果
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="summary_personal_memory",
+        result = await self._execute(
+            "summary_personal_memory",
+            context_id,
             trajectories=[
                 {"messages": messages, "score": 1.0},
             ],
@@ -178,10 +811,10 @@ class MemoryManager:
         Returns:
             操作结果
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="summary_task_memory",
+        result = await self._execute(
+            "summary_task_memory",
+            context_id,
             trajectories=[
                 {"messages": messages, "score": 1.0},
             ],
@@ -198,43 +831,185 @@ class MemoryManager:
             context_id=context_id,
         )
 
-    async def retrieve_personal_memory(self, context_id: str, query: str) -> str:
+    async def retrieve_personal_memory(self, context_id: str, query: str,
+                                       flow: str = "retrieve_personal_memory") -> str:
         """检索Personal Memory
 
         Args:
             context_id: Context ID
             query: 查询语句
+            flow: 检索flow（完整或快速变体）
 
         Returns:
-            检索到的记忆内容
+            检索到的记忆内容（含Context引用的共享智能体画像）
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="retrieve_personal_memory",
+        own = self._execute(
+            flow,
+            context_id,
             query=query,
             workspace_id=workspace_id,
         )
-        return result.get("answer", "") if result else ""
-
-    async def retrieve_task_memory(self, context_id: str, query: str) -> str:
+        if self.profile_pending(context_id):
+            result, profile = await asyncio.gather(own, self._pending_profile(context_id, query))
+            answer = result.get("answer", "") if result else ""
+            return "\n\n".join(part for part in (profile, answer) if part)
+        profile_id = self._context_profile(context_id)
+        if profile_id is None:
+            result = await own
+            return result.get("answer", "") if result else ""
+        result, profile = await asyncio.gather(own, self._retrieve_profile(context_id, profile_id, query))
+        answer = result.get("answer", "") if result else ""
+        return "\n\n".join(part for part in (profile, answer) if part)
+
+    async def _pending_profile(self, context_id: str, query: str) -> str:
+        """画像仍在后台写入时的画像内容：按配置等待写入完成，或直接使用画像原文"""
+        self._profile_stats["pending_reads"] += 1
+        if self._profile_pending_mode == "wait":
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.ensure_future(self.ensure_agent_profile(context_id))),
+                                       timeout=self._profile_wait)
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                print(f"Error ingesting agent profile for {context_id}: {str(e)}")
+            profile_id = self._context_profile(context_id)
+            if profile_id is not None:
+                return await self._retrieve_profile(context_id, profile_id, query)
+        self._profile_stats["raw_fallbacks"] += 1
+        config = self.get_context(context_id)
+        parts = [f"Context Description: {config.description}"] if config.description else []
+        parts.append(self.agent_profile_text(config.agent_info))
+        return "\n".join(parts)
+
+    async def _retrieve_profile(self, context_id: str, profile_id: str, query: str) -> str:
+        """检索共享画像工作区（仅向量检索，画像内容很少），附上Context自身的描述"""
+        try:
+            result = await self._execute(
+                "retrieve_personal_memory_simple",
+                profile_id,
+                query=query,
+                workspace_id=self._get_workspace_id(profile_id),
+            )
+            profile = result.get("answer", "") if result else ""
+        except Exception as e:
+            print(f"Error retrieving agent profile {profile_id}: {str(e)}")
+            profile = ""
+        config = self.get_context(context_id)
+        if config and config.description:
+            profile = "\n".join(part for part in (f"Context Description: {config.description}", profile) if part)
+        return profile
+
+    async def retrieve_task_memory(self, context_id: str, query: str,
+                                   flow: str = "retrieve_task_memory") -> str:
         """检索Task Memory
 
         Args:
             context_id: Context ID
             query: 查询语句
+            flow: 检索flow（完整或快速变体）
 
         Returns:
             检索到的记忆内容
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="retrieve_task_memory",
+        result = await self._execute(
+            flow,
+            context_id,
             workspace_id=workspace_id,
             query=query,
         )
-        return result.get("answer", "") if result else ""
+        if not result:
+            return ""
+        # 登记返回的记忆，绑定到计划并收到执行反馈后才统计频次与效用
+        self._pruner.returned(context_id, workspace_id, result.get("metadata", {}).get("memory_list", []))
+        return result.get("answer", "")
+
+    def _ancestors(self, context_id: str, max_depth: int) -> List[str]:
+        """Context及其最多max_depth级祖先，按层级由近及远"""
+        chain = [context_id]
+        config = self.get_context(context_id)
+        while config is not None and config.parent_context_id and len(chain) <= max_depth:
+            if config.parent_context_id in chain:
+                break
+            chain.append(config.parent_context_id)
+            config = self.get_context(config.parent_context_id)
+        return chain
+
+    async def retrieve_hierarchical_memory(self, context_id: str, query: str, max_depth: int = 2,
+                                           top_k: int = 10, depth_decay: float = 0.8) -> List[Dict[str, Any]]:
+        """在Context及其祖先的工作区上一次检索Personal与Task Memory
+
+        同一分片上的工作区在一次flow调用中检索，查询在每个分片上只Embedding一次；结果按
+        similarity * depth_decay ** depth 合并排序，跨层级按内容去重。
+
+        Args:
+            context_id: Context ID
+            query: 查询语句
+            max_depth: 最多包含的祖先层数
+            top_k: 返回的记忆数
+            depth_decay: 每上一层的得分衰减系数
+
+        Returns:
+            排序后的记忆列表，每条包含 context_id、depth、similarity 与衰减后的 score
+        """
+        await self._ensure_started()
+        # 未复制的fork读取源工作区；同一工作区只检索一次（取最近的层级）
+        routes: Dict[str, Tuple[str, int]] = {}
+        for depth, ancestor in enumerate(self._ancestors(context_id, max_depth)):
+            route = self._forks.get(ancestor, ancestor)
+            routes.setdefault(route, (ancestor, depth))
+        profile_id = self._context_profile(context_id)
+        if profile_id is not None:
+            # 共享的智能体画像与Context自身的记忆同层
+            routes.setdefault(profile_id, (profile_id, 0))
+        for route in routes:
+            await self._hydrate(route)
+        groups: Dict[int, List[str]] = {}
+        for route in routes:
+            groups.setdefault(self._shards.shard_for(route) if self._shards else 0, []).append(route)
+
+        async def search(group: List[str]) -> List[Dict[str, Any]]:
+            result = await self._execute(
+                "retrieve_hierarchical_memory",
+                group[0],
+                query=query,
+                workspace_ids=[self._get_workspace_id(route) for route in group],
+                depths=[routes[route][1] for route in group],
+                top_k=top_k,
+                depth_decay=depth_decay,
+            )
+            return (result or {}).get("metadata", {}).get("memory_list", [])
+
+        owners = {self._get_workspace_id(route): ancestor for route, (ancestor, _) in routes.items()}
+        merged: Dict[str, Dict[str, Any]] = {}
+        for memory_list in await asyncio.gather(*[search(group) for group in groups.values()]):
+            for memory in memory_list:
+                memory = memory.model_dump() if hasattr(memory, "model_dump") else dict(memory)
+                memory["context_id"] = owners.get(memory.get("workspace_id"), context_id)
+                existing = merged.get(memory.get("content"))
+                if existing is None or memory["score"] > existing["score"]:
+                    merged[memory.get("content")] = memory
+        memory_list = sorted(merged.values(), key=lambda memory: memory["score"], reverse=True)[:top_k]
+
+        # 本Context工作区的任务记忆计入检索频次与效用（与单工作区检索一致，score为相似度）
+        own = [{**{key: value for key, value in memory.items() if key not in ("context_id", "depth", "similarity")},
+                "score": memory["similarity"]}
+               for memory in memory_list if memory.get("depth") == 0 and memory.get("memory_type") == "task"]
+        if own and context_id not in self._forks:
+            self._pruner.returned(context_id, own[0]["workspace_id"], own)
+        return memory_list
+
+    @staticmethod
+    def _format_hierarchical(memory_list: List[Dict[str, Any]], memory_type: str) -> str:
+        """把分层检索结果中某类记忆格式化为文本"""
+        lines = []
+        for memory in memory_list:
+            if memory.get("memory_type") != memory_type:
+                continue
+            origin = "current context" if memory.get("depth") == 0 else f"ancestor level {memory.get('depth')}"
+            lines.append(f"- ({origin}, score={memory['score']:.3f}) {memory.get('content', '')}")
+        return "\n".join(lines)
 
     async def add_tool_call_result(self, context_id: str, tool_name: str,
                                     tool_input: Dict[str, Any], tool_output: Any,
@@ -253,10 +1028,10 @@ class MemoryManager:
         Returns:
             操作结果
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="add_tool_call_result",
+        result = await self._execute(
+            "add_tool_call_result",
+            context_id,
             workspace_id=workspace_id,
             tool_call_results=[
                 {
@@ -287,10 +1062,10 @@ class MemoryManager:
         Returns:
             检索到的工具使用记忆
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="retrieve_tool_memory",
+        result = await self._execute(
+            "retrieve_tool_memory",
+            context_id,
             workspace_id=workspace_id,
             tool_names=tool_name,
         )
@@ -310,10 +1085,10 @@ class MemoryManager:
         Returns:
             工具使用总结
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="summary_tool_memory",
+        result = await self._execute(
+            "summary_tool_memory",
+            context_id,
             workspace_id=workspace_id,
             tool_names=tool_name,
         )
@@ -366,11 +1141,11 @@ class MemoryManager:
         Returns:
             压缩后的消息列表及其他结果信息
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
 
-        result = await app.async_execute(
-            name="summary_working_memory",
+        result = await self._execute(
+            "summary_working_memory",
+            context_id,
             messages=messages,
             working_summary_mode=working_summary_mode,
             compact_ratio_threshold=compact_ratio_threshold,
@@ -414,11 +1189,11 @@ class MemoryManager:
         Returns:
             操作结果
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
         messages = [{"role": "user", "content": f"Clear task {task_id} memory"}]
-        result = await app.async_execute(
-            name="summary_task_memory",
+        result = await self._execute(
+            "summary_task_memory",
+            context_id,
             workspace_id=workspace_id,
             trajectories=[
                 {"messages": messages, "score": 0.0},
@@ -441,10 +1216,10 @@ class MemoryManager:
         Returns:
             操作结果
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="vector_store",
+        result = await self._execute(
+            "vector_store",
+            context_id,
             workspace_id=workspace_id,
             action="dump",
             path=path,
@@ -466,10 +1241,10 @@ class MemoryManager:
         Returns:
             操作结果
         """
-        app = await self._get_app()
         workspace_id = self._get_workspace_id(context_id)
-        result = await app.async_execute(
-            name="vector_store",
+        result = await self._execute(
+            "vector_store",
+            context_id,
             workspace_id=workspace_id,
             action="load",
             path=path,
@@ -482,8 +1257,11 @@ class MemoryManager:
         )
 
     async def get_combined_memory(self, context_id: str, query: str, summarize: bool = False,
-                                   include_parent: bool = False, max_depth: int = 2) -> Dict[str, str]:
-        """获取组合的memory（personal + task + tool）
+                                   include_parent: bool = False, max_depth: int = 2,
+                                   tier: Optional[str] = None,
+                                   latency_budget_ms: Optional[float] = None,
+                                   hierarchical: bool = False) -> Dict[str, Any]:
+        """获取组合的memory（personal + task + tool），三类记忆并发检索
 
         Args:
             context_id: Context ID
@@ -491,13 +1269,14 @@ class MemoryManager:
             summarize: 是否总结工具记忆
             include_parent: 是否包含父Context的memory
             max_depth: 最大递归深度
+            tier: 质量档位（auto/full/fast），auto在高负载时自动降级为快速flow
+            latency_budget_ms: 延迟预算（毫秒），tier=auto时完整flow近期p95超出预算则使用快速flow，tier=full时不降级
+            hierarchical: 与include_parent同用时，Personal/Task Memory改为在本Context及祖先工作区上
+                一次检索并合并排序（hierarchical_memory），不再逐层递归返回 parent_memory
 
         Returns:
-            组合的记忆内容
+            组合的记忆内容，retrieval_modes 记录每类记忆使用的flow
         """
-        personal = await self.retrieve_personal_memory(context_id, query)
-        task = await self.retrieve_task_memory(context_id, query)
-
         # 基于tool registry获取context注册的所有工具名
         tool_names = ""
         if self._tool_registry:
@@ -505,16 +1284,63 @@ class MemoryManager:
             if registered_tools:
                 tool_names = ",".join([tool.tool_name for tool in registered_tools])
 
-        if summarize:
-            tool_memory = await self.summarize_tool_memory(context_id, tool_names)
+        modes: Dict[str, Dict[str, str]] = {}
+
+        def select(section: str) -> str:
+            flow, reason = self._selector.select(section, tier, latency_budget_ms)
+            modes[section] = {"flow": flow, "reason": reason}
+            return flow
+
+        hierarchical = hierarchical and include_parent and max_depth > 0
+        if hierarchical:
+            for section in ("personal_memory", "task_memory"):
+                modes[section] = {"flow": "retrieve_hierarchical_memory", "reason": "hierarchical"}
+        else:
+            personal_flow = select("personal_memory")
+            task_flow = select("task_memory")
+        if summarize and select("tool_memory") == "summary_tool_memory":
+            retrieve_tools = lambda: self.summarize_tool_memory(context_id, tool_names)
         else:
-            tool_memory = await self.retrieve_tool_memory(context_id, tool_names)
+            modes.setdefault("tool_memory", {"flow": "retrieve_tool_memory", "reason": "requested"})
+            retrieve_tools = lambda: self.retrieve_tool_memory(context_id, tool_names)
+
+        degraded: List[str] = []
+        if hierarchical:
+            memory_list, tool_memory = await asyncio.gather(
+                self._retrieve_or_cached(context_id, "hierarchical_memory",
+                                         lambda: self.retrieve_hierarchical_memory(context_id, query, max_depth),
+                                         degraded),
+                self._retrieve_or_cached(context_id, "tool_memory", retrieve_tools, degraded),
+            )
+            memory_list = memory_list or []
+            result = {
+                "personal_memory": self._format_hierarchical(memory_list, "personal"),
+                "task_memory": self._format_hierarchical(memory_list, "task"),
+                "tool_memory": tool_memory,
+                "hierarchical_memory": memory_list,
+                "retrieval_modes": modes,
+            }
+            if degraded:
+                result["degraded"] = degraded
+            return result
+
+        personal, task, tool_memory = await asyncio.gather(
+            self._retrieve_or_cached(context_id, "personal_memory",
+                                     lambda: self.retrieve_personal_memory(context_id, query, personal_flow), degraded),
+            self._retrieve_or_cached(context_id, "task_memory",
+                                     lambda: self.retrieve_task_memory(context_id, query, task_flow), degraded),
+            self._retrieve_or_cached(context_id, "tool_memory", retrieve_tools, degraded),
+        )
 
         result = {
             "personal_memory": personal,
             "task_memory": task,
             "tool_memory": tool_memory,
+            "retrieval_modes": modes,
         }
+        if degraded:
+            # 后端不可用时返回的是缓存结果
+            result["degraded"] = degraded
 
         if include_parent and max_depth > 0:
             config = self.get_context(context_id)
@@ -524,7 +1350,9 @@ class MemoryManager:
                     query=query,
                     summarize=summarize,
                     include_parent=True,
-                    max_depth=max_depth - 1
+                    max_depth=max_depth - 1,
+                    tier=tier,
+                    latency_budget_ms=latency_budget_ms,
                 )
                 result["parent_memory"] = parent_memory
 
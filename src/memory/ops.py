@@ -0,0 +1,112 @@
+"""自定义ReMe op - 在模块导入时注册到flowllm，供 config.yaml 中的flow引用"""
+
+import asyncio
+import copy
+import json
+from typing import Any, Dict, List
+
+from flowllm.core.context import C
+from flowllm.core.op import BaseAsyncOp
+from reme_ai.schema.memory import vector_node_to_memory
+
+
+@C.register_op()
+class PruneTaskMemoryOp(BaseAsyncOp):
+    """按使用频率与效用筛选待删除的Task Memory
+
+    freq >= freq_threshold 且 utility/freq < utility_threshold 的任务记忆会被删除。
+    ReMe自带的DeleteMemoryOp从节点顶层元数据读取freq/utility（实际保存在记忆自身的
+    metadata JSON中）、遍历工作区内所有类型的记忆，并把结果写到UpdateVectorStoreOp
+    不读取的位置，因此改用此op。删除前后的工作区规模写入 response.metadata["prune_result"]。
+    """
+
+    file_path: str = __file__
+
+    async def async_execute(self):
+        workspace_id: str = self.context.workspace_id
+        freq_threshold: int = self.context.freq_threshold
+        utility_threshold: float = self.context.utility_threshold
+
+        nodes = await self.vector_store.async_list_workspace_nodes(workspace_id=workspace_id)
+        task_count = 0
+        deleted_memory_ids: List[str] = []
+        for node in nodes:
+            if node.metadata.get("memory_type") != "task":
+                continue
+            task_count += 1
+            try:
+                metadata = json.loads(node.metadata.get("metadata") or "{}")
+            except (TypeError, ValueError):
+                continue
+            freq = metadata.get("freq", 0)
+            utility = metadata.get("utility", 0)
+            if freq >= freq_threshold and freq > 0 and utility / freq < utility_threshold:
+                deleted_memory_ids.append(node.unique_id)
+
+        self.context.response.metadata["deleted_memory_ids"] = deleted_memory_ids
+        self.context.response.metadata["prune_result"] = {
+            "workspace_size_before": len(nodes),
+            "workspace_size_after": len(nodes) - len(deleted_memory_ids),
+            "task_count_before": task_count,
+            "task_count_after": task_count - len(deleted_memory_ids),
+            "deleted_count": len(deleted_memory_ids),
+        }
+
+
+@C.register_op()
+class HierarchicalRecallOp(BaseAsyncOp):
+    """在Context及其祖先的多个工作区上一次检索，合并为一个排序列表
+
+    查询只做一次Embedding。flowllm的向量库只接受文本查询、也没有跨工作区检索接口，
+    因此各工作区仍分别检索（在同一次flow调用中并发执行），检索使用共享底层存储的
+    向量库视图，其Embedding直接返回已算好的查询向量，不依赖Embedding缓存。
+    相似度按层级衰减（score = similarity * depth_decay ** depth），内容相同的记忆只保留
+    得分最高的一条。结果写入 response.metadata["memory_list"]。
+    """
+
+    file_path: str = __file__
+
+    async def async_execute(self):
+        query: str = self.context.query
+        workspace_ids: List[str] = self.context.workspace_ids
+        depths: List[int] = self.context.get("depths") or list(range(len(workspace_ids)))
+        top_k: int = self.context.get("top_k", 10)
+        depth_decay: float = self.context.get("depth_decay", 0.8)
+        memory_types: List[str] = self.context.get("memory_types") or ["personal", "task"]
+
+        query_vector = await self.vector_store.async_get_embeddings(query)
+        store = self._fixed_query_store(query_vector)
+        results = await asyncio.gather(*[
+            store.async_search(
+                query=query,
+                workspace_id=workspace_id,
+                top_k=top_k,
+                filter_dict={"metadata.memory_type": memory_types},
+            )
+            for workspace_id in workspace_ids
+        ])
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for workspace_id, depth, nodes in zip(workspace_ids, depths, results):
+            for node in nodes:
+                similarity = node.metadata.get("score") or 0.0
+                memory = vector_node_to_memory(node).model_dump()
+                memory.update(workspace_id=workspace_id, depth=depth, similarity=similarity,
+                              score=similarity * depth_decay ** depth)
+                existing = merged.get(memory["content"])
+                if existing is None or memory["score"] > existing["score"]:
+                    merged[memory["content"]] = memory
+
+        memory_list = sorted(merged.values(), key=lambda memory: memory["score"], reverse=True)[:top_k]
+        self.context.response.metadata["memory_list"] = memory_list
+
+    def _fixed_query_store(self, query_vector: List[float]):
+        """向量库的浅拷贝视图：共享底层存储与客户端，查询Embedding返回给定向量"""
+        store = copy.copy(self.vector_store)
+
+        async def async_get_embeddings(_query):
+            return query_vector
+
+        store.get_embeddings = lambda _query: query_vector
+        store.async_get_embeddings = async_get_embeddings
+        return store
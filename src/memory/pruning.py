@@ -0,0 +1,263 @@
+"""TaskMemoryPruner - 记录Task Memory的检索与使用情况，并定期删除低效用的任务记忆"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from .scheduler import BACKGROUND
+
+
+class TaskMemoryPruner:
+    """Task Memory使用记录与定期修剪
+
+    - 检索返回的任务记忆先按Context暂存；规划时绑定到计划，计划收到执行反馈后才记录
+      一次使用（freq+1，全部步骤成功时 utility+1）
+    - 未绑定计划的检索（界面读取、组合查询等），以及超过 plan_ttl 仍未收到反馈的计划
+      不记录：没有反馈就无法判断效用，计入频次会让不发送反馈的Agent最常用的记忆被删除
+    - 待写入的使用按工作区、记忆合并，最多 max_pending 条，达到上限时提前写入；写入时
+      每个工作区按是否有效分两批调用 record_task_memory（update_utility 对整批生效）
+    - 每隔 interval 秒先写入待记录的使用情况，再对每个工作区调用 delete_task_memory，
+      删除 freq >= freq_threshold 且 utility/freq < utility_threshold 的记忆，
+      并保留每次修剪前后的工作区规模
+    """
+
+    def __init__(self, execute: Callable[..., Awaitable[dict]], workspaces: Callable[[], Dict[str, str]],
+                 interval: float = 3600.0, freq_threshold: int = 5, utility_threshold: float = 0.5,
+                 plan_ttl: float = 3600.0, history_size: int = 50, max_pending: int = 10000):
+        """初始化
+
+        Args:
+            execute: flow执行函数（MemoryManager._execute）
+            workspaces: 返回当前 context_id -> workspace_id
+            interval: 修剪周期（秒），<=0 时不启动后台修剪
+            freq_threshold: 被检索次数达到此值的记忆才会被考虑删除
+            utility_threshold: utility/freq 低于此值时删除
+            plan_ttl: 计划等待执行反馈的最长时间（秒）
+            history_size: 每个工作区保留的修剪记录数
+            max_pending: 待写入的（工作区, 记忆）条目上限
+        """
+        self.execute = execute
+        self.workspaces = workspaces
+        self.interval = interval
+        self.freq_threshold = freq_threshold
+        self.utility_threshold = utility_threshold
+        self.plan_ttl = plan_ttl
+        self.history_size = history_size
+        self.max_pending = max_pending
+        # context_id -> (workspace_id, 最近一次检索返回的记忆)
+        self._returned: Dict[str, Tuple[str, List[dict]]] = {}
+        # plan_id -> (context_id, workspace_id, 记忆, 绑定时间)
+        self._plans: Dict[str, Tuple[str, str, List[dict], float]] = {}
+        # 待写入的使用记录: (context_id, workspace_id) -> 记忆键 -> [最近返回的记忆, 使用次数, 有效次数]
+        self._usage: Dict[Tuple[str, str], Dict[str, List[Any]]] = {}
+        self._pending = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._history: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"recorded": 0, "record_errors": 0, "expired_plans": 0, "usage_dropped": 0,
+                       "runs": 0, "deleted": 0, "prune_errors": 0}
+
+    @classmethod
+    def from_env(cls, execute: Callable[..., Awaitable[dict]],
+                 workspaces: Callable[[], Dict[str, str]]) -> "TaskMemoryPruner":
+        """从环境变量创建
+
+        TASK_MEMORY_PRUNE_INTERVAL: 修剪周期（秒，默认3600，0关闭）
+        TASK_MEMORY_PRUNE_FREQ_THRESHOLD: 频次阈值（默认5）
+        TASK_MEMORY_PRUNE_UTILITY_THRESHOLD: 效用比阈值（默认0.5）
+        TASK_MEMORY_PLAN_TTL: 计划等待反馈的时间（秒，默认3600）
+        TASK_MEMORY_MAX_PENDING_USAGE: 待写入的使用记录上限（默认10000）
+        """
+        import os
+        return cls(
+            execute,
+            workspaces,
+            interval=float(os.getenv("TASK_MEMORY_PRUNE_INTERVAL", "3600")),
+            freq_threshold=int(os.getenv("TASK_MEMORY_PRUNE_FREQ_THRESHOLD", "5")),
+            utility_threshold=float(os.getenv("TASK_MEMORY_PRUNE_UTILITY_THRESHOLD", "0.5")),
+            plan_ttl=float(os.getenv("TASK_MEMORY_PLAN_TTL", "3600")),
+            max_pending=int(os.getenv("TASK_MEMORY_MAX_PENDING_USAGE", "10000")),
+        )
+
+    def returned(self, context_id: str, workspace_id: str, memory_list: List[Any]):
+        """登记一次检索返回的任务记忆，覆盖此前未绑定计划的检索结果（不记录）"""
+        memory_dicts = []
+        for memory in memory_list:
+            memory = memory.model_dump() if hasattr(memory, "model_dump") else memory
+            if isinstance(memory, dict) and memory.get("memory_type", "task") == "task":
+                memory_dicts.append(memory)
+        if not memory_dicts:
+            return
+        self._returned[context_id] = (workspace_id, memory_dicts)
+
+    def bind(self, context_id: str, plan_id: str):
+        """把Context最近一次检索返回的记忆绑定到计划"""
+        returned = self._returned.pop(context_id, None)
+        if returned is not None:
+            self._plans[plan_id] = (context_id, returned[0], returned[1], time.monotonic())
+
+    def feedback(self, plan_id: str, success: bool):
+        """计划收到执行反馈，所用记忆按反馈结果记录"""
+        plan = self._plans.pop(plan_id, None)
+        if plan is None:
+            return
+        context_id, workspace_id, memory_dicts, _ = plan
+        usage = self._usage.setdefault((context_id, workspace_id), {})
+        for memory in memory_dicts:
+            key = str(memory.get("memory_id") or memory.get("content") or id(memory))
+            entry = usage.get(key)
+            if entry is None:
+                if self._pending >= self.max_pending:
+                    self._stats["usage_dropped"] += 1
+                    continue
+                entry = usage[key] = [memory, 0, 0]
+                self._pending += 1
+            entry[0] = memory
+            entry[1] += 1
+            entry[2] += 1 if success else 0
+        if self._pending >= self.max_pending and self._task is not None and self._flush_task is None:
+            # 达到上限时提前写入，不等下一次修剪周期
+            self._flush_task = asyncio.ensure_future(self._flush_early())
+
+    async def _flush_early(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error flushing task memory usage: {str(e)}")
+        finally:
+            self._flush_task = None
+
+    def forget(self, context_id: str):
+        """Context删除后丢弃其未写入的记录"""
+        self._returned.pop(context_id, None)
+        for plan_id in [plan_id for plan_id, plan in self._plans.items() if plan[0] == context_id]:
+            del self._plans[plan_id]
+        for key in [key for key in self._usage if key[0] == context_id]:
+            self._pending -= len(self._usage.pop(key))
+        self._history.pop(context_id, None)
+
+    async def flush(self) -> int:
+        """写入待记录的使用情况，并丢弃超过 plan_ttl 仍未收到反馈的计划
+
+        Returns:
+            写入的记忆条数
+        """
+        now = time.monotonic()
+        for plan_id in [plan_id for plan_id, plan in self._plans.items() if now - plan[3] > self.plan_ttl]:
+            del self._plans[plan_id]
+            self._stats["expired_plans"] += 1
+
+        usage, self._usage, self._pending = self._usage, {}, 0
+        recorded = 0
+        for (context_id, workspace_id), entries in usage.items():
+            for useful, memory_dicts in self._batches(entries.values()).items():
+                try:
+                    await self.execute(
+                        "record_task_memory",
+                        context_id,
+                        priority_class=BACKGROUND,
+                        workspace_id=workspace_id,
+                        memory_dicts=memory_dicts,
+                        update_utility=useful,
+                    )
+                    recorded += len(memory_dicts)
+                except Exception as e:
+                    self._stats["record_errors"] += 1
+                    print(f"Error recording task memory usage for {context_id}: {str(e)}")
+        self._stats["recorded"] += recorded
+        return recorded
+
+    @staticmethod
+    def _batches(entries) -> Dict[bool, List[dict]]:
+        """按是否有效把合并后的使用分成两批
+
+        record_task_memory 对每条记忆 freq+1、update_utility 时 utility+1，多次使用的
+        差额预先加到记忆上，使每条记忆只出现在一批中、一次写入。
+        """
+        batches: Dict[bool, List[dict]] = {}
+        for memory, uses, useful in entries:
+            useful_batch = useful > 0
+            memory = dict(memory)
+            memory["freq"] = (memory.get("freq") or 0) + uses - 1
+            if useful_batch:
+                memory["utility"] = (memory.get("utility") or 0) + useful - 1
+            batches.setdefault(useful_batch, []).append(memory)
+        return batches
+
+    async def prune(self, context_id: str, workspace_id: str) -> Dict[str, Any]:
+        """修剪一个工作区的任务记忆
+
+        Returns:
+            修剪前后的工作区规模与删除数量
+        """
+        result = await self.execute(
+            "delete_task_memory",
+            context_id,
+            priority_class=BACKGROUND,
+            workspace_id=workspace_id,
+            freq_threshold=self.freq_threshold,
+            utility_threshold=self.utility_threshold,
+        )
+        report = {
+            "time": time.time(),
+            **((result or {}).get("metadata", {}).get("prune_result") or {}),
+        }
+        self._stats["deleted"] += report.get("deleted_count", 0)
+        self._history.setdefault(context_id, deque(maxlen=self.history_size)).append(report)
+        return report
+
+    async def run_once(self) -> Dict[str, Dict[str, Any]]:
+        """写入使用记录后修剪全部工作区
+
+        Returns:
+            context_id -> 修剪结果
+        """
+        self._stats["runs"] += 1
+        await self.flush()
+        reports = {}
+        for context_id, workspace_id in self.workspaces().items():
+            try:
+                reports[context_id] = await self.prune(context_id, workspace_id)
+            except Exception as e:
+                self._stats["prune_errors"] += 1
+                reports[context_id] = {"error": str(e)}
+                print(f"Error pruning task memory for {context_id}: {str(e)}")
+        return reports
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Error running task memory pruner: {str(e)}")
+
+    def start(self):
+        """启动后台修剪（需在事件循环中调用）"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """阈值、待写入记录数与各工作区的规模趋势"""
+        return {
+            **self._stats,
+            "running": self._task is not None,
+            "interval": self.interval,
+            "freq_threshold": self.freq_threshold,
+            "utility_threshold": self.utility_threshold,
+            "pending_returned": len(self._returned),
+            "pending_plans": len(self._plans),
+            "pending_usage": self._pending,
+            "max_pending": self.max_pending,
+            "workspaces": {context_id: list(history) for context_id, history in self._history.items()},
+        }
@@ -0,0 +1,350 @@
+"""FlowGuard - ReMe flow调用的截止时间、对冲请求与熔断"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# flow依赖的后端，熔断按后端计：第一个是失败时记入的主要后端（调用LLM的flow失败多因LLM），
+# 调用前要求全部后端未熔断。未列出的flow使用以flow名称命名的独立熔断器
+DEFAULT_FLOW_BACKENDS: Dict[str, Tuple[str, ...]] = {
+    "retrieve_task_memory": ("vector_store",),
+    "retrieve_task_memory_simple": ("vector_store",),
+    "retrieve_personal_memory": ("llm", "vector_store"),
+    "retrieve_personal_memory_simple": ("vector_store",),
+    "retrieve_hierarchical_memory": ("vector_store",),
+    "retrieve_tool_memory": ("vector_store",),
+    "vector_store": ("vector_store",),
+    "record_task_memory": ("vector_store",),
+    "delete_task_memory": ("vector_store",),
+    "summary_task_memory": ("llm", "vector_store"),
+    "summary_task_memory_simple": ("llm", "vector_store"),
+    "summary_personal_memory": ("llm", "vector_store"),
+    "add_tool_call_result": ("llm", "vector_store"),
+    "summary_tool_memory": ("llm", "vector_store"),
+    "react": ("llm",),
+    "agentic_retrieve": ("llm", "vector_store"),
+}
+
+# 调用参数或数据问题导致的异常，不说明后端不可用，不计入熔断
+_CALLER_ERRORS = (ValueError, TypeError, LookupError, AttributeError, AssertionError, NotImplementedError)
+# 分片子进程传回的异常只有类型名（见 ShardFlowError）
+_CALLER_ERROR_NAMES = frozenset({
+    "ValueError", "TypeError", "KeyError", "IndexError", "LookupError", "AttributeError",
+    "AssertionError", "NotImplementedError", "ValidationError", "JSONDecodeError",
+})
+
+
+def is_backend_error(error: BaseException) -> bool:
+    """异常是否说明后端或传输不可用（调用参数错误等返回False）"""
+    if isinstance(error, _CALLER_ERRORS):
+        return False
+    return getattr(error, "error_type", None) not in _CALLER_ERROR_NAMES
+
+
+# 只读、可安全重复执行的flow，允许对冲
+DEFAULT_HEDGE_FLOWS = frozenset({
+    "react",
+    "retrieve_task_memory",
+    "retrieve_task_memory_simple",
+    "retrieve_personal_memory",
+    "retrieve_personal_memory_simple",
+    "retrieve_tool_memory",
+    "retrieve_hierarchical_memory",
+})
+
+
+class FlowUnavailableError(RuntimeError):
+    """flow在截止时间内未完成，或所在后端处于熔断状态"""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"flow {name} unavailable: {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """熔断器 - 连续失败达到阈值后打开，冷却期内直接失败；冷却后放行一个探测调用"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """是否允许发起调用"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_cancelled(self):
+        """调用被取消，结果未知：放弃本次探测"""
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        """熔断打开时距下一次探测的秒数"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+
+class _FlowState:
+    def __init__(self, window: int, max_age: float, breakers: List[Tuple[str, CircuitBreaker]]):
+        # (完成时间, 延迟)，超过 max_age 秒的样本不再计入p95
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=window)
+        self.max_age = max_age
+        # (后端名称, 熔断器)，与共用同一后端的flow共享
+        self.breakers = breakers
+        self.stats = {"calls": 0, "failures": 0, "errors": 0, "timeouts": 0, "rejected": 0,
+                      "hedged": 0, "hedge_wins": 0}
+
+    def allow(self) -> Optional[str]:
+        """全部后端允许调用时返回None，否则返回熔断的后端名称（已放行的探测随之撤回）"""
+        granted = []
+        for backend, breaker in self.breakers:
+            if not breaker.allow():
+                for other in granted:
+                    other.record_cancelled()
+                return backend
+            granted.append(breaker)
+        return None
+
+    def record_success(self):
+        for _, breaker in self.breakers:
+            breaker.record_success()
+
+    def record_failure(self):
+        """失败记入主要后端，其余后端的探测撤回"""
+        self.breakers[0][1].record_failure()
+        for _, breaker in self.breakers[1:]:
+            breaker.record_cancelled()
+
+    def record_cancelled(self):
+        for _, breaker in self.breakers:
+            breaker.record_cancelled()
+
+    def record(self, latency: float):
+        self.samples.append((time.monotonic(), latency))
+
+    @property
+    def latencies(self) -> List[float]:
+        """未过期的延迟样本"""
+        if self.max_age > 0:
+            cutoff = time.monotonic() - self.max_age
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+        return [latency for _, latency in self.samples]
+
+    def p95(self) -> Optional[float]:
+        latencies = self.latencies
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class FlowGuard:
+    """flow调用保护
+
+    - 截止时间：每个flow有独立的截止时间，超时视为失败
+    - 对冲：只读flow在等待超过其近期p95延迟后，再发起一次相同调用，取先完成者
+    - 熔断：按flow依赖的后端（LLM、向量库）熔断，只有超时与后端/传输异常计为失败，调用参数
+      错误不计；任一依赖后端熔断期间直接抛出 FlowUnavailableError，调用方据此降级（如不调用
+      LLM的简化检索flow在LLM熔断时仍可用）
+    """
+
+    def __init__(self, default_deadline: float = 120.0, deadlines: Optional[Dict[str, float]] = None,
+                 hedge_flows: Iterable[str] = DEFAULT_HEDGE_FLOWS, hedge_min_delay: float = 0.5,
+                 hedge_min_samples: int = 20, failure_threshold: int = 5, cooldown: float = 30.0,
+                 window: int = 200, sample_max_age: float = 300.0,
+                 flow_backends: Optional[Dict[str, Tuple[str, ...]]] = None):
+        """初始化
+
+        Args:
+            default_deadline: 默认截止时间（秒）
+            deadlines: flow名称 -> 截止时间（秒）
+            hedge_flows: 允许对冲的flow名称
+            hedge_min_delay: 对冲延迟下限（秒），避免对快速调用重复请求
+            hedge_min_samples: 延迟样本不足此数时不对冲
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断冷却时间（秒）
+            window: 计算p95保留的最近样本数
+            sample_max_age: 延迟样本的有效期（秒），<=0 时不过期；flow长时间无调用时p95随之失效
+            flow_backends: flow名称 -> 依赖的后端，默认 DEFAULT_FLOW_BACKENDS
+        """
+        self.default_deadline = default_deadline
+        self.deadlines = dict(deadlines or {})
+        self.hedge_flows = frozenset(hedge_flows)
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self.sample_max_age = sample_max_age
+        self.flow_backends = dict(DEFAULT_FLOW_BACKENDS if flow_backends is None else flow_backends)
+        self._flows: Dict[str, _FlowState] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_env(cls) -> "FlowGuard":
+        """从环境变量创建
+
+        FLOW_DEADLINE_SECONDS: 默认截止时间（默认120）
+        FLOW_DEADLINES: 按flow覆盖，如 "react=60,retrieve_task_memory=10"
+        FLOW_HEDGING: 设为0关闭对冲
+        FLOW_BREAKER_THRESHOLD / FLOW_BREAKER_COOLDOWN: 熔断阈值与冷却时间
+        FLOW_LATENCY_MAX_AGE: 延迟样本有效期（秒，默认300）
+        """
+        import os
+        deadlines = {}
+        for item in os.getenv("FLOW_DEADLINES", "").split(","):
+            if "=" in item:
+                name, seconds = item.split("=", 1)
+                deadlines[name.strip()] = float(seconds)
+        return cls(
+            default_deadline=float(os.getenv("FLOW_DEADLINE_SECONDS", "120")),
+            deadlines=deadlines,
+            hedge_flows=DEFAULT_HEDGE_FLOWS if os.getenv("FLOW_HEDGING", "1") != "0" else (),
+            failure_threshold=int(os.getenv("FLOW_BREAKER_THRESHOLD", "5")),
+            cooldown=float(os.getenv("FLOW_BREAKER_COOLDOWN", "30")),
+            sample_max_age=float(os.getenv("FLOW_LATENCY_MAX_AGE", "300")),
+        )
+
+    def _state(self, name: str) -> _FlowState:
+        state = self._flows.get(name)
+        if state is None:
+            breakers = []
+            for backend in self.flow_backends.get(name) or (name,):
+                breaker = self._breakers.get(backend)
+                if breaker is None:
+                    breaker = self._breakers[backend] = CircuitBreaker(self.failure_threshold, self.cooldown)
+                breakers.append((backend, breaker))
+            state = self._flows[name] = _FlowState(self.window, self.sample_max_age, breakers)
+        return state
+
+    def _hedge_delay(self, name: str, state: _FlowState) -> Optional[float]:
+        if name not in self.hedge_flows or len(state.latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, state.p95())
+
+    async def execute(self, name: str, call: Callable[[], Awaitable[Any]],
+                      hedge_call: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """执行flow调用
+
+        Args:
+            name: flow名称
+            call: 发起一次调用的工厂函数
+            hedge_call: 发起对冲调用的工厂函数（如需另占调度槽位），默认同 call
+
+        Returns:
+            先完成的调用结果
+
+        Raises:
+            FlowUnavailableError: 依赖的后端熔断或超过截止时间
+        """
+        state = self._state(name)
+        blocked = state.allow()
+        if blocked is not None:
+            state.stats["rejected"] += 1
+            raise FlowUnavailableError(
+                name, f"{blocked} circuit open, retry after {self._breakers[blocked].retry_after():.1f}s")
+        state.stats["calls"] += 1
+        deadline = self.deadlines.get(name, self.default_deadline)
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._race(name, state, call, hedge_call or call), timeout=deadline)
+        except asyncio.TimeoutError:
+            state.stats["timeouts"] += 1
+            state.record_failure()
+            raise FlowUnavailableError(name, f"deadline of {deadline:g}s exceeded") from None
+        except asyncio.CancelledError:
+            state.record_cancelled()
+            raise
+        except Exception as e:
+            if is_backend_error(e):
+                state.stats["failures"] += 1
+                state.record_failure()
+            else:
+                # 调用方错误：后端有响应，不计入熔断，半开状态的探测撤回
+                state.stats["errors"] += 1
+                state.record_cancelled()
+            raise
+        state.record(time.perf_counter() - start)
+        state.record_success()
+        return result
+
+    async def _race(self, name: str, state: _FlowState, call: Callable[[], Awaitable[Any]],
+                    hedge_call: Callable[[], Awaitable[Any]]) -> Any:
+        primary = asyncio.ensure_future(call())
+        delay = self._hedge_delay(name, state)
+        if delay is None:
+            return await primary
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                state.stats["hedged"] += 1
+                tasks.add(asyncio.ensure_future(hedge_call()))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None or not tasks:
+                        if task is not primary:
+                            state.stats["hedge_wins"] += 1
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def p95(self, name: str) -> Optional[float]:
+        """flow近期成功调用的p95延迟（秒），无样本时返回None"""
+        state = self._flows.get(name)
+        return state.p95() if state is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        """各flow的延迟、对冲与所依赖后端的熔断状态"""
+        report = {}
+        for name, state in self._flows.items():
+            p95 = state.p95()
+            report[name] = {
+                **state.stats,
+                "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+                "deadline": self.deadlines.get(name, self.default_deadline),
+                "backends": {
+                    backend: {
+                        "breaker": breaker.state,
+                        "breaker_trips": breaker.trips,
+                        "retry_after": round(breaker.retry_after(), 1),
+                    }
+                    for backend, breaker in state.breakers
+                },
+            }
+        return report
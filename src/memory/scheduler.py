@@ -0,0 +1,199 @@
+"""FlowScheduler - 按优先级类别调度占用LLM后端的ReMe flow调用"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# 类别 -> 基础优先级（越小越优先）
+DEFAULT_CLASS_RANKS = {INTERACTIVE: 0, BACKGROUND: 1}
+
+# 后台写入类flow，其余flow（检索、react规划等）视为交互类
+DEFAULT_BACKGROUND_FLOWS = frozenset({
+    "summary_task_memory",
+    "summary_personal_memory",
+    "add_tool_call_result",
+    "summary_working_memory",
+    "record_task_memory",
+    "delete_task_memory",
+    "vector_store",
+})
+
+# vector_store中由交互调用等待的操作（延迟加载工作区、fork复制工作区），不随vector_store归入后台
+DEFAULT_INTERACTIVE_ACTIONS = frozenset({"load", "copy"})
+
+
+class _Waiter:
+    __slots__ = ("future", "priority_class", "enqueued")
+
+    def __init__(self, future: asyncio.Future, priority_class: str):
+        self.future = future
+        self.priority_class = priority_class
+        self.enqueued = time.monotonic()
+
+
+class FlowScheduler:
+    """优先级调度器 - 总并发槽位 + 每个类别的并发上限 + 等待老化
+
+    空出槽位时，在各类别队首的等待者中选择有效优先级最高者：
+    有效优先级 = 基础优先级 - 已等待时间 / aging_interval，
+    因此后台调用等待足够久后也会被调度，不会饿死。
+    """
+
+    def __init__(self, max_concurrency: int = 4, class_limits: Optional[Dict[str, int]] = None,
+                 aging_interval: float = 2.0, class_ranks: Optional[Dict[str, int]] = None,
+                 background_flows=DEFAULT_BACKGROUND_FLOWS, wait_window: int = 256,
+                 interactive_actions=DEFAULT_INTERACTIVE_ACTIONS):
+        """初始化调度器
+
+        Args:
+            max_concurrency: 总并发槽位数
+            class_limits: 类别 -> 该类别最多占用的槽位数，未指定的类别可占满全部槽位
+            aging_interval: 每等待这么多秒，有效优先级提升一级
+            class_ranks: 类别 -> 基础优先级
+            background_flows: 归为后台类别的flow名称
+            wait_window: 计算等待时间分位数所保留的最近样本数
+            interactive_actions: 后台flow中仍归为交互类别的操作（vector_store的action）
+        """
+        self.max_concurrency = max_concurrency
+        self.class_ranks = dict(class_ranks or DEFAULT_CLASS_RANKS)
+        self.class_limits = {name: max_concurrency for name in self.class_ranks}
+        self.class_limits.update(class_limits or {})
+        self.aging_interval = aging_interval
+        self.background_flows = background_flows
+        self.interactive_actions = interactive_actions
+        self._running = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {name: deque() for name in self.class_ranks}
+        self._stats = {name: self._new_stats(wait_window) for name in self.class_ranks}
+
+    @staticmethod
+    def _new_stats(wait_window: int) -> Dict[str, Any]:
+        return {"running": 0, "admitted": 0, "aged": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                "recent_waits": deque(maxlen=wait_window)}
+
+    @classmethod
+    def from_env(cls, default_concurrency: int = 4) -> "FlowScheduler":
+        """从环境变量创建
+
+        FLOW_SCHEDULER_SLOTS: 总并发槽位数（默认 default_concurrency）
+        FLOW_SCHEDULER_BACKGROUND_LIMIT: 后台类别最多占用的槽位数（默认总槽位的一半）
+        FLOW_SCHEDULER_AGING_SECONDS: 老化间隔（默认2秒）
+        """
+        import os
+        slots = int(os.getenv("FLOW_SCHEDULER_SLOTS", str(default_concurrency)))
+        background_limit = int(os.getenv("FLOW_SCHEDULER_BACKGROUND_LIMIT", str(max(1, slots // 2))))
+        return cls(
+            max_concurrency=slots,
+            class_limits={BACKGROUND: background_limit},
+            aging_interval=float(os.getenv("FLOW_SCHEDULER_AGING_SECONDS", "2.0")),
+        )
+
+    def classify(self, name: str, action: Optional[str] = None) -> str:
+        """获取flow（及其操作）所属的优先级类别"""
+        if name not in self.background_flows or action in self.interactive_actions:
+            return INTERACTIVE
+        return BACKGROUND
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority_class: Optional[str] = None, action: Optional[str] = None):
+        """占用一个执行槽位
+
+        Args:
+            name: flow名称，用于确定默认类别
+            priority_class: 显式指定类别（可选）
+            action: flow的操作（如vector_store的action），用于确定默认类别
+        """
+        priority_class = priority_class or self.classify(name, action)
+        if priority_class not in self.class_ranks:
+            raise ValueError(f"unknown priority class: {priority_class}")
+        await self._acquire(priority_class)
+        try:
+            yield
+        finally:
+            self._release(priority_class)
+
+    async def _acquire(self, priority_class: str):
+        queue = self._queues[priority_class]
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority_class)
+        queue.append(waiter)
+        self._dispatch()
+        if waiter.future.done():
+            return
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已获得槽位但调用方被取消，归还槽位
+                self._release(priority_class)
+            else:
+                queue.remove(waiter)
+            raise
+
+    def _can_run(self, priority_class: str) -> bool:
+        return (self._running < self.max_concurrency
+                and self._stats[priority_class]["running"] < self.class_limits[priority_class])
+
+    def _admit(self, priority_class: str, wait_ms: float, aged: bool):
+        self._running += 1
+        stats = self._stats[priority_class]
+        stats["running"] += 1
+        stats["admitted"] += 1
+        stats["wait_ms_total"] += wait_ms
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], wait_ms)
+        stats["recent_waits"].append(wait_ms)
+        if aged:
+            stats["aged"] += 1
+
+    def _release(self, priority_class: str):
+        self._running -= 1
+        self._stats[priority_class]["running"] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """把空出的槽位分配给有效优先级最高的可运行等待者"""
+        while self._running < self.max_concurrency:
+            now = time.monotonic()
+            candidates = []
+            for priority_class, queue in self._queues.items():
+                if queue and self._can_run(priority_class):
+                    waiter = queue[0]
+                    effective = self.class_ranks[priority_class] - (now - waiter.enqueued) / self.aging_interval
+                    candidates.append((effective, waiter.enqueued, priority_class))
+            if not candidates:
+                return
+            _, _, priority_class = min(candidates)
+            waiter = self._queues[priority_class].popleft()
+            # 存在基础优先级更高的等待者时仍被选中，说明是老化生效
+            rank = self.class_ranks[priority_class]
+            aged = any(self.class_ranks[other] < rank and queue
+                       for other, queue in self._queues.items())
+            self._admit(priority_class, (now - waiter.enqueued) * 1000, aged)
+            waiter.future.set_result(None)
+
+    def overloaded(self) -> bool:
+        """是否已饱和：有交互类调用在排队等待槽位"""
+        return bool(self._queues[INTERACTIVE])
+
+    def stats(self) -> Dict[str, Any]:
+        """各类别的排队、运行与等待时间统计"""
+        classes = {}
+        for priority_class, stats in self._stats.items():
+            waits: List[float] = sorted(stats["recent_waits"])
+            admitted = stats["admitted"]
+            classes[priority_class] = {
+                "queued": len(self._queues[priority_class]),
+                "running": stats["running"],
+                "limit": self.class_limits[priority_class],
+                "admitted": admitted,
+                "aged": stats["aged"],
+                "wait_ms_avg": round(stats["wait_ms_total"] / admitted, 2) if admitted else 0.0,
+                "wait_ms_p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+                "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0.0,
+                "wait_ms_max": round(stats["wait_ms_max"], 2),
+            }
+        return {"max_concurrency": self.max_concurrency, "running": self._running,
+                "aging_interval": self.aging_interval, "classes": classes}
@@ -0,0 +1,324 @@
+"""MemoryShards - 按context_id一致性哈希将工作区分布到多个ReMeApp分片
+
+ReMe（flowllm）把flow、向量库和线程池保存在进程级全局上下文中，同一进程内只能运行一个
+ReMeApp。因此分片0在本进程内运行，其余分片各自运行在独立的子进程中，通过管道收发
+flow调用。每个分片有独立的线程池与事件循环，重负载的租户只占用自己所在分片的资源。
+"""
+
+import asyncio
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class HashRing:
+    """一致性哈希环 - 每个节点放置多个虚拟节点，增删节点时只迁移约 1/N 的key"""
+
+    def __init__(self, nodes: List[int], vnodes: int = 128):
+        self.vnodes = vnodes
+        self._points: List[Tuple[int, int]] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: int):
+        for i in range(self.vnodes):
+            bisect.insort(self._points, (_hash(f"shard-{node}#{i}"), node))
+
+    def remove(self, node: int):
+        self._points = [point for point in self._points if point[1] != node]
+
+    def get(self, key: str) -> int:
+        """获取key所在的节点"""
+        if not self._points:
+            raise LookupError("hash ring is empty")
+        index = bisect.bisect(self._points, (_hash(key), -1)) % len(self._points)
+        return self._points[index][1]
+
+
+class ShardFlowError(RuntimeError):
+    """分片子进程中flow抛出的异常，error_type 为原异常的类型名"""
+
+    def __init__(self, payload: str):
+        super().__init__(payload)
+        self.error_type = payload.split(":", 1)[0] if ":" in payload else ""
+
+
+class LocalShard:
+    """本进程内的分片"""
+
+    kind = "local"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def execute(self, name: str, **kwargs) -> dict:
+        return await self.app.async_execute(name=name, **kwargs)
+
+    async def close(self):
+        await self.app.async_stop()
+
+
+def _shard_main(conn, app_args: List[str], config_path: str):
+    """分片子进程入口：启动独立的ReMeApp并处理父进程发来的flow调用"""
+    from reme_ai import ReMeApp
+    # 注册自适应后端与自定义op
+    from . import ops  # noqa: F401
+    from . import backends  # noqa: F401
+
+    app = ReMeApp(*app_args, config_path=config_path)
+
+    async def serve():
+        await app.async_start()
+        loop = asyncio.get_running_loop()
+        send_lock = threading.Lock()
+        tasks = set()
+
+        def send(message):
+            with send_lock:
+                conn.send(message)
+
+        async def handle(request_id: int, name: str, kwargs: Dict[str, Any]):
+            try:
+                message = (request_id, True, await app.async_execute(name=name, **kwargs))
+            except Exception as e:
+                message = (request_id, False, f"{type(e).__name__}: {str(e)}")
+            await loop.run_in_executor(None, send, message)
+
+        while True:
+            try:
+                request = await loop.run_in_executor(None, conn.recv)
+            except (EOFError, OSError):
+                break
+            if request is None:
+                break
+            task = asyncio.ensure_future(handle(*request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await app.async_stop()
+
+    asyncio.run(serve())
+
+
+class ProcessShard:
+    """运行在子进程中的分片"""
+
+    kind = "process"
+
+    def __init__(self, index: int, app_args: List[str], config_path: str):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_shard_main, args=(child_conn, app_args, config_path),
+                                        name=f"reme-shard-{index}", daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._send_lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+
+    def _read_loop(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            try:
+                request_id, ok, payload = self._conn.recv()
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(self._fail_all, "shard process exited")
+                return
+            loop.call_soon_threadsafe(self._resolve, request_id, ok, payload)
+
+    def _resolve(self, request_id: int, ok: bool, payload: Any):
+        future = self._pending.pop(request_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(payload)
+        else:
+            future.set_exception(ShardFlowError(payload))
+
+    def _fail_all(self, reason: str):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+        self._pending.clear()
+
+    async def execute(self, name: str, **kwargs) -> dict:
+        loop = asyncio.get_running_loop()
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_loop, args=(loop,), daemon=True)
+            self._reader.start()
+        request_id = next(self._ids)
+        future = loop.create_future()
+        self._pending[request_id] = future
+        try:
+            with self._send_lock:
+                self._conn.send((request_id, name, kwargs))
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self):
+        try:
+            with self._send_lock:
+                self._conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        await asyncio.get_running_loop().run_in_executor(None, self._process.join, 10)
+
+
+class ShardSet:
+    """分片集合 - 路由、负载统计与工作区迁移"""
+
+    def __init__(self, shards: list, vnodes: int = 128):
+        self.shards = shards
+        self.ring = HashRing(list(range(len(shards))), vnodes)
+        # 手动指定分片的Context（如把重负载租户迁到独立分片），优先于哈希环
+        self._pinned: Dict[str, int] = {}
+        self._migrating: Dict[str, asyncio.Event] = {}
+        self._context_inflight: Dict[str, int] = {}
+        self._load = [self._new_load() for _ in shards]
+
+    @staticmethod
+    def _new_load() -> Dict[str, float]:
+        return {"inflight": 0, "calls": 0, "errors": 0, "total_ms": 0.0, "migrations_in": 0, "migrations_out": 0}
+
+    def shard_for(self, context_id: str) -> int:
+        """获取Context所在的分片编号"""
+        pinned = self._pinned.get(context_id)
+        return pinned if pinned is not None else self.ring.get(context_id)
+
+    async def execute(self, context_id: str, name: str, **kwargs) -> dict:
+        """在Context所在的分片上执行flow，迁移中的Context等待迁移完成"""
+        migrating = self._migrating.get(context_id)
+        if migrating is not None:
+            await migrating.wait()
+        index = self.shard_for(context_id)
+        load = self._load[index]
+        load["inflight"] += 1
+        self._context_inflight[context_id] = self._context_inflight.get(context_id, 0) + 1
+        start = time.perf_counter()
+        try:
+            return await self.shards[index].execute(name, **kwargs)
+        except Exception:
+            load["errors"] += 1
+            raise
+        finally:
+            load["inflight"] -= 1
+            load["calls"] += 1
+            load["total_ms"] += (time.perf_counter() - start) * 1000
+            remaining = self._context_inflight[context_id] - 1
+            if remaining:
+                self._context_inflight[context_id] = remaining
+            else:
+                del self._context_inflight[context_id]
+
+    async def move(self, context_id: str, workspace_id: str, target: int, dump_dir: str) -> bool:
+        """将Context的工作区迁移到指定分片：源分片dump，目标分片load，再删除源分片数据
+
+        Args:
+            context_id: Context ID
+            workspace_id: 工作区ID
+            target: 目标分片编号
+            dump_dir: 迁移使用的临时目录（每次迁移在其下创建并删除独立子目录）
+
+        Returns:
+            是否发生了迁移
+        """
+        source = self.shard_for(context_id)
+        if source == target:
+            self._pinned[context_id] = target
+            return False
+        if context_id in self._migrating:
+            raise RuntimeError(f"context {context_id} is already migrating")
+        event = asyncio.Event()
+        self._migrating[context_id] = event
+        try:
+            # 等待已在源分片上执行的调用结束
+            while self._context_inflight.get(context_id):
+                await asyncio.sleep(0.05)
+            # 每次迁移使用独立的子目录，load后连同dump文件一起删除
+            os.makedirs(dump_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory(prefix="move-", dir=dump_dir) as directory:
+                await self.shards[source].execute("vector_store", workspace_id=workspace_id, action="dump", path=directory)
+                await self.shards[target].execute("vector_store", workspace_id=workspace_id, action="load", path=directory)
+            await self.shards[source].execute("vector_store", workspace_id=workspace_id, action="delete")
+            self._pinned[context_id] = target
+            self._load[source]["migrations_out"] += 1
+            self._load[target]["migrations_in"] += 1
+            return True
+        finally:
+            del self._migrating[context_id]
+            event.set()
+
+    def add_shard(self, shard) -> int:
+        """加入新分片（需随后调用 rebalance 才会参与哈希路由）
+
+        Returns:
+            新分片编号
+        """
+        self.shards.append(shard)
+        self._load.append(self._new_load())
+        return len(self.shards) - 1
+
+    async def rebalance(self, workspaces: Dict[str, str], dump_dir: str) -> Dict[str, int]:
+        """按当前全部分片重建哈希环，并迁移归属发生变化的Context
+
+        Args:
+            workspaces: context_id -> 工作区ID
+            dump_dir: 迁移使用的临时目录
+
+        Returns:
+            已迁移的 context_id -> 目标分片编号（手动指定分片的Context不参与）
+        """
+        ring = HashRing(list(range(len(self.shards))), self.ring.vnodes)
+        moves = {}
+        for context_id in workspaces:
+            if context_id not in self._pinned:
+                target = ring.get(context_id)
+                if target != self.ring.get(context_id):
+                    moves[context_id] = target
+        for context_id, target in moves.items():
+            # 迁移期间临时固定到目标分片，切换哈希环后再解除
+            await self.move(context_id, workspaces[context_id], target, dump_dir)
+        self.ring = ring
+        for context_id in moves:
+            self._pinned.pop(context_id, None)
+        return moves
+
+    def load_report(self, context_ids: List[str]) -> List[Dict[str, Any]]:
+        """各分片负载
+
+        Args:
+            context_ids: 已知的Context ID，用于统计每个分片承载的工作区数量
+        """
+        counts = [0] * len(self.shards)
+        for context_id in context_ids:
+            counts[self.shard_for(context_id)] += 1
+        report = []
+        for index, (shard, load) in enumerate(zip(self.shards, self._load)):
+            report.append({
+                "shard": index,
+                "kind": shard.kind,
+                "contexts": counts[index],
+                "pinned": sum(1 for s in self._pinned.values() if s == index),
+                "avg_ms": round(load["total_ms"] / load["calls"], 2) if load["calls"] else 0.0,
+                **load,
+            })
+        return report
+
+    async def close(self):
+        for shard in self.shards:
+            try:
+                await shard.close()
+            except Exception as e:
+                print(f"Error closing memory shard: {str(e)}")
@@ -0,0 +1,91 @@
+"""RetrievalModeSelector - 按质量档位、延迟预算与当前负载为每类记忆选择检索flow"""
+
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+AUTO = "auto"
+FULL = "full"
+FAST = "fast"
+TIERS = (AUTO, FULL, FAST)
+
+# 记忆类型 -> 档位 -> flow
+SECTION_FLOWS: Dict[str, Dict[str, str]] = {
+    # 完整：时间抽取 + LLM语义排序；快速：仅向量召回
+    "personal_memory": {FULL: "retrieve_personal_memory", FAST: "retrieve_personal_memory_simple"},
+    # 完整：召回 + 重排 + 改写；快速：召回后直接合并
+    "task_memory": {FULL: "retrieve_task_memory", FAST: "retrieve_task_memory_simple"},
+    # 完整：LLM总结工具使用模式；快速：直接读取工具记忆
+    "tool_memory": {FULL: "summary_tool_memory", FAST: "retrieve_tool_memory"},
+}
+
+
+class RetrievalModeSelector:
+    """检索档位选择
+
+    - tier=fast：使用快速flow
+    - tier=full：始终使用完整flow，延迟预算与负载都不会使其降级（调用方明确要求质量）
+    - tier=auto（默认）：指定延迟预算且完整flow近期p95超出预算时降级（无延迟样本时先用完整flow），
+      调度器饱和（有交互类调用在排队）时同样降级
+    - 因预算降级期间，每个完整flow每隔 probe_interval 秒放行一次探测调用，使其延迟样本持续更新；
+      延迟样本本身也会按时间过期（见 FlowGuard），后端恢复后降级随之解除
+    """
+
+    def __init__(self, flow_latency: Callable[[str], Optional[float]], overloaded: Callable[[], bool],
+                 probe_interval: float = 30.0):
+        """初始化
+
+        Args:
+            flow_latency: flow名称 -> 近期p95延迟（秒），无样本时返回None
+            overloaded: 当前是否处于高负载
+            probe_interval: 因预算降级时放行探测调用的间隔（秒），<=0 时不探测
+        """
+        self.flow_latency = flow_latency
+        self.overloaded = overloaded
+        self.probe_interval = probe_interval
+        self._last_probe: Dict[str, float] = {}
+
+    def _probe(self, flow: str) -> bool:
+        """是否放行一次完整flow的探测调用"""
+        if self.probe_interval <= 0:
+            return False
+        now = time.monotonic()
+        last = self._last_probe.get(flow)
+        if last is None:
+            # 开始降级时记下时间，间隔一个周期后再探测
+            self._last_probe[flow] = now
+            return False
+        if now - last < self.probe_interval:
+            return False
+        self._last_probe[flow] = now
+        return True
+
+    def select(self, section: str, tier: Optional[str] = None,
+               latency_budget_ms: Optional[float] = None) -> Tuple[str, str]:
+        """为一类记忆选择flow
+
+        Args:
+            section: 记忆类型（personal_memory/task_memory/tool_memory）
+            tier: 质量档位（auto/full/fast），默认auto
+            latency_budget_ms: 延迟预算（毫秒，可选）
+
+        Returns:
+            (flow名称, 选择原因)
+        """
+        tier = tier or AUTO
+        if tier not in TIERS:
+            raise ValueError(f"unknown tier: {tier}")
+        flows = SECTION_FLOWS[section]
+        if tier == FAST:
+            return flows[FAST], "requested"
+        if tier == FULL:
+            return flows[FULL], "requested"
+        if latency_budget_ms is not None:
+            p95 = self.flow_latency(flows[FULL])
+            if p95 is not None and p95 * 1000 > latency_budget_ms:
+                if self._probe(flows[FULL]):
+                    return flows[FULL], "probe"
+                return flows[FAST], "budget"
+            self._last_probe.pop(flows[FULL], None)
+        if self.overloaded():
+            return flows[FAST], "load"
+        return flows[FULL], "auto"
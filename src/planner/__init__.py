@@ -2,8 +2,10 @@
 
 from .planner import ToolPlanner
 from .dynamic_adjuster import DynamicPlanAdjuster
+from .plan_store import PlanStore
 
 __all__ = [
     "ToolPlanner",
     "DynamicPlanAdjuster",
+    "PlanStore",
 ]
@@ -3,7 +3,7 @@
 import json
 from typing import List, Dict, Any, Optional
 
-from ..memory import MemoryManager
+from ..memory import FlowUnavailableError, MemoryManager
 from ..types import (
     Plan,
     PlanStep,
@@ -165,15 +165,23 @@ class DynamicPlanAdjuster:
                 added_steps=[],
             )
 
-        prompt = await self._build_adjustment_prompt(context_id, plan, results, analysis)
-
-        # 使用MemoryManager的get_combined_memory方法来获取工具记忆，而不是直接调用app.async_execute
-        # 这里我们需要一个方法来执行react操作，但是MemoryManager中没有提供，所以我们暂时保留直接调用
-        app = await self.memory_manager._get_app()
-        result = await app.async_execute(
-            name="react",
-            query=prompt,
-        )
+        # 经MemoryManager路由到Context所在的分片
+        try:
+            prompt = await self._build_adjustment_prompt(context_id, plan, results, analysis)
+            result = await self.memory_manager._execute(
+                "react",
+                context_id,
+                query=prompt,
+            )
+        except FlowUnavailableError as e:
+            return AdjustedPlan(
+                original_plan_id=plan.plan_id,
+                context_id=context_id,
+                adjusted_steps=plan.steps,
+                adjustment_reason=f"Backend unavailable, plan left unchanged: {str(e)}",
+                skipped_steps=[],
+                added_steps=[],
+            )
 
         answer = result.get("answer", "") if result else ""
 
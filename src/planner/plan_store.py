@@ -0,0 +1,240 @@
+"""PlanStore - 有界计划存储，LRU淘汰并溢出到本地磁盘"""
+
+import gzip
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from ..types import Plan
+
+
+class PlanStore:
+    """计划存储 - 内存中保留最近使用的计划，超出上限时溢出为磁盘上的压缩JSON
+
+    内存上限按计划数量与序列化字节数双重约束；磁盘上的计划同样有数量上限，
+    超出后最久未使用的计划被彻底淘汰。按 plan_id 查询时磁盘命中的计划会重新载入内存。
+    """
+
+    def __init__(self, max_plans: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 spill_dir: Optional[str] = None, max_spilled: int = 100000):
+        self.max_plans = max_plans
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spilled = max_spilled
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._purge_spill_dir()
+
+        # 内存中的计划: plan_id -> (计划, 序列化字节数)，按最近使用排序
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._memory_bytes = 0
+        # 溢出到磁盘的计划: plan_id -> context_id，按溢出时间排序
+        self._spilled: "OrderedDict[str, str]" = OrderedDict()
+        self._context_index: Dict[str, Set[str]] = {}
+
+        self._stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "spills": 0,
+            "evictions": 0,
+        }
+
+    def _spill_path(self, plan_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{plan_id}.json.gz")
+
+    def _purge_spill_dir(self):
+        """清理上次进程遗留的溢出文件（索引只存在于内存中，遗留文件已无法按Context查找）"""
+        for name in os.listdir(self.spill_dir):
+            if name.endswith(".json.gz"):
+                try:
+                    os.remove(os.path.join(self.spill_dir, name))
+                except OSError:
+                    pass
+
+    def _forget(self, plan_id: str, context_id: str):
+        plan_ids = self._context_index.get(context_id)
+        if plan_ids is not None:
+            plan_ids.discard(plan_id)
+            if not plan_ids:
+                del self._context_index[context_id]
+
+    def _spill(self, plan_id: str, plan: Plan):
+        """将计划写入磁盘，磁盘不可用时直接淘汰"""
+        if not self.spill_dir:
+            self._stats["evictions"] += 1
+            self._forget(plan_id, plan.context_id)
+            return
+        try:
+            with gzip.open(self._spill_path(plan_id), "wb", compresslevel=5) as f:
+                f.write(plan.model_dump_json().encode("utf-8"))
+        except OSError as e:
+            print(f"Error spilling plan {plan_id}: {str(e)}")
+            self._stats["evictions"] += 1
+            self._forget(plan_id, plan.context_id)
+            return
+        self._spilled[plan_id] = plan.context_id
+        self._stats["spills"] += 1
+
+        while len(self._spilled) > self.max_spilled:
+            old_id, old_context_id = self._spilled.popitem(last=False)
+            self._remove_file(old_id)
+            self._forget(old_id, old_context_id)
+            self._stats["evictions"] += 1
+
+    def _remove_file(self, plan_id: str):
+        try:
+            os.remove(self._spill_path(plan_id))
+        except OSError:
+            pass
+
+    def _load(self, plan_id: str) -> Optional[Plan]:
+        """从磁盘载入计划并移回内存"""
+        context_id = self._spilled.pop(plan_id)
+        try:
+            with gzip.open(self._spill_path(plan_id), "rb") as f:
+                plan = Plan.model_validate_json(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Error loading spilled plan {plan_id}: {str(e)}")
+            self._forget(plan_id, context_id)
+            return None
+        self._remove_file(plan_id)
+        self._admit(plan)
+        return plan
+
+    def _read(self, plan_id: str) -> Optional[Plan]:
+        """读取磁盘上的计划，不移回内存"""
+        try:
+            with gzip.open(self._spill_path(plan_id), "rb") as f:
+                return Plan.model_validate_json(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Error reading spilled plan {plan_id}: {str(e)}")
+            return None
+
+    def _admit(self, plan: Plan):
+        """放入内存并按上限溢出最久未使用的计划"""
+        size = len(plan.model_dump_json())
+        self._memory[plan.plan_id] = (plan, size)
+        self._memory_bytes += size
+        while self._memory and (len(self._memory) > self.max_plans or self._memory_bytes > self.max_bytes):
+            old_id, (old_plan, old_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= old_size
+            self._spill(old_id, old_plan)
+
+    def put(self, plan: Plan):
+        """保存计划
+
+        Args:
+            plan: 计划
+        """
+        plan_id = plan.plan_id
+        if plan_id in self._memory:
+            self._memory_bytes -= self._memory.pop(plan_id)[1]
+        elif plan_id in self._spilled:
+            self._spilled.pop(plan_id)
+            self._remove_file(plan_id)
+        self._context_index.setdefault(plan.context_id, set()).add(plan_id)
+        self._admit(plan)
+
+    def get(self, plan_id: str, context_id: Optional[str] = None) -> Optional[Plan]:
+        """按plan_id获取计划
+
+        Args:
+            plan_id: 计划ID
+            context_id: 所属Context ID（可选），不匹配时视为不存在
+
+        Returns:
+            计划，不存在返回None
+        """
+        entry = self._memory.get(plan_id)
+        if entry is not None:
+            plan = entry[0]
+            if context_id is not None and plan.context_id != context_id:
+                self._stats["misses"] += 1
+                return None
+            self._memory.move_to_end(plan_id)
+            self._stats["hits"] += 1
+            return plan
+
+        spilled_context_id = self._spilled.get(plan_id)
+        if spilled_context_id is None or (context_id is not None and spilled_context_id != context_id):
+            self._stats["misses"] += 1
+            return None
+        plan = self._load(plan_id)
+        if plan is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["disk_hits"] += 1
+        return plan
+
+    def remove(self, plan_id: str) -> bool:
+        """删除计划
+
+        Args:
+            plan_id: 计划ID
+
+        Returns:
+            是否存在并已删除
+        """
+        entry = self._memory.pop(plan_id, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+            self._forget(plan_id, entry[0].context_id)
+            return True
+        context_id = self._spilled.pop(plan_id, None)
+        if context_id is not None:
+            self._remove_file(plan_id)
+            self._forget(plan_id, context_id)
+            return True
+        return False
+
+    def recent(self, context_id: str, limit: int) -> List[Plan]:
+        """按最近使用顺序（新到旧）列出Context下的计划，只读：不改变LRU顺序、不计入命中统计、
+        磁盘上的计划不移回内存
+
+        Args:
+            context_id: Context ID
+            limit: 最多返回的计划数
+
+        Returns:
+            计划列表
+        """
+        plans: List[Plan] = []
+        if limit <= 0 or context_id not in self._context_index:
+            return plans
+        for plan, _ in reversed(self._memory.values()):
+            if plan.context_id == context_id:
+                plans.append(plan)
+                if len(plans) >= limit:
+                    return plans
+        for plan_id, spilled_context_id in reversed(self._spilled.items()):
+            if spilled_context_id == context_id:
+                plan = self._read(plan_id)
+                if plan is not None:
+                    plans.append(plan)
+                    if len(plans) >= limit:
+                        break
+        return plans
+
+    def list_plan_ids(self, context_id: str) -> List[str]:
+        """列出Context下所有未被淘汰的计划ID（含磁盘上的）"""
+        return list(self._context_index.get(context_id, ()))
+
+    def clear_context(self, context_id: str):
+        """删除Context下的所有计划"""
+        for plan_id in self.list_plan_ids(context_id):
+            self.remove(plan_id)
+
+    def __len__(self) -> int:
+        return len(self._memory) + len(self._spilled)
+
+    def stats(self) -> Dict[str, int]:
+        """获取命中/溢出/淘汰计数及当前占用"""
+        return {
+            **self._stats,
+            "memory_plans": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "spilled_plans": len(self._spilled),
+            "max_plans": self.max_plans,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,25 +1,43 @@
 """Planner - 动态工具调用规划器，支持Context隔离"""
 
+import re
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
-from reme_ai import ReMeApp
-
-from ..memory import MemoryManager
+from ..memory import FlowUnavailableError, MemoryManager
+from ..tools import ParameterValidatorCache
 from ..types import (
     ToolDefinition,
+    ToolRegistryChange,
     PlanStep,
     Plan,
 )
 
+# 降级计划复用历史计划步骤所需的最低查询相似度（Jaccard），避免仅因个别常见词相同而复用
+DEGRADED_PLAN_MIN_SIMILARITY = 0.6
+# 降级时最多比较的历史计划数
+DEGRADED_PLAN_MAX_CANDIDATES = 100
+
 
 class ToolPlanner:
     """动态工具调用规划器 - 支持Context隔离"""
 
-    def __init__(self, memory_manager: MemoryManager, tool_registry = None):
+    def __init__(self, memory_manager: MemoryManager, tool_registry = None, plan_store = None):
         self.memory_manager = memory_manager
         self.tool_registry = tool_registry
+        # 已保存的计划（PlanStore），LLM不可用时从中查找相似查询的计划生成降级计划
+        self.plan_store = plan_store
+        # 工具描述prompt片段缓存: context_id -> (工具表内容哈希, prompt片段)
+        self._tools_prompt_cache: Dict[str, Tuple[str, str]] = {}
+        # 参数校验器按工具定义内容哈希编译并缓存
+        self._validators = ParameterValidatorCache()
+        if self.tool_registry:
+            self.tool_registry.subscribe(self._on_tools_changed)
+
+    def _on_tools_changed(self, change: ToolRegistryChange):
+        """工具表变更时精确失效对应Context的prompt片段缓存"""
+        self._tools_prompt_cache.pop(change.context_id, None)
 
     def get_available_tools(self, context_id: str = None) -> List[ToolDefinition]:
         """获取指定Context所有可用的工具
@@ -34,24 +52,22 @@ class ToolPlanner:
             return self.tool_registry.list_tools(context_id)
         return []
 
-    async def _build_planning_prompt(self, context_id: str, query: str,
-                                     personal_memory: str,
-                                     task_memory: str,
-                                     tool_memory: str) -> str:
-        """构建规划提示词
+    def _build_tools_prompt(self, context_id: str) -> str:
+        """构建可用工具的prompt片段，按工具表（含继承）内容哈希缓存
 
         Args:
             context_id: Context ID
-            query: 用户查询
-            personal_memory: 个人记忆
-            task_memory: 任务记忆
-            tool_memory: 工具记忆
 
         Returns:
-            规划提示词
+            工具描述文本
         """
         import json
 
+        content_hash = self.tool_registry.content_hash(context_id) if self.tool_registry else ""
+        cached = self._tools_prompt_cache.get(context_id)
+        if cached and cached[0] == content_hash:
+            return cached[1]
+
         tools = self.get_available_tools(context_id)
         tools_info = []
         for tool in tools:
@@ -62,6 +78,27 @@ class ToolPlanner:
             )
 
         tools_str = "\n".join(tools_info) if tools_info else "No tools registered"
+        if self.tool_registry:
+            self._tools_prompt_cache[context_id] = (content_hash, tools_str)
+        return tools_str
+
+    async def _build_planning_prompt(self, context_id: str, query: str,
+                                     personal_memory: str,
+                                     task_memory: str,
+                                     tool_memory: str) -> str:
+        """构建规划提示词
+
+        Args:
+            context_id: Context ID
+            query: 用户查询
+            personal_memory: 个人记忆
+            task_memory: 任务记忆
+            tool_memory: 工具记忆
+
+        Returns:
+            规划提示词
+        """
+        tools_str = self._build_tools_prompt(context_id)
 
         prompt = f"""你是一个智能规划助手，需要为用户查询规划工具调用步骤。
 
@@ -111,31 +148,46 @@ class ToolPlanner:
 """
         return prompt
 
-    async def plan(self, context_id: str, query: str) -> Plan:
+    async def plan(self, context_id: str, query: str, tier: Optional[str] = None,
+                   latency_budget_ms: Optional[float] = None) -> Plan:
         """根据查询生成工具调用计划（针对指定Context）
 
         Args:
             context_id: Context ID
             query: 用户查询
+            tier: 记忆检索质量档位（auto/full/fast）
+            latency_budget_ms: 整个规划的延迟预算（毫秒），扣除react近期p95后作为检索预算
 
         Returns:
             工具调用计划
         """
         import json
 
+        retrieval_budget_ms = latency_budget_ms
+        if latency_budget_ms is not None:
+            react_p95 = self.memory_manager.flow_p95("react")
+            if react_p95 is not None:
+                retrieval_budget_ms = max(0.0, latency_budget_ms - react_p95 * 1000)
+
         # 使用MemoryManager的get_combined_memory方法获取所有记忆
-        combined_memory = await self.memory_manager.get_combined_memory(context_id, query)
+        combined_memory = await self.memory_manager.get_combined_memory(
+            context_id, query, tier=tier, latency_budget_ms=retrieval_budget_ms
+        )
         personal_memory = combined_memory["personal_memory"]
         task_memory = combined_memory["task_memory"]
         tool_memory = combined_memory["tool_memory"]
 
         prompt = await self._build_planning_prompt(context_id, query, personal_memory, task_memory, tool_memory)
 
-        app = await self.memory_manager._get_app()
-        result = await app.async_execute(
-            name="react",
-            query=prompt,
-        )
+        # 经MemoryManager路由到Context所在的分片
+        try:
+            result = await self.memory_manager._execute(
+                "react",
+                context_id,
+                query=prompt,
+            )
+        except FlowUnavailableError as e:
+            return self._degraded_plan(context_id, query, task_memory, e)
 
         answer = result.get("answer", "") if result else ""
 
@@ -160,14 +212,23 @@ class ToolPlanner:
                 )
                 steps.append(step)
 
+            self.validate_steps(context_id, steps)
+
+            # LLM返回的context不是对象时忽略
+            plan_context = plan_data.get("context")
+            if not isinstance(plan_context, dict):
+                plan_context = {}
             plan = Plan(
                 plan_id=f"plan_{uuid.uuid4().hex[:8]}",
                 context_id=context_id,
                 query=query,
                 steps=steps,
-                context=plan_data.get("context", {}),
+                context={**plan_context, "retrieval_modes": combined_memory["retrieval_modes"]},
                 created_at=datetime.now().isoformat(),
             )
+            if steps:
+                # 规划所用的任务记忆在收到执行反馈后记录效用
+                self.memory_manager.bind_task_memories(context_id, plan.plan_id)
 
         except (json.JSONDecodeError, ValueError) as e:
             steps = []
@@ -182,6 +243,87 @@ class ToolPlanner:
 
         return plan
 
+    @staticmethod
+    def _query_terms(query: str) -> set:
+        # 英文按词、中文按字切分
+        return set(re.findall(r"[a-z0-9_]+|[\u4e00-\u9fff]", query.lower()))
+
+    def _degraded_plan(self, context_id: str, query: str, task_memory: str, error: Exception) -> Plan:
+        """LLM不可用时的降级计划：复用该Context已保存计划中查询足够相似（Jaccard不低于
+        DEGRADED_PLAN_MIN_SIMILARITY）的计划步骤；没有足够相似的计划时不返回步骤，只附带检索到的任务记忆
+
+        Args:
+            context_id: Context ID
+            query: 用户查询
+            task_memory: 检索到的（或缓存的）任务记忆
+            error: 不可用原因
+
+        Returns:
+            降级计划（context.degraded 为 True）
+        """
+        terms = self._query_terms(query)
+        best, best_score = None, 0.0
+        # 按最近使用顺序只读地取候选计划，后端不可用期间不打乱计划存储的LRU与命中统计
+        candidates = (self.plan_store.recent(context_id, DEGRADED_PLAN_MAX_CANDIDATES)
+                      if self.plan_store is not None and terms else [])
+        for candidate in candidates:
+            # 只复用LLM正常生成的计划
+            if not candidate.steps or candidate.context.get("degraded"):
+                continue
+            candidate_terms = self._query_terms(candidate.query)
+            score = len(terms & candidate_terms) / len(terms | candidate_terms)
+            if score >= DEGRADED_PLAN_MIN_SIMILARITY and score > best_score:
+                best, best_score = candidate, score
+
+        steps = [step.model_copy(deep=True) for step in best.steps] if best else []
+        for step in steps:
+            step.violations = []
+        self.validate_steps(context_id, steps)
+        context = {
+            "degraded": True,
+            "error": str(error),
+            "task_memory": task_memory,
+        }
+        if best:
+            context["based_on_plan_id"] = best.plan_id
+            context["based_on_query"] = best.query
+            context["similarity"] = round(best_score, 3)
+        return Plan(
+            plan_id=f"plan_{uuid.uuid4().hex[:8]}",
+            context_id=context_id,
+            query=query,
+            steps=steps,
+            context=context,
+            created_at=datetime.now().isoformat(),
+        )
+
+    def validate_steps(self, context_id: str, steps: List[PlanStep]) -> int:
+        """按工具args schema校验每个步骤的参数，问题写入step.violations
+
+        Args:
+            context_id: Context ID
+            steps: 规划步骤列表
+
+        Returns:
+            存在问题的步骤数量
+        """
+        if not self.tool_registry or not steps:
+            return 0
+        has_tools = self.tool_registry.count(context_id) > 0
+        invalid = 0
+        for step in steps:
+            def_id = self.tool_registry.get_definition_id(step.tool_name, step.domain, context_id)
+            if def_id is None:
+                # Context未注册任何工具时无从校验
+                if has_tools:
+                    step.violations = [f"tool {step.domain}.{step.tool_name} is not registered in context"]
+            else:
+                tool = self.tool_registry.get_definition(def_id)
+                step.violations = self._validators.validate(def_id, tool, step.parameters)
+            if step.violations:
+                invalid += 1
+        return invalid
+
     def validate_tool_exists(self, tool_name: str, domain: str, context_id: str) -> bool:
         """验证工具是否存在
 
@@ -1,23 +1,25 @@
 """Task-Plan MCP Server - 基于ReMe记忆的动态工具规划MCP服务器，支持Context隔离"""
 
 import os
-from reme_ai.core.utils import load_env
+from .startup import STARTUP, load_env
 load_env()
 
 import asyncio
-import json
 import argparse
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from mcp.server import Server
 from mcp.server.sse import SseServerTransport
 from mcp.types import TextContent
 
 from .tool_call import ServerMCPTools, ToolCallHandler
+from .encoding import ResponseEncoder
+from .static_assets import StaticAssetIndex
+from .workers import WORKER_TOKEN_HEADER
 
 from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 
 class TaskPlanMCPServer:
     """Task-Plan MCP服务器 - 支持Context隔离"""
@@ -25,8 +27,11 @@ class TaskPlanMCPServer:
     def __init__(
         self,
     ):
+        STARTUP.mark("imports")
         self.server = Server("task-plan-mcp-server")
-        self.tool_call_handler = ToolCallHandler()
+        with STARTUP.phase("tool_call_handler"):
+            self.tool_call_handler = ToolCallHandler()
+        self.encoder = ResponseEncoder.from_env()
 
         self._setup_handlers()
 
@@ -39,11 +44,53 @@ class TaskPlanMCPServer:
 
         @self.server.call_tool()
         async def call_tool(name: str, arguments: Dict[str, Any]):
+            client_name = self._client_name()
             try:
                 result = await self.tool_call_handler.handle_tool_call(name, arguments)
-                return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
+                return [TextContent(type="text", text=self.encoder.encode(result, client_name))]
             except Exception as e:
-                return [TextContent(type="text", text=json.dumps({"error": str(e)}, ensure_ascii=False, indent=2))]
+                return [TextContent(type="text", text=self.encoder.encode({"error": str(e)}, client_name))]
+
+    def _is_ready(self) -> bool:
+        """启动步骤已完成且记忆后端未启动失败（快速启动模式下后端在首次使用时启动）"""
+        return STARTUP.is_ready and self.tool_call_handler.memory_manager.startup_status()["state"] != "failed"
+
+    async def _route_context(self, request: Request, context_id: str) -> Optional[Any]:
+        """多worker部署时将Context相关的HTTP请求转发给归属worker（计划与记忆工作区只在归属worker上）
+
+        Returns:
+            归属worker的响应；应在本地处理时返回None
+        """
+        router = self.tool_call_handler.router
+        if router is None or router.is_forwarded(request.headers):
+            return None
+        owner = router.owner_of(context_id)
+        if owner == router.worker_id:
+            return None
+        return await router.proxy(owner, request.method, request.url.path, dict(request.query_params))
+
+    async def _aggregate_stats(self, request: Request, local: Dict[str, Any]) -> Dict[str, Any]:
+        """多worker部署时汇总各worker的同名统计：数值字段求和，其余取本worker的值"""
+        router = self.tool_call_handler.router
+        if router is None or router.is_forwarded(request.headers):
+            return local
+        total = dict(local)
+        for report in await router.gather(request.url.path, dict(request.query_params)):
+            for key, value in report.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                        isinstance(total.get(key), (int, float)) and not isinstance(total.get(key), bool):
+                    total[key] += value
+        return total
+
+    def _client_name(self) -> Optional[str]:
+        """获取当前请求所属客户端的名称（initialize时上报的clientInfo.name）"""
+        try:
+            client_params = self.server.request_context.session.client_params
+        except (LookupError, AttributeError):
+            return None
+        if client_params is None or client_params.clientInfo is None:
+            return None
+        return client_params.clientInfo.name
 
     def run(self, transport: str = "stdio", port: int = 8080):
         """运行MCP服务器"""
@@ -73,30 +120,54 @@ class TaskPlanMCPServer:
             context_manager_path = os.path.join(static_path, "context-manager")
             print(f"Context manager path: {context_manager_path} exists: {os.path.exists(context_manager_path)}")
 
+            # 启动时建立静态资源索引（预压缩 + ETag），请求时不再访问文件系统
+            static_assets = StaticAssetIndex(context_manager_path)
+            print(f"Context manager assets indexed: {static_assets.load()}")
+            STARTUP.mark("static_assets")
+
             @app.get("/")
             async def index(request: Request):
                 """主页面 - 支持 SPA 路由"""
-                index_path = os.path.join(context_manager_path, "index.html")
-                if os.path.exists(index_path):
-                    return FileResponse(index_path)
+                response = static_assets.respond("index.html", request.headers)
+                if response is not None:
+                    return response
                 return {"status": "ok", "service": "Task-Plan MCP Server", "transport": "sse"}
 
             @app.get("/context-manager{path:path}")
             async def context_manager_handler(request: Request, path: str):
                 """Context Manager 路由 - 支持 SPA 和静态文件"""
-                full_path = os.path.join(context_manager_path, path.lstrip('/'))                    
-                if os.path.exists(full_path) and os.path.isfile(full_path):
-                    return FileResponse(full_path)
-                else:
-                    index_path = os.path.join(context_manager_path, "index.html")
-                    if os.path.exists(index_path):
-                        return FileResponse(index_path)
+                response = static_assets.respond(path, request.headers)
+                if response is not None:
+                    return response
                 return {"status": "error", "message": "Not found", "path": path}
 
             @app.get("/health")
             async def health_check():
-                """健康检查端点，用于心跳检查"""
-                return {"status": "ok", "service": "Task-Plan MCP Server", "transport": "sse"}
+                """健康检查端点，用于心跳检查（进程存活即返回ok，就绪状态与启动耗时见ready/startup）"""
+                return {
+                    "status": "ok",
+                    "service": "Task-Plan MCP Server",
+                    "transport": "sse",
+                    "live": True,
+                    "ready": self._is_ready(),
+                    "startup": {
+                        **STARTUP.as_dict(),
+                        "memory": self.tool_call_handler.memory_manager.startup_status(),
+                    },
+                }
+
+            @app.get("/health/live")
+            async def liveness_check():
+                """存活检查：进程能处理请求即返回200"""
+                return {"status": "ok"}
+
+            @app.get("/health/ready")
+            async def readiness_check():
+                """就绪检查：启动步骤（含快照恢复）完成前返回503"""
+                if not self._is_ready():
+                    return Response(content=self.encoder.encode({"status": "starting"}),
+                                    media_type="application/json", status_code=503)
+                return {"status": "ready"}
 
             @app.get("/sse")
             async def sse_endpoint(request: Request):
@@ -114,9 +185,12 @@ class TaskPlanMCPServer:
                     return {"error": str(e), "contexts": []}
 
             @app.get("/api/contexts/{context_id}")
-            async def get_context(context_id: str):
+            async def get_context(request: Request, context_id: str):
                 """获取上下文详情"""
                 try:
+                    routed = await self._route_context(request, context_id)
+                    if routed is not None:
+                        return routed
                     config = self.tool_call_handler.memory_manager.get_context(context_id)
                     tools = self.tool_call_handler.tool_registry.list_tools(context_id)
                     if config:
@@ -127,21 +201,308 @@ class TaskPlanMCPServer:
                 except Exception as e:
                     return {"error": str(e)}
 
+            @app.post("/api/contexts/{context_id}/fork")
+            async def fork_context(context_id: str, name: str = "", description: str = ""):
+                """从已有上下文派生新上下文（工具与记忆写时复制）"""
+                try:
+                    return await self.tool_call_handler.handle_tool_call(
+                        "fork_context", {"context_id": context_id, "name": name, "description": description})
+                except Exception as e:
+                    return {"error": str(e)}
+
             @app.get("/api/contexts/{context_id}/memory")
-            async def get_combined_memory(context_id: str, query: str, summarize: bool = False):
+            async def get_combined_memory(request: Request, context_id: str, query: str, summarize: bool = False,
+                                          tier: Optional[str] = None, latency_budget_ms: Optional[float] = None,
+                                          include_parent: bool = False, max_depth: int = 2,
+                                          hierarchical: bool = False):
                 """获取组合的memory（personal + task + tool）"""
                 try:
+                    routed = await self._route_context(request, context_id)
+                    if routed is not None:
+                        return routed
                     memory = await self.tool_call_handler.memory_manager.get_combined_memory(
-                        context_id, query, summarize
+                        context_id, query, summarize, include_parent=include_parent, max_depth=max_depth,
+                        tier=tier, latency_budget_ms=latency_budget_ms, hierarchical=hierarchical
                     )
                     return memory
                 except Exception as e:
                     return {"error": str(e)}
 
+            @app.get("/api/tools/memo")
+            async def tool_memo_stats(request: Request):
+                """幂等工具结果索引的条目数与命中统计（多worker时为各worker之和）"""
+                return await self._aggregate_stats(request, self.tool_call_handler.tool_memo.stats())
+
+            @app.get("/api/tools/search")
+            async def search_tools(request: Request, q: str, context_id: str = None, limit: int = 20):
+                """检索工具（按domain/工具名/描述排序）"""
+                try:
+                    if context_id:
+                        routed = await self._route_context(request, context_id)
+                        if routed is not None:
+                            return routed
+                    hits = self.tool_call_handler.tool_registry.search(q, context_id=context_id, limit=limit)
+                    return {"query": q, "tools": [h.model_dump() for h in hits]}
+                except Exception as e:
+                    return {"error": str(e), "tools": []}
+
+            @app.get("/api/tools/stats")
+            async def tool_registry_stats():
+                """工具注册表内存统计（唯一定义 vs 引用）"""
+                return self.tool_call_handler.tool_registry.memory_stats()
+
+            @app.get("/api/contexts/{context_id}/plans/{plan_id}")
+            async def get_plan(request: Request, context_id: str, plan_id: str):
+                """获取计划详情"""
+                try:
+                    routed = await self._route_context(request, context_id)
+                except Exception as e:
+                    return {"error": str(e)}
+                if routed is not None:
+                    return routed
+                plan = self.tool_call_handler.get_plan(context_id, plan_id)
+                if plan:
+                    return plan.model_dump()
+                return {"error": "Plan not found", "context_id": context_id, "plan_id": plan_id}
+
+            @app.get("/api/plans/stats")
+            async def plan_store_stats(request: Request):
+                """计划存储统计（命中/溢出/淘汰，多worker时为各worker之和）"""
+                return await self._aggregate_stats(request, self.tool_call_handler.plan_store.stats())
+
+            @app.get("/api/events")
+            async def event_stream(request: Request):
+                """变更事件流（SSE），支持 Last-Event-ID 断线续传"""
+                last_event_id = request.headers.get("last-event-id")
+                last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+                events = self.tool_call_handler.events
+
+                async def stream():
+                    subscription = events.subscribe(last_event_id)
+                    next_event = None
+                    try:
+                        yield "retry: 3000\n\n"
+                        while not await request.is_disconnected():
+                            if next_event is None:
+                                next_event = asyncio.ensure_future(subscription.__anext__())
+                            done, _ = await asyncio.wait({next_event}, timeout=15)
+                            if not done:
+                                yield ": keepalive\n\n"
+                                continue
+                            event, next_event = next_event.result(), None
+                            yield event.to_sse()
+                    finally:
+                        if next_event is not None:
+                            next_event.cancel()
+                        await subscription.aclose()
+
+                return StreamingResponse(stream(), media_type="text/event-stream",
+                                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+            @app.get("/api/events/stats")
+            async def event_stats():
+                """事件推送统计"""
+                return self.tool_call_handler.events.stats()
+
+            @app.on_event("startup")
+            async def start_shared_state_sync():
+                """多worker部署时启动共享状态同步"""
+                if self.tool_call_handler.shared_state is not None:
+                    self.tool_call_handler.shared_state.start()
+
+            @app.on_event("startup")
+            async def restore_snapshots():
+                """从最近一次快照恢复状态并启动定期快照"""
+                snapshots = self.tool_call_handler.snapshots
+                if snapshots is not None:
+                    try:
+                        # 快速启动时只恢复Context目录与工具，工作区在首次访问时加载
+                        with STARTUP.phase("snapshot_restore"):
+                            restored = await snapshots.restore(lazy=self.tool_call_handler.fast_start)
+                        print(f"Snapshot restore: {restored}")
+                    except Exception as e:
+                        print(f"Error restoring snapshot: {str(e)}")
+                    snapshots.start()
+
+            @app.on_event("shutdown")
+            async def final_snapshot():
+                """关闭前写入最后一次快照"""
+                if self.tool_call_handler.snapshots is not None:
+                    try:
+                        await self.tool_call_handler.snapshots.stop()
+                    except Exception as e:
+                        print(f"Error taking final snapshot: {str(e)}")
+
+            @app.on_event("startup")
+            async def start_task_memory_pruner():
+                """启动任务记忆的定期修剪"""
+                self.tool_call_handler.memory_manager.start_pruner()
+
+            @app.post("/internal/tool_call")
+            async def internal_tool_call(request: Request):
+                """worker间转发的工具调用（仅限携带共享令牌的本机请求）"""
+                router = self.tool_call_handler.router
+                if router is None or request.headers.get(WORKER_TOKEN_HEADER) != router.token:
+                    return Response(status_code=403)
+                body = await request.json()
+                try:
+                    result = await self.tool_call_handler.handle_local_tool_call(body["name"], body["arguments"])
+                except Exception as e:
+                    result = {"error": str(e)}
+                return Response(content=self.encoder.encode(result), media_type="application/json")
+
+            @app.get("/api/workers/stats")
+            async def worker_stats():
+                """多worker路由与共享状态同步统计"""
+                handler = self.tool_call_handler
+                if handler.router is None:
+                    return {"workers": 1}
+                return {"router": handler.router.stats(), "shared_state": handler.shared_state.stats()}
+
+            @app.get("/api/memory/shards")
+            async def memory_shard_stats():
+                """记忆分片负载（调用数、进行中、平均耗时、承载的Context数）"""
+                return {"shards": self.tool_call_handler.memory_manager.shard_stats()}
+
+            @app.get("/api/memory/scheduler")
+            async def memory_scheduler_stats():
+                """flow优先级调度统计（各类别排队数与等待时间）"""
+                return self.tool_call_handler.memory_manager.scheduler_stats()
+
+            @app.get("/api/memory/limiters")
+            async def memory_limiter_stats():
+                """LLM/Embedding后端自适应并发上限"""
+                return {"limiters": self.tool_call_handler.memory_manager.limiter_stats()}
+
+            @app.get("/api/memory/resilience")
+            async def memory_resilience_stats():
+                """flow截止时间、对冲与熔断状态"""
+                return self.tool_call_handler.memory_manager.resilience_stats()
+
+            @app.get("/api/memory/embeddings")
+            async def memory_embedding_stats():
+                """Embedding批处理与向量缓存统计"""
+                return {"batchers": self.tool_call_handler.memory_manager.embedding_stats()}
+
+            @app.get("/api/snapshots")
+            async def snapshot_stats():
+                """快照耗时、大小与恢复统计"""
+                if self.tool_call_handler.snapshots is None:
+                    return {"enabled": False}
+                return {"enabled": True, **self.tool_call_handler.snapshots.stats()}
+
+            @app.post("/api/snapshots")
+            async def take_snapshot():
+                """立即执行一次增量快照"""
+                if self.tool_call_handler.snapshots is None:
+                    return {"error": "snapshots are not enabled (set SNAPSHOT_DIR)"}
+                try:
+                    return await self.tool_call_handler.snapshots.snapshot()
+                except Exception as e:
+                    return {"error": str(e)}
+
+            @app.get("/api/memory/profiles")
+            async def memory_profile_stats():
+                """共享智能体画像数、引用画像的Context数与去重次数"""
+                return self.tool_call_handler.memory_manager.profile_stats()
+
+            @app.get("/api/memory/forks")
+            async def memory_fork_stats():
+                """fork数量、仍共享源工作区的fork数与工作区复制耗时"""
+                return self.tool_call_handler.memory_manager.fork_stats()
+
+            @app.get("/api/memory/pruning")
+            async def memory_pruning_stats():
+                """任务记忆使用记录与修剪统计（各工作区修剪前后的规模趋势）"""
+                return self.tool_call_handler.memory_manager.pruning_stats()
+
+            @app.post("/api/memory/pruning")
+            async def prune_task_memory(request: Request, context_id: Optional[str] = None):
+                """立即修剪任务记忆（可只修剪指定Context）"""
+                try:
+                    if context_id:
+                        routed = await self._route_context(request, context_id)
+                        if routed is not None:
+                            return routed
+                    return {"results": await self.tool_call_handler.memory_manager.prune_task_memory(context_id)}
+                except Exception as e:
+                    return {"error": str(e)}
+
+            @app.post("/api/memory/shards")
+            async def add_memory_shard():
+                """新增记忆分片并重新平衡"""
+                try:
+                    moved = await self.tool_call_handler.memory_manager.add_shard()
+                    return {"moved": moved, "shards": self.tool_call_handler.memory_manager.shard_stats()}
+                except Exception as e:
+                    return {"error": str(e)}
+
+            @app.post("/api/contexts/{context_id}/shard/{shard}")
+            async def move_context_shard(request: Request, context_id: str, shard: int):
+                """将Context迁移到指定记忆分片（隔离重负载租户）"""
+                try:
+                    routed = await self._route_context(request, context_id)
+                    if routed is not None:
+                        return routed
+                    moved = await self.tool_call_handler.memory_manager.move_context(context_id, shard)
+                    return {"context_id": context_id, "shard": shard, "moved": moved}
+                except Exception as e:
+                    return {"error": str(e)}
+
+            @app.on_event("startup")
+            async def mark_ready():
+                """全部启动步骤完成后标记就绪（需最后注册）"""
+                STARTUP.ready()
+
             # 挂载 SSE 消息处理
             app.mount("/messages/", sse_transport.handle_post_message)
             uvicorn.run(app, host='0.0.0.0', port=port)
 
+def _run_worker(worker_id: int, port: int, transport: str, env: Dict[str, str]):
+    """worker进程入口"""
+    os.environ.update(env)
+    os.environ["TASK_PLAN_WORKER_ID"] = str(worker_id)
+    server = TaskPlanMCPServer()
+    server.run(transport=transport, port=port)
+
+
+def run_workers(workers: int, transport: str = "sse", port: int = 8080):
+    """以多worker模式运行：每个worker是独立进程，依次监听 port, port+1, ...
+
+    Context与工具注册表通过本机SQLite（WAL）共享，每个Context归属创建它的worker，
+    其他worker收到该Context的调用时转发给归属worker。
+    """
+    import multiprocessing
+    import secrets
+    import tempfile
+
+    shared_state_path = os.getenv(
+        "SHARED_STATE_PATH",
+        os.path.join(tempfile.gettempdir(), "task-plan-mcp-server", "shared_state.db"),
+    )
+    os.makedirs(os.path.dirname(shared_state_path), exist_ok=True)
+    # 记忆工作区不跨进程重启保留，共享状态随之重建
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(shared_state_path + suffix):
+            os.remove(shared_state_path + suffix)
+
+    ports = [port + i for i in range(workers)]
+    env = {
+        "TASK_PLAN_WORKER_PORTS": ",".join(str(p) for p in ports),
+        "TASK_PLAN_WORKER_TOKEN": secrets.token_hex(16),
+        "SHARED_STATE_PATH": shared_state_path,
+    }
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker_id, worker_port in enumerate(ports):
+        process = context.Process(target=_run_worker, args=(worker_id, worker_port, transport, env),
+                                  name=f"task-plan-worker-{worker_id}")
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+
+
 if __name__ == "__main__":
     """主入口"""
     import argparse
@@ -149,9 +510,14 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Task-Plan MCP Server")
     parser.add_argument("--transport", default="sse", choices=["sse"], help="Transport type (sse)")
     parser.add_argument("--port", type=int, default=8080, help="Port for Http Api")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes, listening on port, port+1, ...")
 
     args = parser.parse_args()
 
-    server = TaskPlanMCPServer()
-    server.run(transport=args.transport, port=args.port)
+    if args.workers > 1:
+        run_workers(args.workers, transport=args.transport, port=args.port)
+    else:
+        server = TaskPlanMCPServer()
+        server.run(transport=args.transport, port=args.port)
     
@@ -0,0 +1,254 @@
+"""SharedState - 多worker进程间共享的Context与工具注册表状态（SQLite WAL）"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .types import ContextConfig, ToolDefinition, ToolRegistryChange
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contexts (
+    context_id TEXT PRIMARY KEY,
+    config TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS owners (
+    context_id TEXT PRIMARY KEY,
+    worker_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tools (
+    context_id TEXT NOT NULL,
+    tool_key TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    PRIMARY KEY (context_id, tool_key)
+);
+CREATE TABLE IF NOT EXISTS parents (
+    context_id TEXT PRIMARY KEY,
+    parent_context_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    worker_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    context_id TEXT NOT NULL
+);
+"""
+
+
+class SharedStateStore:
+    """共享状态存储 - 同一主机上的多个worker进程通过WAL模式的SQLite共享Context与工具
+
+    每次写入同时追加一条变更记录，其他worker轮询变更记录并同步到本进程状态。
+    Context的归属worker在首次创建（或首次被访问）时确定并持久化，之后不再变化。
+    """
+
+    def __init__(self, path: str, worker_id: int = 0):
+        self.path = path
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, statements: List[Tuple[str, tuple]], kind: str, context_id: str):
+        """在一个事务内执行写入并追加变更记录"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute(
+                    "INSERT INTO changes (worker_id, kind, context_id) VALUES (?, ?, ?)",
+                    (self.worker_id, kind, context_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def put_context(self, config: ContextConfig):
+        """保存Context配置（归属为当前worker）"""
+        self._write([
+            ("INSERT OR REPLACE INTO contexts (context_id, config) VALUES (?, ?)",
+             (config.context_id, config.model_dump_json())),
+            ("INSERT OR IGNORE INTO owners (context_id, worker_id) VALUES (?, ?)",
+             (config.context_id, self.worker_id)),
+        ], "context", config.context_id)
+
+    def delete_context(self, context_id: str):
+        """删除Context配置"""
+        self._write([("DELETE FROM contexts WHERE context_id = ?", (context_id,))], "context", context_id)
+
+    def get_context(self, context_id: str) -> Optional[ContextConfig]:
+        rows = self._query("SELECT config FROM contexts WHERE context_id = ?", (context_id,))
+        return ContextConfig.model_validate_json(rows[0][0]) if rows else None
+
+    def list_contexts(self) -> List[ContextConfig]:
+        return [ContextConfig.model_validate_json(row[0]) for row in self._query("SELECT config FROM contexts")]
+
+    def claim_owner(self, context_id: str, worker_count: int) -> int:
+        """获取Context的归属worker，未登记时按context_id哈希确定并登记
+
+        Args:
+            context_id: Context ID
+            worker_count: worker总数
+
+        Returns:
+            归属worker编号
+        """
+        rows = self._query("SELECT worker_id FROM owners WHERE context_id = ?", (context_id,))
+        if rows:
+            return rows[0][0]
+        worker_id = zlib.crc32(context_id.encode("utf-8")) % worker_count
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO owners (context_id, worker_id) VALUES (?, ?)",
+                               (context_id, worker_id))
+            # 并发登记时以先写入者为准
+            return self._conn.execute("SELECT worker_id FROM owners WHERE context_id = ?",
+                                      (context_id,)).fetchone()[0]
+
+    def put_tools(self, context_id: str, tools: List[ToolDefinition], parent_context_id: Optional[str]):
+        """整体替换Context直接注册的工具与父Context"""
+        statements: List[Tuple[str, tuple]] = [("DELETE FROM tools WHERE context_id = ?", (context_id,))]
+        for tool in tools:
+            statements.append((
+                "INSERT OR REPLACE INTO tools (context_id, tool_key, definition) VALUES (?, ?, ?)",
+                (context_id, f"{tool.domain}.{tool.tool_name}", tool.model_dump_json()),
+            ))
+        if parent_context_id:
+            statements.append(("INSERT OR REPLACE INTO parents (context_id, parent_context_id) VALUES (?, ?)",
+                               (context_id, parent_context_id)))
+        else:
+            statements.append(("DELETE FROM parents WHERE context_id = ?", (context_id,)))
+        self._write(statements, "tools", context_id)
+
+    def get_tools(self, context_id: str) -> Tuple[List[ToolDefinition], Optional[str]]:
+        """获取Context直接注册的工具与父Context"""
+        tools = [ToolDefinition.model_validate_json(row[0]) for row in
+                 self._query("SELECT definition FROM tools WHERE context_id = ?", (context_id,))]
+        parents = self._query("SELECT parent_context_id FROM parents WHERE context_id = ?", (context_id,))
+        return tools, parents[0][0] if parents else None
+
+    def list_tool_context_ids(self) -> List[str]:
+        """列出登记过工具或父Context的Context ID"""
+        return [row[0] for row in self._query(
+            "SELECT context_id FROM tools UNION SELECT context_id FROM parents")]
+
+    def changes_since(self, seq: int, limit: int = 1000) -> List[Tuple[int, str, str]]:
+        """获取其他worker在指定序号之后的变更
+
+        Returns:
+            (序号, 类型, Context ID) 列表
+        """
+        return self._query(
+            "SELECT seq, kind, context_id FROM changes WHERE seq > ? AND worker_id != ? ORDER BY seq LIMIT ?",
+            (seq, self.worker_id, limit),
+        )
+
+    def last_seq(self) -> int:
+        rows = self._query("SELECT MAX(seq) FROM changes")
+        return rows[0][0] or 0
+
+
+class SharedStateSync:
+    """共享状态同步 - 本进程的写入写穿到共享存储，其他worker的写入轮询后应用到本进程"""
+
+    def __init__(self, store: SharedStateStore, memory_manager, tool_registry, events=None,
+                 poll_interval: float = 0.5):
+        self.store = store
+        self.memory_manager = memory_manager
+        self.tool_registry = tool_registry
+        self.events = events
+        self.poll_interval = poll_interval
+        self._seq = 0
+        self._applying = False
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"applied": 0, "written": 0, "last_sync": 0.0}
+        tool_registry.subscribe(self._on_tools_changed)
+
+    def _on_tools_changed(self, change: ToolRegistryChange):
+        """本进程的工具变更写穿到共享存储（同步其他worker的变更时跳过）"""
+        if self._applying:
+            return
+        context_id = change.context_id
+        self.store.put_tools(context_id, list(self.tool_registry.list_own_tools(context_id)),
+                             self.tool_registry.get_parent(context_id))
+        self._stats["written"] += 1
+
+    def bootstrap(self):
+        """加载共享存储中已有的全部状态"""
+        self._seq = self.store.last_seq()
+        for config in self.store.list_contexts():
+            self.memory_manager.adopt_context(config)
+        for context_id in self.store.list_tool_context_ids():
+            self._apply_tools(context_id)
+
+    def _apply_tools(self, context_id: str):
+        tools, parent_context_id = self.store.get_tools(context_id)
+        self._applying = True
+        try:
+            self.tool_registry.set_parent(context_id, parent_context_id)
+            self.tool_registry.replace_context(tools, context_id)
+        finally:
+            self._applying = False
+
+    def _apply_context(self, context_id: str):
+        config = self.store.get_context(context_id)
+        if config is None:
+            self.memory_manager.forget_context(context_id)
+            return
+        is_new = self.memory_manager.get_context(context_id) is None
+        self.memory_manager.adopt_context(config)
+        if is_new and self.events is not None:
+            self.events.publish("context.created", context_id, config)
+
+    def sync_once(self) -> int:
+        """应用其他worker的新变更
+
+        Returns:
+            应用的变更数量
+        """
+        changes = self.store.changes_since(self._seq)
+        # 同一Context的多次变更只需按最新状态应用一次
+        latest: Dict[Tuple[str, str], int] = {}
+        for seq, kind, context_id in changes:
+            latest[(kind, context_id)] = seq
+            self._seq = seq
+        for kind, context_id in sorted(latest, key=latest.__getitem__):
+            try:
+                if kind == "context":
+                    self._apply_context(context_id)
+                elif kind == "tools":
+                    self._apply_tools(context_id)
+            except Exception as e:
+                print(f"Error applying shared state change {kind} for {context_id}: {str(e)}")
+        self._stats["applied"] += len(latest)
+        self._stats["last_sync"] = time.time()
+        return len(latest)
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"Error syncing shared state: {str(e)}")
+
+    def start(self):
+        """启动后台轮询（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll_loop())
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "seq": self._seq, "worker_id": self.store.worker_id}
@@ -0,0 +1,355 @@
+"""SnapshotManager - 定期对全部工作区、Context目录与工具注册表做增量压缩快照，启动时并行或按需恢复"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .types import ContextConfig, ToolDefinition
+
+_MANIFEST = "manifest.json"
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _gzip_file(src: str, dest: str, level: int) -> int:
+    """流式压缩文件，先写临时文件再原子替换
+
+    Returns:
+        压缩后的字节数
+    """
+    tmp = f"{dest}.tmp"
+    with open(src, "rb") as fin, gzip.open(tmp, "wb", compresslevel=level) as fout:
+        shutil.copyfileobj(fin, fout, _CHUNK_SIZE)
+    os.replace(tmp, dest)
+    return os.path.getsize(dest)
+
+
+def _gunzip_file(src: str, dest: str):
+    with gzip.open(src, "rb") as fin, open(dest, "wb") as fout:
+        shutil.copyfileobj(fin, fout, _CHUNK_SIZE)
+
+
+def _write_json_gz(path: str, payload: Any, level: int) -> int:
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=level) as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+class SnapshotManager:
+    """快照管理器
+
+    快照目录结构：
+    - manifest.json：快照序号、目录文件、每个Context对应的工作区文件
+    - catalog.json.gz：Context配置、直接注册的工具与父Context
+    - workspaces/<workspace_id>.jsonl.gz：工作区（vector_store dump后的JSONL流式压缩）；
+      仍共享源工作区的fork不导出，只记录源Context；Context引用的共享智能体画像工作区按画像ID保存
+
+    增量：只有自上次快照以来经写入类flow修改过的工作区（或新建的Context）才重新导出，
+    目录内容未变化时不重写；已删除Context的工作区文件随之清理。
+    """
+
+    def __init__(self, memory_manager, tool_registry, snapshot_dir: str, interval: float = 300.0,
+                 restore_concurrency: int = 4, compress_level: int = 6, history_size: int = 20):
+        """初始化
+
+        Args:
+            memory_manager: MemoryManager实例
+            tool_registry: ToolRegistry实例
+            snapshot_dir: 快照目录
+            interval: 快照周期（秒），<=0 时只在手动触发时快照
+            restore_concurrency: 恢复时并行加载的工作区数
+            compress_level: gzip压缩级别（1-9）
+            history_size: 保留的快照记录数
+        """
+        self.memory_manager = memory_manager
+        self.tool_registry = tool_registry
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self.restore_concurrency = restore_concurrency
+        self.compress_level = compress_level
+        self._workspace_dir = os.path.join(snapshot_dir, "workspaces")
+        self._manifest: Dict[str, Any] = {"seq": 0, "catalog": None, "catalog_hash": "", "workspaces": {}}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self._last_restore: Optional[Dict[str, Any]] = None
+        self._stats = {"snapshots": 0, "errors": 0, "workspaces_written": 0, "bytes_written": 0}
+
+    @classmethod
+    def from_env(cls, memory_manager, tool_registry, worker_id: Optional[str] = None) -> Optional["SnapshotManager"]:
+        """从环境变量创建，未配置 SNAPSHOT_DIR 时返回None
+
+        SNAPSHOT_DIR: 快照目录（多worker时每个worker使用独立子目录）
+        SNAPSHOT_INTERVAL: 快照周期（秒，默认300，0表示只手动触发）
+        SNAPSHOT_RESTORE_CONCURRENCY: 恢复并行度（默认4）
+        SNAPSHOT_COMPRESS_LEVEL: gzip压缩级别（默认6）
+        """
+        snapshot_dir = os.getenv("SNAPSHOT_DIR")
+        if not snapshot_dir:
+            return None
+        if worker_id:
+            snapshot_dir = os.path.join(snapshot_dir, f"worker-{worker_id}")
+        return cls(
+            memory_manager,
+            tool_registry,
+            snapshot_dir,
+            interval=float(os.getenv("SNAPSHOT_INTERVAL", "300")),
+            restore_concurrency=int(os.getenv("SNAPSHOT_RESTORE_CONCURRENCY", "4")),
+            compress_level=int(os.getenv("SNAPSHOT_COMPRESS_LEVEL", "6")),
+        )
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.snapshot_dir, _MANIFEST)
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self):
+        tmp = f"{self._manifest_path()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self._manifest_path())
+
+    def _catalog(self) -> Dict[str, Any]:
+        contexts = []
+        for info in self.memory_manager.list_contexts():
+            config = self.memory_manager.get_context(info.context_id)
+            if config is None:
+                continue
+            contexts.append({
+                "config": config.model_dump(mode="json"),
+                "tools": [tool.model_dump(mode="json") for tool in self.tool_registry.list_own_tools(config.context_id)],
+                "parent_context_id": self.tool_registry.get_parent(config.context_id),
+            })
+        return {"contexts": contexts}
+
+    async def _dump_workspace(self, context_id: str, workspace_id: str, staging: str) -> Optional[Dict[str, Any]]:
+        """导出并压缩一个工作区，工作区为空（不存在）时返回None"""
+        await self.memory_manager.dump_memory(context_id, staging)
+        raw_path = os.path.join(staging, f"{workspace_id}.jsonl")
+        if not os.path.exists(raw_path):
+            return None
+        dest = os.path.join(self._workspace_dir, f"{workspace_id}.jsonl.gz")
+        raw_bytes = os.path.getsize(raw_path)
+        size = await asyncio.to_thread(_gzip_file, raw_path, dest, self.compress_level)
+        os.remove(raw_path)
+        return {"file": os.path.basename(dest), "bytes": size, "raw_bytes": raw_bytes, "updated_at": time.time()}
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """执行一次增量快照
+
+        Returns:
+            快照耗时、写入的工作区数与字节数
+        """
+        async with self._lock:
+            start = time.perf_counter()
+            os.makedirs(self._workspace_dir, exist_ok=True)
+            workspaces: Dict[str, Any] = self._manifest["workspaces"]
+            # 共享的智能体画像工作区与Context工作区一样导出
+            contexts = {info.context_id for info in self.memory_manager.list_contexts()}
+            contexts |= self.memory_manager.profile_ids()
+            dirty = self.memory_manager.take_dirty_contexts() & contexts
+            # 源Context已删除的fork需要导出自身的工作区（导出时会先复制源工作区）
+            orphaned = {context_id for context_id, entry in workspaces.items()
+                        if entry.get("fork_of") and entry["fork_of"] not in contexts}
+            changed = sorted(dirty | (contexts - workspaces.keys()) | (orphaned & contexts))
+            written, bytes_written, failed = 0, 0, []
+
+            with tempfile.TemporaryDirectory(prefix="snapshot-", dir=self.snapshot_dir) as staging:
+                for context_id in changed:
+                    source = self.memory_manager.fork_source(context_id)
+                    if source is not None and source in contexts:
+                        # 仍共享源工作区的fork只记录源Context，恢复时重建fork关系
+                        self._remove_workspace_file(workspaces.get(context_id))
+                        workspaces[context_id] = {"file": None, "fork_of": source, "bytes": 0, "raw_bytes": 0,
+                                                  "updated_at": time.time()}
+                        written += 1
+                        continue
+                    workspace_id = self.memory_manager._get_workspace_id(context_id)
+                    try:
+                        entry = await self._dump_workspace(context_id, workspace_id, staging)
+                    except Exception as e:
+                        failed.append(context_id)
+                        print(f"Error snapshotting workspace for {context_id}: {str(e)}")
+                        continue
+                    if entry is None:
+                        self._remove_workspace_file(workspaces.get(context_id))
+                        entry = {"file": None, "bytes": 0, "raw_bytes": 0, "updated_at": time.time()}
+                    workspaces[context_id] = entry
+                    written += 1
+                    bytes_written += entry["bytes"]
+            # 导出失败的工作区留待下次快照
+            self.memory_manager.mark_dirty_contexts(failed)
+
+            for context_id in list(workspaces.keys() - contexts):
+                self._remove_workspace_file(workspaces.pop(context_id))
+
+            catalog = self._catalog()
+            catalog_hash = hashlib.sha1(json.dumps(catalog, sort_keys=True).encode("utf-8")).hexdigest()
+            catalog_written = catalog_hash != self._manifest["catalog_hash"]
+            if catalog_written:
+                path = os.path.join(self.snapshot_dir, "catalog.json.gz")
+                bytes_written += await asyncio.to_thread(_write_json_gz, path, catalog, self.compress_level)
+                self._manifest["catalog"] = os.path.basename(path)
+                self._manifest["catalog_hash"] = catalog_hash
+
+            self._manifest["seq"] += 1
+            self._manifest["created_at"] = time.time()
+            self._write_manifest()
+
+            report = {
+                "seq": self._manifest["seq"],
+                "time": self._manifest["created_at"],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "workspaces_written": written,
+                "workspaces_skipped": len(contexts) - written - len(failed),
+                "workspaces_failed": len(failed),
+                "catalog_written": catalog_written,
+                "bytes_written": bytes_written,
+                "total_bytes": sum(entry["bytes"] for entry in workspaces.values()),
+            }
+            self._stats["snapshots"] += 1
+            self._stats["errors"] += len(failed)
+            self._stats["workspaces_written"] += written
+            self._stats["bytes_written"] += bytes_written
+            self._history.append(report)
+            return report
+
+    def _remove_workspace_file(self, entry: Optional[Dict[str, Any]]):
+        if entry and entry.get("file"):
+            try:
+                os.remove(os.path.join(self._workspace_dir, entry["file"]))
+            except FileNotFoundError:
+                pass
+
+    async def _load_workspace(self, context_id: str):
+        """解压快照中的工作区并加载到向量库"""
+        entry = self._manifest["workspaces"].get(context_id) or {}
+        if not entry.get("file"):
+            return
+        workspace_id = self.memory_manager._get_workspace_id(context_id)
+        with tempfile.TemporaryDirectory(prefix="restore-", dir=self.snapshot_dir) as directory:
+            await asyncio.to_thread(_gunzip_file, os.path.join(self._workspace_dir, entry["file"]),
+                                    os.path.join(directory, f"{workspace_id}.jsonl"))
+            await self.memory_manager.load_memory(context_id, directory)
+
+    async def restore(self, lazy: bool = False) -> Dict[str, Any]:
+        """从最近一次快照恢复Context目录、工具注册表与全部工作区
+
+        Args:
+            lazy: 只恢复目录与工具，工作区在每个Context首次访问时加载；否则工作区并行加载，
+                加载失败的工作区同样改为首次访问时重试
+
+        Returns:
+            恢复耗时、Context数与工作区数
+        """
+        async with self._lock:
+            start = time.perf_counter()
+            manifest = self._read_manifest()
+            if manifest is None:
+                return {"restored": False}
+            self._manifest = manifest
+
+            contexts = 0
+            adopted = set()
+            if manifest.get("catalog"):
+                with gzip.open(os.path.join(self.snapshot_dir, manifest["catalog"]), "rt", encoding="utf-8") as f:
+                    catalog = json.load(f)
+                for item in catalog["contexts"]:
+                    config = ContextConfig.model_validate(item["config"])
+                    # 多worker时共享存储在启动时重建，恢复的Context需重新登记归属，工具变更经订阅写穿
+                    self.memory_manager.restore_context(config)
+                    adopted.add(config.context_id)
+                    self.tool_registry.set_parent(config.context_id, item.get("parent_context_id"))
+                    self.tool_registry.replace_context(
+                        [ToolDefinition.model_validate(tool) for tool in item["tools"]], config.context_id)
+                    contexts += 1
+
+            entries = {context_id: entry for context_id, entry in manifest["workspaces"].items() if entry.get("file")}
+            failed: List[str] = []
+            if not lazy:
+                semaphore = asyncio.Semaphore(max(1, self.restore_concurrency))
+
+                async def load(context_id: str):
+                    async with semaphore:
+                        try:
+                            await self._load_workspace(context_id)
+                        except Exception as e:
+                            failed.append(context_id)
+                            print(f"Error restoring workspace for {context_id}: {str(e)}")
+
+                await asyncio.gather(*(load(context_id) for context_id in entries))
+                # 恢复写入的工作区与快照一致，无需在下次快照时重新导出
+                self.memory_manager.take_dirty_contexts()
+            for context_id in (entries if lazy else failed):
+                self.memory_manager.defer_hydration(context_id, self._load_workspace)
+            for context_id, entry in manifest["workspaces"].items():
+                if entry.get("fork_of"):
+                    self.memory_manager.restore_fork(context_id, entry["fork_of"])
+            # 不属于任何Context的工作区是共享画像，已加载或延迟加载时视为已写入
+            for profile_id in entries.keys() - adopted:
+                self.memory_manager.restore_profile(profile_id)
+
+            self._last_restore = {
+                "restored": True,
+                "lazy": lazy,
+                "seq": manifest["seq"],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "contexts": contexts,
+                "workspaces": 0 if lazy else len(entries) - len(failed),
+                "workspaces_deferred": len(entries) if lazy else len(failed),
+                "bytes": sum(entry["bytes"] for entry in entries.values()),
+            }
+            return self._last_restore
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                print(f"Error taking snapshot: {str(e)}")
+
+    def start(self):
+        """启动定期快照（需在事件循环中调用）"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """停止定期快照并写入最后一次快照"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.snapshot()
+
+    def stats(self) -> Dict[str, Any]:
+        """快照耗时、大小与最近一次恢复的统计"""
+        workspaces = self._manifest["workspaces"]
+        return {
+            **self._stats,
+            "snapshot_dir": self.snapshot_dir,
+            "interval": self.interval,
+            "seq": self._manifest["seq"],
+            "workspaces": len(workspaces),
+            "total_bytes": sum(entry["bytes"] for entry in workspaces.values()),
+            "total_raw_bytes": sum(entry.get("raw_bytes", 0) for entry in workspaces.values()),
+            "pending_dirty": len(self.memory_manager.dirty_contexts()),
+            "last_restore": self._last_restore,
+            "history": list(self._history),
+        }
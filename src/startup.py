@@ -0,0 +1,71 @@
+"""Startup - 轻量的.env加载与启动阶段计时（不导入reme_ai，快速启动模式下服务可立即接受连接）"""
+
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def load_env(path: Optional[str] = None) -> Optional[Path]:
+    """加载.env到环境变量（与reme_ai的load_env规则一致：当前目录及最多5级父目录中的第一个.env）
+
+    Args:
+        path: 指定.env路径（可选）
+
+    Returns:
+        加载的文件路径，未找到时返回None
+    """
+    candidates = [Path(path)] if path else [directory / ".env" for directory in [Path.cwd(), *Path.cwd().parents[:5]]]
+    for env_path in candidates:
+        if not env_path.exists():
+            continue
+        with env_path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                os.environ[key.strip()] = value.strip().strip("'\"")
+        return env_path
+    return None
+
+
+class StartupTimings:
+    """启动阶段计时：mark记录距上一阶段的耗时，ready标记服务就绪"""
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._last = self._origin
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+
+    def mark(self, name: str):
+        """记录从上一个阶段结束到现在的耗时"""
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last) * 1000, 2)
+        self._last = now
+        print(f"Startup phase {name}: {self.phases[name]}ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录代码块的耗时"""
+        self._last = time.perf_counter()
+        yield
+        self.mark(name)
+
+    def ready(self):
+        """标记服务就绪"""
+        self.ready_ms = round((time.perf_counter() - self._origin) * 1000, 2)
+        print(f"Startup ready after {self.ready_ms}ms")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.ready_ms is not None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"phases": dict(self.phases), "ready_ms": self.ready_ms}
+
+
+# 进程级启动计时，从服务模块导入时开始
+STARTUP = StartupTimings()
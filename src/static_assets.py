@@ -0,0 +1,180 @@
+"""StaticAssets - context-manager前端静态资源的预压缩内存索引"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Mapping, Optional
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，缺失时只提供gzip
+    brotli = None
+
+# Vite构建产物中带内容哈希的文件名，如 assets/index-B1x_9a-Q.js
+_HASHED_ASSET_PATTERN = re.compile(r"^assets/[^/]+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+# 低于该大小或已压缩格式的文件不做预压缩
+_MIN_COMPRESS_SIZE = 1024
+_INCOMPRESSIBLE_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp", "font/woff", "font/woff2")
+
+_IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+_REVALIDATE_CACHE = "no-cache"
+
+
+class StaticAsset:
+    """单个静态资源及其预压缩变体"""
+
+    __slots__ = ("path", "media_type", "cache_control", "variants")
+
+    def __init__(self, path: str, media_type: str, cache_control: str, body: bytes):
+        self.path = path
+        self.media_type = media_type
+        self.cache_control = cache_control
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        # 内容编码 -> (内容, 强ETag)，""表示未压缩
+        self.variants: Dict[str, tuple] = {"": (body, f'"{digest}"')}
+
+    def add_variant(self, encoding: str, body: bytes):
+        identity_etag = self.variants[""][1]
+        self.variants[encoding] = (body, f'{identity_etag[:-1]}-{encoding}"')
+
+
+def _accepted_encodings(header: str) -> set:
+    """解析Accept-Encoding，返回q值大于0的编码"""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name)
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 弱比较"""
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class StaticAssetIndex:
+    """静态资源索引 - 启动时读取整个构建目录并预压缩，请求时不访问文件系统
+
+    带内容哈希的资源使用 immutable 长缓存，其余（如 index.html）每次协商；
+    所有响应携带强ETag，If-None-Match 命中时返回304。
+    """
+
+    def __init__(self, root: str, spa_index: str = "index.html"):
+        self.root = root
+        self.spa_index = spa_index
+        self._assets: Dict[str, StaticAsset] = {}
+
+    def load(self) -> int:
+        """扫描构建目录并建立索引
+
+        Returns:
+            索引的资源数量
+        """
+        assets: Dict[str, StaticAsset] = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.endswith((".gz", ".br")):
+                        continue
+                    full_path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                    try:
+                        assets[rel_path] = self._load_asset(full_path, rel_path)
+                    except OSError as e:
+                        print(f"Error loading static asset {rel_path}: {str(e)}")
+        self._assets = assets
+        return len(assets)
+
+    def _load_asset(self, full_path: str, rel_path: str) -> StaticAsset:
+        with open(full_path, "rb") as f:
+            body = f.read()
+        media_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+        cache_control = _IMMUTABLE_CACHE if _HASHED_ASSET_PATTERN.search(rel_path) else _REVALIDATE_CACHE
+        asset = StaticAsset(rel_path, media_type, cache_control, body)
+        if len(body) < _MIN_COMPRESS_SIZE or media_type in _INCOMPRESSIBLE_TYPES:
+            return asset
+
+        # 构建流程已生成的压缩文件优先，否则在此压缩
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            prebuilt = full_path + suffix
+            if os.path.isfile(prebuilt):
+                with open(prebuilt, "rb") as f:
+                    asset.add_variant(encoding, f.read())
+        if "gzip" not in asset.variants:
+            asset.add_variant("gzip", gzip.compress(body, compresslevel=9, mtime=0))
+        if "br" not in asset.variants and brotli is not None:
+            asset.add_variant("br", brotli.compress(body, quality=11))
+        # 压缩后反而更大的变体没有意义
+        for encoding in [e for e in asset.variants if e and len(asset.variants[e][0]) >= len(body)]:
+            del asset.variants[encoding]
+        return asset
+
+    def __len__(self) -> int:
+        return len(self._assets)
+
+    def __contains__(self, path: str) -> bool:
+        return path.lstrip("/") in self._assets
+
+    def lookup(self, path: str) -> Optional[StaticAsset]:
+        """按相对路径查找资源，不存在时回退到SPA入口"""
+        asset = self._assets.get(path.lstrip("/"))
+        if asset is None:
+            asset = self._assets.get(self.spa_index)
+        return asset
+
+    def respond(self, path: str, headers: Mapping[str, str]) -> Optional[Response]:
+        """生成资源响应
+
+        Args:
+            path: 相对于构建目录的路径
+            headers: 请求头
+
+        Returns:
+            响应（可能是304），资源和SPA入口都不存在时返回None
+        """
+        asset = self.lookup(path)
+        if asset is None:
+            return None
+
+        encoding = ""
+        if len(asset.variants) > 1:
+            accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+            for candidate in ("br", "gzip"):
+                if candidate in asset.variants and candidate in accepted:
+                    encoding = candidate
+                    break
+        body, etag = asset.variants[encoding]
+
+        response_headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=response_headers)
+
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.media_type, headers=response_headers)
@@ -1,6 +1,6 @@
 """工具调用处理器 - 处理MCP工具调用逻辑"""
 import asyncio
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Set
 from mcp.types import Tool
 
 ServerMCPTools = [
@@ -37,6 +37,21 @@ ServerMCPTools = [
             "required": ["name"],
         },
     ),
+    Tool(
+        name="fork_context",
+        description="Fork an existing context for a sub-agent: the new context starts with the source context's tools "
+                    "and memories (copied on first write) without re-summarization or recursive parent retrieval",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "context_id": {"type": "string", "description": "Source context ID"},
+                "name": {"type": "string", "description": "New context name (optional, defaults to the source name)"},
+                "description": {"type": "string", "description": "New context description (optional)"},
+                "metadata": {"type": "object", "description": "Extra metadata (optional)"},
+            },
+            "required": ["context_id"],
+        },
+    ),
     Tool(
         name="save_important_plan_feedback_memory",
         description="Save important plan feedback memory with conversation history for a context",
@@ -131,6 +146,10 @@ ServerMCPTools = [
             "properties": {
                 "context_id": {"type": "string", "description": "Context ID"},
                 "query": {"type": "string", "description": "User query to plan for"},
+                "tier": {"type": "string", "enum": ["auto", "full", "fast"], "default": "auto",
+                         "description": "Memory retrieval quality tier; auto downgrades to fast flows under load"},
+                "latency_budget_ms": {"type": "number",
+                                      "description": "Latency budget for planning; heavy retrieval flows whose recent p95 exceeds it are replaced by fast ones; ignored with tier=full (optional)"},
                 "tools": {
                     "type": "array",
                     "description": "List of tool definitions for dynamic planning (optional)",
@@ -143,6 +162,10 @@ ServerMCPTools = [
                             "args": {"type": "object"},
                             "input": {"type": "object"},
                             "output": {"type": "object"},
+                            "idempotent": {"type": "boolean", "default": False,
+                                           "description": "Read-only tool whose results can be reused for identical parameters"},
+                            "result_ttl": {"type": "number", "default": 0,
+                                           "description": "Seconds a result of an idempotent tool stays reusable"},
                         },
                         "required": ["domain", "tool_name", "description"],
                     },
@@ -151,6 +174,19 @@ ServerMCPTools = [
             "required": ["context_id", "query"],
         },
     ),
+    Tool(
+        name="search_tools",
+        description="Search registered tools by domain, tool name and description, within one context or across all contexts",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Search keywords"},
+                "context_id": {"type": ["string", "null"], "description": "Limit the search to this context (optional, includes inherited tools)", "nullable": True},
+                "limit": {"type": "integer", "description": "Max number of results", "default": 20},
+            },
+            "required": ["query"],
+        },
+    ),
     Tool(
         name="query_combined_memory",
         description="Get combined personal and task memory for a context",
@@ -159,24 +195,65 @@ ServerMCPTools = [
             "properties": {
                 "context_id": {"type": "string", "description": "Context ID"},
                 "query": {"type": "string", "description": "Query to retrieve relevant memories"},
+                "tier": {"type": "string", "enum": ["auto", "full", "fast"], "default": "auto",
+                         "description": "Retrieval quality tier; auto downgrades to fast flows under load"},
+                "latency_budget_ms": {"type": "number",
+                                      "description": "Latency budget; heavy flows whose recent p95 exceeds it are replaced by fast ones; ignored with tier=full (optional)"},
+                "include_parent": {"type": "boolean", "default": False,
+                                   "description": "Also include memories of ancestor contexts"},
+                "max_depth": {"type": "integer", "default": 2, "description": "Max number of ancestor levels"},
+                "hierarchical": {"type": "boolean", "default": False,
+                                 "description": "With include_parent, search the context and its ancestors in one pass "
+                                                "and return a single ranked list with depth-based score decay"},
             },
             "required": ["context_id", "query"],
         },
     ),
+    Tool(
+        name="batch",
+        description="Run several tool calls in one round-trip. Operations without references run concurrently; "
+                    "an argument value {\"$ref\": \"<op id or index>.<path>\"} is replaced by a field of an earlier result "
+                    "(e.g. {\"$ref\": \"ctx.context_id\"}). Errors are reported per operation.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "operations": {
+                    "type": "array",
+                    "description": "Ordered list of tool calls",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string", "description": "Operation ID used in references (optional, defaults to its index; must be unique and must not equal another operation's index)"},
+                            "name": {"type": "string", "description": "Tool name"},
+                            "arguments": {"type": "object", "description": "Tool arguments"},
+                        },
+                        "required": ["name"],
+                    },
+                },
+            },
+            "required": ["operations"],
+        },
+    ),
 ]
 
 import os
+import tempfile
 
 from .memory import MemoryManager
 from .types import (
     ToolDefinition,
+    ToolRegistryChange,
     Plan,
     PlanExecutionResult,
 )
 
-from .planner import ToolPlanner, DynamicPlanAdjuster
+from .planner import ToolPlanner, DynamicPlanAdjuster, PlanStore
 
-from .tools import ToolRegistry
+from .tools import ToolRegistry, ToolResultMemo
+from .events import EventBus
+from .shared_state import SharedStateStore, SharedStateSync
+from .snapshots import SnapshotManager
+from .workers import WorkerRouter
 
 class ToolCallHandler:
     """工具调用处理器"""
@@ -187,20 +264,183 @@ class ToolCallHandler:
         self.llm_model = os.getenv("FLOW_LLM_MODEL", "qwen3-30b-a3b-thinking-2507")
         self.embedding_model = os.getenv("FLOW_EMBEDDING_MODEL", "text-embedding-v4")
         self.tool_registry = ToolRegistry()
-        self.memory_manager = MemoryManager(self.llm_model, self.embedding_model, tool_registry=self.tool_registry)
-        self.tool_planner = ToolPlanner(self.memory_manager, self.tool_registry)
+        shard_threads = os.getenv("MEMORY_SHARD_THREADS")
+        # 快速启动：reme_ai的导入与ReMeApp启动推迟到第一次使用，快照中的工作区在首次访问时加载
+        self.fast_start = os.getenv("FAST_START", "0") == "1"
+        self.memory_manager = MemoryManager(
+            self.llm_model,
+            self.embedding_model,
+            tool_registry=self.tool_registry,
+            shard_count=int(os.getenv("MEMORY_SHARDS", "1")),
+            shard_threads=int(shard_threads) if shard_threads else None,
+            adaptive_concurrency=os.getenv("ADAPTIVE_CONCURRENCY", "1") != "0",
+            lazy_start=self.fast_start,
+        )
         self.plan_adjuster = DynamicPlanAdjuster(self.memory_manager)
-        self._context_plans: Dict[str, Plan] = {}
+        worker_id = os.getenv("TASK_PLAN_WORKER_ID")
+        spill_dir = os.getenv("PLAN_STORE_SPILL_DIR",
+                              os.path.join(tempfile.gettempdir(), "task-plan-mcp-server", "plans"))
+        self.plan_store = PlanStore(
+            max_plans=int(os.getenv("PLAN_STORE_MAX_PLANS", "1000")),
+            max_bytes=int(os.getenv("PLAN_STORE_MAX_BYTES", str(64 * 1024 * 1024))),
+            # 多worker时每个worker独立的溢出目录（计划只保存在Context的归属worker上）
+            spill_dir=os.path.join(spill_dir, f"worker-{worker_id}") if worker_id else spill_dir,
+            max_spilled=int(os.getenv("PLAN_STORE_MAX_SPILLED", "100000")),
+        )
+        self.tool_planner = ToolPlanner(self.memory_manager, self.tool_registry, self.plan_store)
+        # 变更事件推送（context/tool/plan/memory写入），供管理界面增量更新
+        self.events = EventBus(interval=float(os.getenv("EVENT_PUSH_INTERVAL", "0.5")))
+        self.tool_registry.subscribe(self._on_tools_changed)
+        # 多worker部署（--workers N）：Context与工具注册表经共享存储同步，调用按context_id路由到归属worker
+        self.shared_state: Optional[SharedStateSync] = None
+        self.router: Optional[WorkerRouter] = None
+        if worker_id:
+            store = SharedStateStore(os.environ["SHARED_STATE_PATH"], int(worker_id))
+            self.memory_manager.attach_shared_state(store)
+            self.shared_state = SharedStateSync(
+                store, self.memory_manager, self.tool_registry, self.events,
+                poll_interval=float(os.getenv("SHARED_STATE_POLL_INTERVAL", "0.5")),
+            )
+            self.shared_state.bootstrap()
+            self.router = WorkerRouter.from_env(store)
+        # 全部工作区、Context目录与工具注册表的增量压缩快照（配置SNAPSHOT_DIR时启用）
+        self.snapshots: Optional[SnapshotManager] = SnapshotManager.from_env(
+            self.memory_manager, self.tool_registry, worker_id)
+        # 幂等工具的近期结果：(工具, 规范化参数) -> 输出
+        self.tool_memo = ToolResultMemo.from_env()
+        self.memory_manager.subscribe_context_removed(self._on_context_removed)
         # 初始化异步队列用于后台处理工具调用，设置最大容量
         self._tool_call_queue: asyncio.Queue = asyncio.Queue(maxsize=1000)  # 设置队列最大容量为1000
         # 初始化后台任务为None，延迟到第一次调用异步方法时创建
         self._background_task = None
+        # 进行中的智能体画像写入任务（仅由create_context创建，客户端无法直接调用）
+        self._profile_tasks: Set[asyncio.Task] = set()
     
-    def _get_context_plans(self, context_id: str) -> Dict[str, Plan]:
-        """获取context的计划字典"""
-        if context_id not in self._context_plans:
-            self._context_plans[context_id] = {}
-        return self._context_plans[context_id]
+    def _on_tools_changed(self, change: ToolRegistryChange):
+        """工具注册表变更时推送该Context及继承其工具的后代Context解析后的工具列表
+        （推送时才计算，同一窗口内只算一次）"""
+        for context_id in [change.context_id, *self.tool_registry.descendants(change.context_id)]:
+            self.events.publish("tools.changed", context_id, self._tools_payload(context_id))
+
+    def _tools_payload(self, context_id: str) -> Callable[[], Dict[str, Any]]:
+        return lambda: {
+            "content_hash": self.tool_registry.content_hash(context_id),
+            "tools": self.tool_registry.list_tools(context_id),
+        }
+
+    def _on_context_removed(self, context_id: str):
+        """Context被删除（含其他worker删除后在本worker移除）时清理结果索引并推送事件"""
+        self.tool_memo.forget(context_id)
+        self.events.publish("context.deleted", context_id, {"context_id": context_id})
+
+    @staticmethod
+    def _collect_refs(value: Any, refs: List[str]):
+        """收集参数中所有 {"$ref": "..."} 引用"""
+        if isinstance(value, dict):
+            if set(value) == {"$ref"} and isinstance(value["$ref"], str):
+                refs.append(value["$ref"])
+                return
+            for item in value.values():
+                ToolCallHandler._collect_refs(item, refs)
+        elif isinstance(value, list):
+            for item in value:
+                ToolCallHandler._collect_refs(item, refs)
+
+    @staticmethod
+    def _resolve_refs(value: Any, results: Dict[str, Any]) -> Any:
+        """将参数中的引用替换为前序操作结果中的字段"""
+        if isinstance(value, dict):
+            if set(value) == {"$ref"} and isinstance(value["$ref"], str):
+                op_id, _, path = value["$ref"].partition(".")
+                current = results[op_id]
+                for part in path.split(".") if path else []:
+                    if isinstance(current, list) and part.isdigit():
+                        current = current[int(part)]
+                    elif isinstance(current, dict):
+                        current = current[part]
+                    else:
+                        current = getattr(current, part)
+                return current
+            return {k: ToolCallHandler._resolve_refs(v, results) for k, v in value.items()}
+        if isinstance(value, list):
+            return [ToolCallHandler._resolve_refs(v, results) for v in value]
+        return value
+
+    async def _handle_batch(self, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """批量执行工具调用
+
+        每个操作只等待它引用的前序操作，互不依赖的操作并发执行。
+
+        Args:
+            operations: 操作列表，每项包含 id（可选）、name、arguments
+
+        Returns:
+            按输入顺序排列的各操作结果
+
+        Raises:
+            ValueError: 操作id重复，或与其他操作的下标相同
+        """
+        op_ids = [str(op.get("id", i)) for i, op in enumerate(operations)]
+        # 引用可以使用操作id或下标，两者必须唯一指向一个操作
+        positions: Dict[str, int] = {}
+        for i, op_id in enumerate(op_ids):
+            if op_id in positions:
+                raise ValueError(f"duplicate operation id {op_id!r}")
+            positions[op_id] = i
+        for i, op_id in enumerate(op_ids):
+            if str(i) in positions and positions[str(i)] != i:
+                raise ValueError(f"operation id {op_ids[positions[str(i)]]!r} conflicts with the index of operation {op_id!r}")
+            positions[str(i)] = i
+
+        results: List[Any] = [None] * len(operations)
+        tasks: List[asyncio.Task] = []
+
+        async def run(index: int, op: Dict[str, Any]) -> Dict[str, Any]:
+            name = op.get("name")
+            arguments = op.get("arguments") or {}
+            if name == "batch":
+                raise ValueError("nested batch is not supported")
+            refs: List[str] = []
+            self._collect_refs(arguments, refs)
+            referenced: Dict[str, Any] = {}
+            for ref in refs:
+                key = ref.partition(".")[0]
+                dep = positions.get(key)
+                if dep is None or dep >= index:
+                    raise ValueError(f"reference {ref!r} does not point to an earlier operation")
+                dep_result = await tasks[dep]
+                if not dep_result["success"]:
+                    raise ValueError(f"operation {op_ids[dep]!r} referenced by {ref!r} failed")
+                referenced[key] = results[dep]
+            resolved = self._resolve_refs(arguments, referenced)
+            result = await self.handle_tool_call(name, resolved)
+            results[index] = result
+            return result
+
+        async def run_safe(index: int, op: Dict[str, Any]) -> Dict[str, Any]:
+            entry = {"id": op_ids[index], "name": op.get("name"), "success": False}
+            try:
+                result = await run(index, op)
+                # 没有显式 success: true 且带有 error 的结果同样视为失败，引用它的操作不会执行
+                success = result.get("success") if isinstance(result, dict) else None
+                entry["success"] = success is True or (success is None and not (
+                    isinstance(result, dict) and "error" in result))
+                entry["result"] = result
+            except Exception as e:
+                entry["error"] = f"{type(e).__name__}: {str(e)}" if isinstance(e, (KeyError, IndexError)) else str(e)
+            return entry
+
+        for i, op in enumerate(operations):
+            tasks.append(asyncio.ensure_future(run_safe(i, op)))
+        entries = await asyncio.gather(*tasks)
+        return {
+            "success": all(entry["success"] for entry in entries),
+            "results": entries,
+        }
+
+    def get_plan(self, context_id: str, plan_id: str) -> Optional[Plan]:
+        """按plan_id获取context下的计划（内存或磁盘溢出）"""
+        return self.plan_store.get(plan_id, context_id)
     
     async def _process_tool_call_queue(self) -> None:
         """后台处理工具调用队列"""
@@ -219,21 +459,27 @@ class ToolCallHandler:
                         arguments["messages"],
                         arguments.get("metadata"),
                     )
+                    self.events.publish("memory.write", arguments["context_id"], {"memory_type": "task"}, key="task")
                 
                 elif name == "save_tool_execution_feedback_memory":
                     context_id = arguments["context_id"]
                     plan_id = arguments["plan_id"]
                     feedback = arguments["execution_feedback"]
                     
+                    # 反馈中缺少工具名/领域时，按step_id从原计划补全
+                    plan = self.get_plan(context_id, plan_id)
+                    plan_steps = {s.step_id: s for s in plan.steps} if plan else {}
+                    
                     results = []
                     for f in feedback:
                         from datetime import datetime
+                        step = plan_steps.get(f.get("step_id", ""))
                         results.append(PlanExecutionResult(
                             plan_id=plan_id,
                             context_id=context_id,
                             step_id=f.get("step_id", ""),
-                            tool_name=f.get("tool_name", ""),
-                            domain=f.get("domain", ""),
+                            tool_name=f.get("tool_name") or (step.tool_name if step else ""),
+                            domain=f.get("domain") or (step.domain if step else ""),
                             success=f["success"],
                             input=f.get("input"),
                             output=f.get("output"),
@@ -257,6 +503,11 @@ class ToolCallHandler:
                                     output={}
                                 )
                                 self.tool_registry.register(tool_def, context_id)
+                            elif result.success:
+                                # 幂等工具的成功结果供后续计划复用
+                                tool_def = self.tool_registry.get(result.tool_name, result.domain, context_id)
+                                self.tool_memo.record(context_id, tool_def, result.input, result.output,
+                                                      plan_id=plan_id, step_id=result.step_id)
                             
                             # 调用learn_from_execution方法记录工具执行结果
                             await self.plan_adjuster.learn_from_execution(
@@ -269,6 +520,11 @@ class ToolCallHandler:
                                 execution_time=result.execution_time,
                                 token_cost=result.token_cost,
                             )
+                    # 全部步骤成功时，计划所用的任务记忆记为有效
+                    self.memory_manager.record_plan_feedback(
+                        plan_id, bool(results) and all(result.success for result in results)
+                    )
+                    self.events.publish("memory.write", context_id, {"memory_type": "tool"}, key="tool")
                 
                 elif name == "compress_all_local_history_messages":
                     await self.memory_manager.write_working_memory(
@@ -277,6 +533,7 @@ class ToolCallHandler:
                         keep_recent_count=arguments.get("keep_recent_count", 2),
                         metadata=arguments.get("metadata"),
                     )
+                    self.events.publish("memory.write", arguments["context_id"], {"memory_type": "working"}, key="working")
             except Exception as e:
                 # 捕获并记录异常，防止后台任务崩溃
                 print(f"Error processing tool call {name}: {str(e)}")
@@ -284,14 +541,31 @@ class ToolCallHandler:
                 # 标记任务完成
                 self._tool_call_queue.task_done()
     
+    async def _ingest_agent_profile(self, context_id: str, metadata: Optional[Dict[str, Any]]):
+        """后台写入Context的智能体画像"""
+        try:
+            await self.memory_manager.ensure_agent_profile(context_id, metadata)
+            self.events.publish("memory.write", context_id, {"memory_type": "personal"}, key="personal")
+        except Exception as e:
+            print(f"Error ingesting agent profile for context {context_id}: {str(e)}")
+
     async def handle_tool_call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """处理工具调用"""
+        """处理工具调用，多worker部署时转发给Context的归属worker"""
+        if self.router is not None:
+            owner = self.router.route(name, arguments)
+            if owner is not None:
+                return await self.router.forward(owner, name, arguments)
+        return await self.handle_local_tool_call(name, arguments)
+
+    async def handle_local_tool_call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """在当前进程处理工具调用"""
         
         # 延迟创建后台任务，确保事件循环已经运行
         if self._background_task is None:
             self._background_task = asyncio.create_task(self._process_tool_call_queue())
+            self.memory_manager.start_pruner()
         
-        # 对于plan_tool_calls、get_combined_memory和create_context，直接同步处理
+        # 对于plan_tool_calls、get_combined_memory、search_tools、create_context和fork_context，直接同步处理
         if name == "create_context":
             agent_info = None
             if "agent" in arguments and arguments["agent"]:
@@ -305,26 +579,6 @@ class ToolCallHandler:
             )
             context_id = config.context_id
         
-            # Handle agent memory setup if provided
-            agent_result = None
-            if agent_info:
-                env_info = agent_info.get("environment", {})
-                env_str = ", ".join([f"{k.replace('_version', '')}: {v}" for k, v in env_info.items() if v]) if env_info else None
-                content_parts = [
-                    f"Context Description: {config.description}",
-                    f"Agent Name: {agent_info.get('name', 'N/A')}",
-                    f"Agent Role: {agent_info.get('role', 'N/A')}",
-                    f"Terminal User: {agent_info.get('terminal_user', 'N/A')}",
-                    f"Terminal Type: {agent_info.get('terminal_type', 'N/A')}",
-                    f"Environment: {env_str if env_str else 'N/A'}",
-                ]
-                agent_content = "\n".join(content_parts)
-                agent_result = await self.memory_manager.set_personal_memory(
-                    context_id,
-                    [{"role": "assistant", "content": agent_content}],
-                    arguments.get("metadata"),
-                )
-            
             result = {
                 "success": True,
                 "context_id": context_id,
@@ -333,15 +587,39 @@ class ToolCallHandler:
                 "created_at": config.created_at
             }
 
-            if agent_result:
-                result["agent_memory_result"] = agent_result.model_dump()
+            # 智能体画像写入共享画像工作区（相同画像只总结一次），在后台任务中执行，不阻塞Context创建
+            if agent_info and self.memory_manager.profile_pending(context_id):
+                task = asyncio.create_task(self._ingest_agent_profile(context_id, arguments.get("metadata")))
+                self._profile_tasks.add(task)
+                task.add_done_callback(self._profile_tasks.discard)
+                result["agent_profile"] = "pending"
+            elif agent_info:
+                result["agent_profile"] = "stored"
+            self.events.publish("context.created", context_id, config)
 
             return result
             
+        elif name == "fork_context":
+            config = self.memory_manager.fork_context(
+                arguments["context_id"],
+                name=arguments.get("name", ""),
+                description=arguments.get("description", ""),
+                metadata=arguments.get("metadata"),
+            )
+            self.events.publish("context.created", config.context_id, config)
+            return {
+                "success": True,
+                "context_id": config.context_id,
+                "forked_from": arguments["context_id"],
+                "name": config.name,
+                "description": config.description,
+                "tool_count": self.tool_registry.count(config.context_id),
+                "created_at": config.created_at,
+            }
+
         elif name == "plan_tool_calls":
             context_id = arguments["context_id"]
             query = arguments["query"]
-            context_plans = self._get_context_plans(context_id)
             
             # 动态工具定义支持
             temp_tools = []
@@ -353,18 +631,32 @@ class ToolCallHandler:
                         description=t["description"],
                         args=t.get("args", {}),
                         input=t.get("input", {}),
-                        output=t.get("output", {})
+                        output=t.get("output", {}),
+                        idempotent=t.get("idempotent", False),
+                        result_ttl=t.get("result_ttl", 0.0),
                     ))
                 self.tool_registry.register_batch(temp_tools, context_id)
             
-            plan = await self.tool_planner.plan(context_id, query)
-            context_plans[plan.plan_id] = plan
+            plan = await self.tool_planner.plan(
+                context_id, query, arguments.get("tier"), arguments.get("latency_budget_ms")
+            )
+            # 标注幂等工具在有效期内已有结果的步骤
+            memoized_step_count = self.tool_memo.annotate(plan, self.tool_registry)
+            self.plan_store.put(plan)
+            self.events.publish("plan.created", context_id, {
+                "plan_id": plan.plan_id,
+                "query": plan.query,
+                "step_count": len(plan.steps),
+                "created_at": plan.created_at,
+            }, key=plan.plan_id)
             return {
                 "success": True,
                 "plan_id": plan.plan_id,
                 "context_id": plan.context_id,
                 "query": plan.query,
-                "steps": [s.model_dump() for s in plan.steps],
+                "steps": plan.steps,
+                "invalid_step_count": sum(1 for s in plan.steps if s.violations),
+                "memoized_step_count": memoized_step_count,
                 "context": plan.context,
                 "created_at": plan.created_at,
             }
@@ -373,10 +665,26 @@ class ToolCallHandler:
             combined = await self.memory_manager.get_combined_memory(
                 arguments["context_id"],
                 arguments["query"],
-                True,
+                arguments.get("summarize", True),
+                include_parent=arguments.get("include_parent", False),
+                max_depth=arguments.get("max_depth", 2),
+                tier=arguments.get("tier"),
+                latency_budget_ms=arguments.get("latency_budget_ms"),
+                hierarchical=arguments.get("hierarchical", False),
             )
             return {"success": True, "context_id": arguments["context_id"], "query": arguments["query"], **combined}
         
+        elif name == "batch":
+            return await self._handle_batch(arguments.get("operations") or [])
+
+        elif name == "search_tools":
+            hits = self.tool_registry.search(
+                arguments["query"],
+                context_id=arguments.get("context_id"),
+                limit=arguments.get("limit", 20),
+            )
+            return {"success": True, "query": arguments["query"], "tools": hits}
+
         # 其他所有工具调用，放入异步队列处理，直接返回success
         else:
             # 检查队列是否已满，如果未满则放入队列，否则丢弃
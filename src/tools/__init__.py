@@ -1,6 +1,12 @@
 """Tools模块 - 客户端tool管理"""
+from .memo import ToolResultMemo
 from .registry import ToolRegistry
+from .search import ToolSearchIndex
+from .validator import ParameterValidatorCache
 
 __all__ = [
     "ToolRegistry",
+    "ToolSearchIndex",
+    "ParameterValidatorCache",
+    "ToolResultMemo",
 ]
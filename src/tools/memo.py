@@ -0,0 +1,163 @@
+"""ToolResultMemo - 幂等工具的近期结果索引
+
+按 (Context, 工具, 规范化参数) 记录幂等工具最近一次成功执行的输出，在工具定义的
+result_ttl 内有效。规划时据此标注结果已知的步骤，Agent可直接使用已知输出、跳过重复执行。
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..types import Plan, PlanStep, ToolDefinition
+from .validator import _is_reference
+
+# (context_id, domain, tool_name, 规范化参数)
+MemoKey = Tuple[str, str, str, str]
+
+
+def canonical_params(params: Any) -> str:
+    """参数的规范化JSON表示（键有序、无多余空白），键顺序或格式不同的相同参数得到相同结果"""
+    return json.dumps(params if params is not None else {}, ensure_ascii=False, sort_keys=True,
+                      separators=(",", ":"), default=str)
+
+
+def _has_reference(value: Any) -> bool:
+    """参数中是否含有引用前序步骤输出的占位值"""
+    if isinstance(value, dict):
+        return any(_has_reference(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_reference(item) for item in value)
+    return _is_reference(value)
+
+
+def memoizable_step(step: PlanStep) -> bool:
+    """步骤参数是否在规划时已完全确定（无依赖、无引用），只有这样的步骤才能按参数匹配已知结果"""
+    return not step.depends_on and not _has_reference(step.parameters)
+
+
+class ToolResultMemo:
+    """幂等工具结果的LRU索引，条目在写入时按工具的 result_ttl 确定过期时间"""
+
+    def __init__(self, max_entries: int = 10000, max_output_bytes: int = 64 * 1024):
+        """初始化
+
+        Args:
+            max_entries: 最多保留的条目数，超出时淘汰最久未使用的条目
+            max_output_bytes: 输出序列化后超过此大小时不记录
+        """
+        self.max_entries = max_entries
+        self.max_output_bytes = max_output_bytes
+        self._entries: "OrderedDict[MemoKey, Dict[str, Any]]" = OrderedDict()
+        self._stats = {"recorded": 0, "skipped_large": 0, "skipped_input": 0, "hits": 0, "misses": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls) -> "ToolResultMemo":
+        """从环境变量创建
+
+        TOOL_MEMO_MAX_ENTRIES: 最多保留的条目数（默认10000，0关闭）
+        TOOL_MEMO_MAX_OUTPUT_BYTES: 可记录的最大输出（默认65536字节）
+        """
+        import os
+        return cls(
+            max_entries=int(os.getenv("TOOL_MEMO_MAX_ENTRIES", "10000")),
+            max_output_bytes=int(os.getenv("TOOL_MEMO_MAX_OUTPUT_BYTES", str(64 * 1024))),
+        )
+
+    def record(self, context_id: str, tool: ToolDefinition, params: Any, output: Any,
+               plan_id: str = "", step_id: str = "") -> bool:
+        """记录一次成功执行的结果，工具未标记为幂等、未设置有效期或反馈中缺少输入参数时忽略
+
+        Args:
+            context_id: Context ID
+            tool: 工具定义
+            params: 调用参数
+            output: 工具输出
+            plan_id: 产生该结果的计划ID
+            step_id: 产生该结果的步骤ID
+
+        Returns:
+            是否记录
+        """
+        if tool is None or not tool.idempotent or tool.result_ttl <= 0 or self.max_entries <= 0:
+            return False
+        # 缺少输入时无法与真正无参数的调用区分；含占位值的输入不是实际参数
+        if params is None or _has_reference(params):
+            self._stats["skipped_input"] += 1
+            return False
+        size = len(json.dumps(output, ensure_ascii=False, default=str).encode("utf-8"))
+        if size > self.max_output_bytes:
+            self._stats["skipped_large"] += 1
+            return False
+        now = time.time()
+        key = (context_id, tool.domain, tool.tool_name, canonical_params(params))
+        self._entries[key] = {
+            "output": output,
+            "recorded_at": now,
+            "expires_at": now + tool.result_ttl,
+            "plan_id": plan_id,
+            "step_id": step_id,
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._stats["recorded"] += 1
+        return True
+
+    def lookup(self, context_id: str, domain: str, tool_name: str, params: Any) -> Optional[Dict[str, Any]]:
+        """查找有效期内的已知结果
+
+        Returns:
+            {"output", "recorded_at", "expires_in", "plan_id", "step_id"}，没有或已过期时返回None
+        """
+        key = (context_id, domain, tool_name, canonical_params(params))
+        entry = self._entries.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        now = time.time()
+        if entry["expires_at"] <= now:
+            del self._entries[key]
+            self._stats["expired"] += 1
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return {
+            "output": entry["output"],
+            "recorded_at": entry["recorded_at"],
+            "expires_in": round(entry["expires_at"] - now, 3),
+            "plan_id": entry["plan_id"],
+            "step_id": entry["step_id"],
+        }
+
+    def annotate(self, plan: Plan, tool_registry) -> int:
+        """为计划中结果已知的幂等工具步骤填写 memoized（依赖其他步骤或参数含引用的步骤不标注）
+
+        Args:
+            plan: 计划
+            tool_registry: ToolRegistry实例，用于确认工具仍标记为幂等
+
+        Returns:
+            标注的步骤数
+        """
+        if not self._entries:
+            return 0
+        annotated = 0
+        for step in plan.steps:
+            tool = tool_registry.get(step.tool_name, step.domain, plan.context_id)
+            if tool is None or not tool.idempotent or not memoizable_step(step):
+                continue
+            step.memoized = self.lookup(plan.context_id, step.domain, step.tool_name, step.parameters)
+            if step.memoized is not None:
+                annotated += 1
+        return annotated
+
+    def forget(self, context_id: str):
+        """删除Context的全部条目（Context删除时调用）"""
+        for key in [key for key in self._entries if key[0] == context_id]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """条目数与命中、过期统计"""
+        return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
@@ -1,17 +1,221 @@
-"""ToolRegistry - 客户端工具注册表"""
+"""ToolRegistry - 客户端工具注册表
 
-from typing import Dict, Optional
-from ..types import ToolDefinition
+每个Context的工具表采用写时复制（copy-on-write）：写操作生成新的工具表并整体替换，
+读操作直接返回不可变的快照，无需拷贝。每次变更都会递增Context版本号、更新内容哈希，
+并写入变更流（change feed），供下游缓存（prompt片段、工具向量、计划缓存等）精确失效。
+
+工具定义按内容哈希驻留（intern）：内容相同的定义在所有Context间共享同一个冻结实例，
+Context工具表只保存 key -> 定义ID 的映射。
+
+查询沿 parent_context_id 链解析：子Context覆盖祖先的同名工具，合并视图按祖先链的
+版本签名缓存，任一祖先变化即失效。
+
+驻留定义同时维护倒排索引（domain/tool_name/description词项），支持按Context或全局检索。
+"""
+
+import hashlib
+import json
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from ..types import ToolDefinition, ToolRegistryChange, ToolSearchHit
+from .search import ToolSearchIndex
+
+ToolSnapshot = Tuple[ToolDefinition, ...]
+ChangeListener = Callable[[ToolRegistryChange], None]
+
+_EMPTY_HASH = "0" * 16
+_MAX_INHERIT_DEPTH = 16
+# 全局检索时每条命中最多列出的Context数量
+_MAX_HIT_CONTEXTS = 20
+
+
+def _canonical_json(tool: ToolDefinition) -> str:
+    """工具定义的规范化JSON表示（键有序）"""
+    return json.dumps(tool.model_dump(), ensure_ascii=False, sort_keys=True, default=str)
+
+
+def tool_content_hash(tool: ToolDefinition) -> str:
+    """计算工具定义的内容哈希
+
+    Args:
+        tool: 工具定义
+
+    Returns:
+        内容哈希（sha1十六进制），同时作为驻留定义的ID
+    """
+    return hashlib.sha1(_canonical_json(tool).encode("utf-8")).hexdigest()
+
+
+def _entry_digest(key: str, content_hash: str) -> int:
+    """单个工具条目对Context内容哈希的贡献值（64位）"""
+    return int(hashlib.sha1(f"{key}:{content_hash}".encode("utf-8")).hexdigest()[:16], 16)
+
+
+class _ContextTable:
+    """单个Context的工具表 - 创建后不再修改，变更时整体替换"""
+
+    __slots__ = ("ids", "version", "digest", "_snapshot", "_id_set")
+
+    def __init__(self, ids: Dict[str, str], version: int, digest: int):
+        self.ids = ids
+        self.version = version
+        self.digest = digest
+        self._snapshot: Optional[ToolSnapshot] = None
+        self._id_set: Optional[Set[str]] = None
+
+    @property
+    def id_set(self) -> Set[str]:
+        if self._id_set is None:
+            self._id_set = set(self.ids.values())
+        return self._id_set
+
+    @property
+    def content_hash(self) -> str:
+        return f"{self.digest:016x}" if self.ids else _EMPTY_HASH
+
+
+_EMPTY_TABLE = _ContextTable({}, 0, 0)
+
+
+def _table_digest(ids: Dict[str, str]) -> int:
+    digest = 0
+    for key, def_id in ids.items():
+        digest ^= _entry_digest(key, def_id)
+    return digest
 
 
 class ToolRegistry:
     """工具注册表 - 管理客户端注册的tool"""
 
-    def __init__(self):
-        self._tools: Dict[str, Dict[str, ToolDefinition]] = {}
+    def __init__(self, change_log_size: int = 1024):
+        self._tables: Dict[str, _ContextTable] = {}
+        self._parents: Dict[str, str] = {}
+        # 继承合并视图缓存: context_id -> (祖先链版本签名, 合并后的工具表)
+        self._resolved: Dict[str, Tuple[tuple, _ContextTable]] = {}
+        # 驻留的工具定义: 定义ID(内容哈希) -> 冻结实例 / 引用它的Context集合 / 规范化JSON字节数
+        self._definitions: Dict[str, ToolDefinition] = {}
+        self._def_contexts: Dict[str, Set[str]] = {}
+        self._def_sizes: Dict[str, int] = {}
+        self._index = ToolSearchIndex()
+        self._seq = 0
+        self._changes: Deque[ToolRegistryChange] = deque(maxlen=change_log_size)
+        self._listeners: List[ChangeListener] = []
+        self._all_snapshot: Optional[Tuple[int, ToolSnapshot]] = None
+
+    @staticmethod
+    def _make_key(tool_name: str, domain: str) -> str:
+        return f"{domain}.{tool_name}"
+
+    def _table(self, context_id: str) -> _ContextTable:
+        return self._tables.get(context_id, _EMPTY_TABLE)
+
+    def _chain(self, context_id: str) -> List[str]:
+        """获取从自身到最远祖先的Context链（防环，限制深度）"""
+        chain = [context_id]
+        parent = self._parents.get(context_id)
+        while parent and parent not in chain and len(chain) < _MAX_INHERIT_DEPTH:
+            chain.append(parent)
+            parent = self._parents.get(parent)
+        return chain
+
+    def _resolve(self, context_id: str) -> _ContextTable:
+        """获取Context沿祖先链合并后的工具表，子Context覆盖祖先"""
+        if context_id not in self._parents:
+            return self._table(context_id)
+        chain = self._chain(context_id)
+        signature = tuple((c, self._table(c).version) for c in chain)
+        cached = self._resolved.get(context_id)
+        if cached and cached[0] == signature:
+            return cached[1]
+        ids: Dict[str, str] = {}
+        for c in reversed(chain):
+            ids.update(self._table(c).ids)
+        table = _ContextTable(ids, self._table(context_id).version, _table_digest(ids))
+        self._resolved[context_id] = (signature, table)
+        return table
+
+    def _snapshot(self, table: _ContextTable) -> ToolSnapshot:
+        if table._snapshot is None:
+            table._snapshot = tuple(self._definitions[def_id] for def_id in table.ids.values())
+        return table._snapshot
+
+    def _intern(self, def_id: str, tool: ToolDefinition, size: int, context_id: str):
+        """驻留工具定义并记录引用它的Context"""
+        if def_id not in self._definitions:
+            # 深拷贝一份，避免调用方后续修改schema字典影响共享实例
+            tool = tool.model_copy(deep=True)
+            self._definitions[def_id] = tool
+            self._def_contexts[def_id] = set()
+            self._def_sizes[def_id] = size
+            self._index.add(def_id, tool)
+        self._def_contexts[def_id].add(context_id)
+
+    def _release(self, def_id: str, context_id: str):
+        """解除Context对定义的引用，无引用时释放定义"""
+        contexts = self._def_contexts[def_id]
+        contexts.discard(context_id)
+        if not contexts:
+            del self._def_contexts[def_id]
+            del self._definitions[def_id]
+            del self._def_sizes[def_id]
+            self._index.remove(def_id)
+
+    def _commit(self, context_id: str, table: _ContextTable, action: str, keys: List[str]):
+        """替换Context工具表并发布变更事件"""
+        self._tables[context_id] = table
+        self._seq += 1
+        change = ToolRegistryChange(
+            seq=self._seq,
+            context_id=context_id,
+            action=action,
+            keys=keys,
+            version=table.version,
+            content_hash=table.content_hash,
+        )
+        self._changes.append(change)
+        for listener in list(self._listeners):
+            try:
+                listener(change)
+            except Exception as e:
+                print(f"Error notifying tool registry listener: {str(e)}")
+
+    def _apply(self, tools: list, context_id: str) -> int:
+        """将一组工具定义合并进Context，只有内容变化时才生成新版本"""
+        current = self._table(context_id)
+        inherited = self._resolve(context_id).ids
+        new_ids = None
+        digest = current.digest
+        changed_keys = []
+        count = 0
+        for tool in tools:
+            key = self._make_key(tool.tool_name, tool.domain)
+            count += 1
+            payload = _canonical_json(tool).encode("utf-8")
+            def_id = hashlib.sha1(payload).hexdigest()
+            ids = new_ids if new_ids is not None else current.ids
+            old_id = ids.get(key)
+            # 自身或祖先已有相同定义时跳过，避免子Context重复注册继承的工具
+            if old_id == def_id or (old_id is None and inherited.get(key) == def_id):
+                continue
+            self._intern(def_id, tool, len(payload), context_id)
+            if new_ids is None:
+                new_ids = dict(current.ids)
+            if old_id is not None:
+                digest ^= _entry_digest(key, old_id)
+                self._release(old_id, context_id)
+            digest ^= _entry_digest(key, def_id)
+            new_ids[key] = def_id
+            changed_keys.append(key)
+
+        if changed_keys:
+            table = _ContextTable(new_ids, current.version + 1, digest)
+            self._commit(context_id, table, "register", changed_keys)
+        return count
 
     def register(self, tool: ToolDefinition, context_id: str) -> bool:
-        """注册工具
+        """注册工具，内容未变化（或与继承的定义相同）的重复注册不会产生新版本
 
         Args:
             tool: 工具定义
@@ -20,14 +224,10 @@ class ToolRegistry:
         Returns:
             是否成功
         """
-        if context_id not in self._tools:
-            self._tools[context_id] = {}
-        key = f"{tool.domain}.{tool.tool_name}"
-        self._tools[context_id][key] = tool
-        return True
+        return self._apply([tool], context_id) == 1
 
     def register_batch(self, tools: list, context_id: str) -> int:
-        """批量注册工具
+        """批量注册工具，整批只生成一个新版本
 
         Args:
             tools: 工具定义列表
@@ -36,13 +236,7 @@ class ToolRegistry:
         Returns:
             成功注册的工具数量
         """
-        if context_id not in self._tools:
-            self._tools[context_id] = {}
-        count = 0
-        for tool in tools:
-            if self.register(tool, context_id):
-                count += 1
-        return count
+        return self._apply(tools, context_id)
 
     def get(self, tool_name: str, domain: str, context_id: str) -> Optional[ToolDefinition]:
         """获取工具定义
@@ -52,43 +246,73 @@ class ToolRegistry:
             domain: 工具领域
             context_id: Context ID
 
+        Returns:
+            工具定义（含从祖先继承的），不存在返回None
+        """
+        def_id = self._resolve(context_id).ids.get(self._make_key(tool_name, domain))
+        return self._definitions[def_id] if def_id is not None else None
+
+    def get_definition(self, def_id: str) -> Optional[ToolDefinition]:
+        """按定义ID获取驻留的工具定义
+
+        Args:
+            def_id: 定义ID（内容哈希）
+
         Returns:
             工具定义，不存在返回None
         """
-        if context_id not in self._tools:
-            return None
-        key = f"{domain}.{tool_name}"
-        return self._tools[context_id].get(key)
+        return self._definitions.get(def_id)
 
-    def list_tools(self, context_id: str) -> list:
-        """列出指定Context的所有工具
+    def get_definition_id(self, tool_name: str, domain: str, context_id: str) -> Optional[str]:
+        """获取Context中工具对应的定义ID
 
         Args:
+            tool_name: 工具名
+            domain: 工具领域
             context_id: Context ID
 
         Returns:
-            工具定义列表
+            定义ID，不存在返回None
         """
-        if context_id not in self._tools:
-            return []
-        return list(self._tools[context_id].values())
+        return self._resolve(context_id).ids.get(self._make_key(tool_name, domain))
+
+    def list_tools(self, context_id: str) -> ToolSnapshot:
+        """列出指定Context的所有工具（含从祖先继承的）
+
+        Args:
+            context_id: Context ID
 
-    def list_all_tools(self) -> list:
+        Returns:
+            工具定义的不可变快照
+        """
+        return self._snapshot(self._resolve(context_id))
+
+    def list_own_tools(self, context_id: str) -> ToolSnapshot:
+        """列出直接注册在指定Context上的工具（不含继承）
+
+        Args:
+            context_id: Context ID
+
+        Returns:
+            工具定义的不可变快照
+        """
+        return self._snapshot(self._table(context_id))
+
+    def list_all_tools(self) -> ToolSnapshot:
         """列出所有Context的所有工具"""
-        all_tools = []
-        for context_tools in self._tools.values():
-            all_tools.extend(context_tools.values())
-        return all_tools
+        if self._all_snapshot is None or self._all_snapshot[0] != self._seq:
+            all_tools = []
+            for table in self._tables.values():
+                all_tools.extend(self._snapshot(table))
+            self._all_snapshot = (self._seq, tuple(all_tools))
+        return self._all_snapshot[1]
 
     def has_tool(self, tool_name: str, domain: str, context_id: str) -> bool:
-        """检查工具是否存在"""
-        if context_id not in self._tools:
-            return False
-        key = f"{domain}.{tool_name}"
-        return key in self._tools[context_id]
+        """检查工具是否存在（含从祖先继承的）"""
+        return self._make_key(tool_name, domain) in self._resolve(context_id).ids
 
     def remove(self, tool_name: str, domain: str, context_id: str) -> bool:
-        """移除工具
+        """移除直接注册在Context上的工具，继承的工具不受影响
 
         Args:
             tool_name: 工具名
@@ -98,13 +322,17 @@ class ToolRegistry:
         Returns:
             是否成功
         """
-        if context_id not in self._tools:
+        current = self._table(context_id)
+        key = self._make_key(tool_name, domain)
+        if key not in current.ids:
             return False
-        key = f"{domain}.{tool_name}"
-        if key in self._tools[context_id]:
-            del self._tools[context_id][key]
-            return True
-        return False
+        new_ids = dict(current.ids)
+        old_id = new_ids.pop(key)
+        self._release(old_id, context_id)
+        digest = current.digest ^ _entry_digest(key, old_id)
+        table = _ContextTable(new_ids, current.version + 1, digest)
+        self._commit(context_id, table, "remove", [key])
+        return True
 
     def clear_context(self, context_id: str):
         """清空指定Context的所有工具
@@ -112,25 +340,194 @@ class ToolRegistry:
         Args:
             context_id: Context ID
         """
-        if context_id in self._tools:
-            self._tools[context_id].clear()
+        current = self._tables.get(context_id)
+        if current is None or not current.ids:
+            return
+        for def_id in current.ids.values():
+            self._release(def_id, context_id)
+        table = _ContextTable({}, current.version + 1, 0)
+        self._commit(context_id, table, "clear", list(current.ids.keys()))
+
+    def replace_context(self, tools: list, context_id: str) -> bool:
+        """将Context直接注册的工具整体替换为给定列表（用于从共享存储同步），内容相同时不产生新版本
+
+        Args:
+            tools: 工具定义列表
+            context_id: Context ID
+
+        Returns:
+            工具表是否发生变化
+        """
+        current = self._table(context_id)
+        new_ids: Dict[str, str] = {}
+        payloads: Dict[str, Tuple[ToolDefinition, bytes]] = {}
+        for tool in tools:
+            key = self._make_key(tool.tool_name, tool.domain)
+            payload = _canonical_json(tool).encode("utf-8")
+            def_id = hashlib.sha1(payload).hexdigest()
+            new_ids[key] = def_id
+            payloads[def_id] = (tool, payload)
+        if new_ids == current.ids:
+            return False
+        for def_id, (tool, payload) in payloads.items():
+            self._intern(def_id, tool, len(payload), context_id)
+        for def_id in set(current.ids.values()) - set(payloads):
+            self._release(def_id, context_id)
+        changed_keys = [key for key in new_ids.keys() | current.ids.keys()
+                        if new_ids.get(key) != current.ids.get(key)]
+        table = _ContextTable(new_ids, current.version + 1, _table_digest(new_ids))
+        self._commit(context_id, table, "replace", changed_keys)
+        return True
 
     def clear(self):
         """清空所有工具"""
-        self._tools.clear()
+        for context_id in list(self._tables.keys()):
+            self.clear_context(context_id)
 
     def count(self, context_id: str = None) -> int:
         """获取工具数量
 
         Args:
-            context_id: Context ID，为None时返回总数
+            context_id: Context ID（含继承的工具），为None时返回所有Context直接注册的总数
 
         Returns:
             工具数量
         """
         if context_id is None:
-            total = 0
-            for context_tools in self._tools.values():
-                total += len(context_tools)
-            return total
-        return len(self._tools.get(context_id, {}))
+            return sum(len(table.ids) for table in self._tables.values())
+        return len(self._resolve(context_id).ids)
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """统计注册表内存占用：按唯一定义计 vs 按引用计
+
+        Returns:
+            统计信息，字节数按规范化JSON估算
+        """
+        unique_bytes = sum(self._def_sizes.values())
+        referenced_bytes = sum(self._def_sizes[d] * len(c) for d, c in self._def_contexts.items())
+        references = sum(len(c) for c in self._def_contexts.values())
+        return {
+            "contexts": len(self._tables),
+            "unique_definitions": len(self._definitions),
+            "references": references,
+            "unique_bytes": unique_bytes,
+            "referenced_bytes": referenced_bytes,
+            "dedup_ratio": referenced_bytes / unique_bytes if unique_bytes else 1.0,
+        }
+
+    def search(self, query: str, context_id: Optional[str] = None,
+               limit: int = 20) -> List[ToolSearchHit]:
+        """按 domain / 工具名 / 描述 检索工具
+
+        Args:
+            query: 查询文本
+            context_id: 限定Context（含继承的工具），为None时检索所有Context
+            limit: 返回数量上限
+
+        Returns:
+            按得分降序的命中列表
+        """
+        candidates = self._resolve(context_id).id_set if context_id is not None else None
+        hits = []
+        for def_id, score in self._index.search(query, candidates, limit):
+            tool = self._definitions[def_id]
+            contexts = self._def_contexts[def_id]
+            if context_id is not None:
+                context_ids = [context_id]
+            else:
+                context_ids = list(islice(contexts, _MAX_HIT_CONTEXTS))
+            hits.append(ToolSearchHit(
+                definition_id=def_id,
+                domain=tool.domain,
+                tool_name=tool.tool_name,
+                description=tool.description,
+                score=round(score, 4),
+                context_ids=context_ids,
+                context_count=1 if context_id is not None else len(contexts),
+            ))
+        return hits
+
+    def version(self, context_id: str) -> int:
+        """获取Context工具表的版本号，每次内容变化递增
+
+        Args:
+            context_id: Context ID
+
+        Returns:
+            版本号，未注册过工具的Context为0
+        """
+        return self._table(context_id).version
+
+    def content_hash(self, context_id: str) -> str:
+        """获取Context合并视图（含继承）的内容哈希，与注册顺序无关
+
+        Args:
+            context_id: Context ID
+
+        Returns:
+            内容哈希
+        """
+        return self._resolve(context_id).content_hash
+
+    def set_parent(self, context_id: str, parent_context_id: Optional[str]):
+        """设置Context的父Context，查询时沿父链继承工具
+
+        Args:
+            context_id: Context ID
+            parent_context_id: 父Context ID，为None时解除继承
+        """
+        if parent_context_id == context_id or self._parents.get(context_id) == parent_context_id:
+            return
+        if parent_context_id:
+            self._parents[context_id] = parent_context_id
+        else:
+            self._parents.pop(context_id, None)
+        self._resolved.pop(context_id, None)
+        current = self._table(context_id)
+        table = _ContextTable(current.ids, current.version + 1, current.digest)
+        self._commit(context_id, table, "parent", [])
+
+    def get_parent(self, context_id: str) -> Optional[str]:
+        """获取Context的父Context ID"""
+        return self._parents.get(context_id)
+
+    def descendants(self, context_id: str) -> List[str]:
+        """继承该Context工具的全部后代Context（其工具列表随该Context变化）"""
+        return [child for child in self._parents if context_id in self._chain(child)[1:]]
+
+    @property
+    def seq(self) -> int:
+        """当前全局变更序号"""
+        return self._seq
+
+    def subscribe(self, listener: ChangeListener) -> Callable[[], None]:
+        """订阅变更流，每次工具表变化时同步回调
+
+        Args:
+            listener: 回调函数，参数为变更事件
+
+        Returns:
+            取消订阅的函数
+        """
+        self._listeners.append(listener)
+
+        def unsubscribe():
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def changes_since(self, seq: int) -> Optional[List[ToolRegistryChange]]:
+        """获取指定序号之后的变更事件
+
+        Args:
+            seq: 上次已处理的序号
+
+        Returns:
+            变更事件列表；若所需事件已被挤出变更日志则返回None，调用方应整体失效
+        """
+        if seq >= self._seq:
+            return []
+        if not self._changes or self._changes[0].seq > seq + 1:
+            return None
+        return [change for change in self._changes if change.seq > seq]
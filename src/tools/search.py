@@ -0,0 +1,173 @@
+"""ToolSearchIndex - 工具倒排索引"""
+
+import heapq
+import math
+import re
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from ..types import ToolDefinition
+
+# 各字段命中时的权重
+_FIELD_WEIGHTS = {
+    "tool_name": 3.0,
+    "domain": 2.0,
+    "description": 1.0,
+}
+# 查询与工具名完全一致时的额外加分
+_EXACT_NAME_BONUS = 5.0
+
+_TOKEN_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|[0-9]+|[\u4e00-\u9fff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """分词：按下划线/驼峰/数字拆分英文，中文按单字切分，统一小写
+
+    Args:
+        text: 待分词文本
+
+    Returns:
+        词项列表（可能有重复）
+    """
+    if not text:
+        return []
+    return [token.lower() for token in _TOKEN_PATTERN.findall(text)]
+
+
+class ToolSearchIndex:
+    """工具倒排索引 - 按定义ID索引 domain、tool_name 与 description 词项
+
+    每个词项的倒排表按权重分桶，全局检索时按权重降序做有序访问（Fagin阈值算法），
+    top-k 的最低分不低于剩余文档可能得到的最高分时提前结束，避免扫描整条倒排表。
+    """
+
+    def __init__(self):
+        # 词项 -> {定义ID: 字段权重之和}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # 词项 -> {权重: 定义ID集合}
+        self._buckets: Dict[str, Dict[float, Set[str]]] = {}
+        # 定义ID -> 该定义贡献的词项，用于删除
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        # 规范化工具名 -> 定义ID集合，用于完全匹配加分
+        self._names: Dict[str, Set[str]] = {}
+        self._doc_names: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, def_id: str, tool: ToolDefinition):
+        """索引一个工具定义
+
+        Args:
+            def_id: 定义ID
+            tool: 工具定义
+        """
+        if def_id in self._doc_terms:
+            return
+        weights: Dict[str, float] = {}
+        for field, weight in _FIELD_WEIGHTS.items():
+            for token in set(tokenize(getattr(tool, field))):
+                weights[token] = weights.get(token, 0.0) + weight
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[def_id] = weight
+            self._buckets.setdefault(token, {}).setdefault(weight, set()).add(def_id)
+        self._doc_terms[def_id] = tuple(weights.keys())
+        name = tool.tool_name.lower()
+        self._names.setdefault(name, set()).add(def_id)
+        self._doc_names[def_id] = name
+
+    def remove(self, def_id: str):
+        """从索引中移除一个工具定义
+
+        Args:
+            def_id: 定义ID
+        """
+        terms = self._doc_terms.pop(def_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            posting = self._postings[token]
+            weight = posting.pop(def_id)
+            buckets = self._buckets[token]
+            buckets[weight].discard(def_id)
+            if not buckets[weight]:
+                del buckets[weight]
+            if not posting:
+                del self._postings[token]
+                del self._buckets[token]
+        name = self._doc_names.pop(def_id)
+        ids = self._names[name]
+        ids.discard(def_id)
+        if not ids:
+            del self._names[name]
+
+    def _sorted_access(self, token: str) -> Iterator[Tuple[str, float]]:
+        """按权重降序遍历词项的倒排表"""
+        buckets = self._buckets[token]
+        for weight in sorted(buckets, reverse=True):
+            for def_id in buckets[weight]:
+                yield def_id, weight
+
+    def search(self, query: str, candidates: Optional[Set[str]] = None,
+               limit: int = 20) -> List[Tuple[str, float]]:
+        """检索与查询最相关的工具定义
+
+        Args:
+            query: 查询文本
+            candidates: 限定的定义ID集合，为None时检索全部
+            limit: 返回数量上限
+
+        Returns:
+            (定义ID, 得分) 列表，按得分降序
+        """
+        tokens = [token for token in set(tokenize(query)) if token in self._postings]
+        exact = self._names.get(query.strip().lower(), set())
+        if limit <= 0 or (not tokens and not exact):
+            return []
+        total = len(self._doc_terms)
+        idfs = {token: math.log(1.0 + total / len(self._postings[token])) for token in tokens}
+
+        def score(def_id: str) -> float:
+            value = _EXACT_NAME_BONUS if def_id in exact else 0.0
+            for token, idf in idfs.items():
+                value += self._postings[token].get(def_id, 0.0) * idf
+            return value
+
+        if candidates is not None:
+            # 限定范围时候选集通常很小，直接逐个计分
+            pool = [def_id for def_id in candidates
+                    if def_id in exact or any(def_id in self._postings[t] for t in tokens)]
+            scored = ((def_id, score(def_id)) for def_id in pool)
+            return heapq.nlargest(limit, scored, key=lambda item: item[1])
+
+        seen: Set[str] = set(exact)
+        top: List[Tuple[float, str]] = []
+        for def_id in exact:
+            self._offer(top, limit, def_id, score(def_id))
+
+        cursors = {token: self._sorted_access(token) for token in tokens}
+        frontier = {token: max(self._buckets[token]) * idfs[token] for token in tokens}
+        while cursors:
+            if len(top) >= limit and top[0][0] >= sum(frontier.values()):
+                break
+            # 优先推进当前贡献上界最大的倒排表，稀有词项会先被消费完
+            token = max(cursors, key=frontier.__getitem__)
+            item = next(cursors[token], None)
+            if item is None:
+                del cursors[token]
+                frontier[token] = 0.0
+                continue
+            def_id, weight = item
+            frontier[token] = weight * idfs[token]
+            if def_id not in seen:
+                seen.add(def_id)
+                self._offer(top, limit, def_id, score(def_id))
+
+        return [(def_id, value) for value, def_id in sorted(top, reverse=True)]
+
+    @staticmethod
+    def _offer(top: List[Tuple[float, str]], limit: int, def_id: str, value: float):
+        """将候选放入大小为limit的最小堆"""
+        if len(top) < limit:
+            heapq.heappush(top, (value, def_id))
+        elif value > top[0][0]:
+            heapq.heapreplace(top, (value, def_id))
@@ -0,0 +1,270 @@
+"""ParameterValidator - 基于ToolDefinition.args编译的参数校验器"""
+
+import re
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from ..types import ToolDefinition
+
+# 校验函数: (值, 路径, 错误列表) -> None
+Check = Callable[[Any, str, List[str]], None]
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, (list, tuple)),
+    "null": lambda v: v is None,
+}
+
+# 引用前序步骤输出的占位值（如 "{{step_1.output}}"、"$step_1"），运行时才确定，跳过校验
+_REFERENCE_PATTERN = re.compile(r"^\s*(\{\{.*\}\}|\$\{.*\}|\$step)", re.S)
+
+def _is_reference(value: Any) -> bool:
+    return isinstance(value, str) and _REFERENCE_PATTERN.match(value) is not None
+
+
+def _type_name(value: Any) -> str:
+    for name in ("null", "boolean", "integer", "number", "string", "array", "object"):
+        if _TYPE_CHECKS[name](value):
+            return name
+    return type(value).__name__
+
+
+def _compile(schema: Any) -> Optional[Check]:
+    """将单个JSON schema节点编译为校验函数，无约束时返回None"""
+    if not isinstance(schema, dict) or not schema:
+        return None
+
+    checks: List[Check] = []
+
+    types = schema.get("type")
+    if isinstance(types, str):
+        types = [types]
+    if types:
+        types = [t for t in types if t in _TYPE_CHECKS]
+        if schema.get("nullable") and "null" not in types:
+            types.append("null")
+    if types:
+        type_fns = [_TYPE_CHECKS[t] for t in types]
+        expected = "/".join(types)
+
+        def check_type(value, path, errors):
+            if not any(fn(value) for fn in type_fns):
+                errors.append(f"{path}: expected {expected}, got {_type_name(value)}")
+        checks.append(check_type)
+
+    if "enum" in schema and isinstance(schema["enum"], list):
+        allowed = schema["enum"]
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} not in {allowed!r}")
+        checks.append(check_enum)
+
+    if "const" in schema:
+        const = schema["const"]
+
+        def check_const(value, path, errors):
+            if value != const:
+                errors.append(f"{path}: expected {const!r}")
+        checks.append(check_const)
+
+    for key, op, fn in (("minimum", "<", lambda v, b: v < b), ("maximum", ">", lambda v, b: v > b)):
+        if isinstance(schema.get(key), (int, float)):
+            bound = schema[key]
+
+            def check_bound(value, path, errors, bound=bound, op=op, fn=fn):
+                if _TYPE_CHECKS["number"](value) and fn(value, bound):
+                    errors.append(f"{path}: {value} {op} {bound}")
+            checks.append(check_bound)
+
+    for key, kind, op, fn in (
+        ("minLength", "string", "shorter", lambda n, b: n < b),
+        ("maxLength", "string", "longer", lambda n, b: n > b),
+        ("minItems", "array", "shorter", lambda n, b: n < b),
+        ("maxItems", "array", "longer", lambda n, b: n > b),
+    ):
+        if isinstance(schema.get(key), int):
+            bound = schema[key]
+            is_kind = _TYPE_CHECKS[kind]
+
+            def check_length(value, path, errors, bound=bound, op=op, fn=fn, is_kind=is_kind):
+                if is_kind(value) and fn(len(value), bound):
+                    errors.append(f"{path}: length {len(value)} {op} than {bound}")
+            checks.append(check_length)
+
+    if isinstance(schema.get("pattern"), str):
+        try:
+            pattern = re.compile(schema["pattern"])
+        except re.error:
+            pattern = None
+        if pattern is not None:
+            def check_pattern(value, path, errors):
+                if isinstance(value, str) and not pattern.search(value):
+                    errors.append(f"{path}: does not match pattern {pattern.pattern!r}")
+            checks.append(check_pattern)
+
+    alternatives = schema.get("anyOf") or schema.get("oneOf")
+    if isinstance(alternatives, list) and alternatives:
+        compiled = [_compile(alt) for alt in alternatives]
+        if all(fn is not None for fn in compiled):
+            def check_any(value, path, errors):
+                for fn in compiled:
+                    sub_errors: List[str] = []
+                    fn(value, path, sub_errors)
+                    if not sub_errors:
+                        return
+                errors.append(f"{path}: does not match any allowed schema")
+            checks.append(check_any)
+
+    properties = schema.get("properties")
+    required = schema.get("required") if isinstance(schema.get("required"), list) else []
+    additional = schema.get("additionalProperties", True)
+    if isinstance(properties, dict) or required or additional is not True:
+        checks.append(_compile_object(properties or {}, required, additional))
+
+    items = _compile(schema.get("items"))
+    if items is not None:
+        def check_items(value, path, errors):
+            if isinstance(value, (list, tuple)):
+                for i, item in enumerate(value):
+                    if not _is_reference(item):
+                        items(item, f"{path}[{i}]", errors)
+        checks.append(check_items)
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path, errors):
+        for fn in checks:
+            fn(value, path, errors)
+    return check_all
+
+
+def _compile_object(properties: Dict[str, Any], required: List[str], additional: Any) -> Check:
+    """编译对象类型的 properties / required / additionalProperties 约束"""
+    property_checks = {name: _compile(sub) for name, sub in properties.items()}
+    known = frozenset(properties)
+    extra_check = _compile(additional) if isinstance(additional, dict) else None
+    reject_extra = additional is False
+
+    def check_object(value, path, errors):
+        if not isinstance(value, dict):
+            return
+        for name in required:
+            if name not in value:
+                errors.append(f"{path}.{name}: required parameter missing")
+        for name, item in value.items():
+            if _is_reference(item):
+                continue
+            if name in known:
+                fn = property_checks[name]
+                if fn is not None:
+                    fn(item, f"{path}.{name}", errors)
+            elif reject_extra:
+                errors.append(f"{path}.{name}: unknown parameter")
+            elif extra_check is not None:
+                extra_check(item, f"{path}.{name}", errors)
+    return check_object
+
+
+def _shorthand_schema(sub: Any) -> Optional[Dict[str, Any]]:
+    """简写中单个参数的schema：schema字典，或类型名（"string"、["string", "null"]）；无法识别时返回None"""
+    if isinstance(sub, dict):
+        return sub
+    names = [sub] if isinstance(sub, str) else sub
+    if isinstance(names, list) and names and all(isinstance(name, str) and name in _TYPE_CHECKS for name in names):
+        return {"type": sub}
+    return None
+
+
+def _is_object_schema(args: Dict[str, Any]) -> bool:
+    """是否为完整的对象JSON schema：type为object，或properties的每一项都是schema"""
+    types = args.get("type")
+    if types == "object" or (isinstance(types, list) and "object" in types):
+        return True
+    properties = args.get("properties")
+    return isinstance(properties, dict) and all(isinstance(sub, dict) for sub in properties.values())
+
+
+def compile_args_schema(args: Dict[str, Any]) -> Optional[Check]:
+    """编译工具参数schema
+
+    支持两种写法：完整的JSON schema（type为object，或properties的每一项都是schema），或
+    {参数名: 参数schema或类型名} 的简写。简写中参数schema可带 "required": true；简写的含义
+    不如完整schema明确，只校验已声明参数的值，不拒绝未声明的参数，无法识别的项不参与校验。
+
+    Args:
+        args: ToolDefinition.args
+
+    Returns:
+        校验函数，schema为空时返回None（不做校验）
+    """
+    if not isinstance(args, dict) or not args:
+        return None
+    if _is_object_schema(args):
+        return _compile(args)
+    properties = {}
+    for name, sub in args.items():
+        sub = _shorthand_schema(sub)
+        if sub is not None:
+            properties[name] = sub
+    if not properties:
+        return None
+    required = [name for name, sub in properties.items() if sub.get("required") is True]
+    return _compile({"type": "object", "properties": properties, "required": required})
+
+
+class ParameterValidatorCache:
+    """参数校验器缓存 - 每个工具定义只编译一次，按定义内容哈希缓存（LRU）"""
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._validators: "OrderedDict[str, Optional[Check]]" = OrderedDict()
+
+    def get(self, def_id: str, tool: ToolDefinition) -> Optional[Check]:
+        """获取（必要时编译）工具的参数校验器
+
+        Args:
+            def_id: 工具定义ID（内容哈希）
+            tool: 工具定义
+
+        Returns:
+            校验函数，无需校验时返回None
+        """
+        if def_id in self._validators:
+            self._validators.move_to_end(def_id)
+            return self._validators[def_id]
+        validator = compile_args_schema(tool.args)
+        self._validators[def_id] = validator
+        if len(self._validators) > self.max_size:
+            self._validators.popitem(last=False)
+        return validator
+
+    def validate(self, def_id: str, tool: ToolDefinition, parameters: Dict[str, Any]) -> List[str]:
+        """校验一次调用的参数
+
+        Args:
+            def_id: 工具定义ID（内容哈希）
+            tool: 工具定义
+            parameters: 调用参数
+
+        Returns:
+            违规描述列表，为空表示通过
+        """
+        validator = self.get(def_id, tool)
+        if validator is None:
+            return []
+        if not isinstance(parameters, dict):
+            return [f"parameters: expected object, got {_type_name(parameters)}"]
+        errors: List[str] = []
+        validator(parameters, "parameters", errors)
+        return errors
+
+    def __len__(self) -> int:
+        return len(self._validators)
@@ -1,7 +1,7 @@
 """Memory模块 - 定义数据类型"""
 import uuid
 from typing import Dict, List, Any, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
@@ -11,13 +11,38 @@ def generate_context_id() -> str:
 
 
 class ToolDefinition(BaseModel):
-    """客户端工具定义"""
+    """客户端工具定义（冻结，注册表中按内容哈希跨Context共享）"""
+    model_config = ConfigDict(frozen=True)
+
     domain: str = Field(..., description="工具领域")
     tool_name: str = Field(..., description="工具名称")
     description: str = Field(..., description="工具描述")
     args: Dict[str, Any] = Field(default_factory=dict, description="工具参数schema")
     input: Dict[str, Any] = Field(default_factory=dict, description="工具输入schema")
     output: Dict[str, Any] = Field(default_factory=dict, description="工具输出schema")
+    idempotent: bool = Field(default=False, description="是否幂等（只读，相同参数得到相同结果）")
+    result_ttl: float = Field(default=0.0, description="幂等工具结果的有效期（秒），0表示不复用结果")
+
+
+class ToolRegistryChange(BaseModel):
+    """工具注册表变更事件"""
+    seq: int = Field(..., description="全局变更序号")
+    context_id: str = Field(..., description="发生变更的Context ID")
+    action: str = Field(..., description="变更类型: register/remove/clear/replace/parent")
+    keys: List[str] = Field(default_factory=list, description="受影响的工具key（domain.tool_name）")
+    version: int = Field(..., description="变更后的Context版本号")
+    content_hash: str = Field(default="", description="变更后的Context内容哈希")
+
+
+class ToolSearchHit(BaseModel):
+    """工具检索结果"""
+    definition_id: str = Field(..., description="工具定义ID（内容哈希）")
+    domain: str = Field(..., description="工具领域")
+    tool_name: str = Field(..., description="工具名称")
+    description: str = Field(default="", description="工具描述")
+    score: float = Field(default=0.0, description="相关性得分")
+    context_ids: List[str] = Field(default_factory=list, description="注册了该工具的Context ID（最多列出20个）")
+    context_count: int = Field(default=0, description="注册了该工具的Context总数")
 
 
 class PlanStep(BaseModel):
@@ -29,6 +54,8 @@ class PlanStep(BaseModel):
     depends_on: List[str] = Field(default_factory=list, description="依赖的步骤ID")
     reasoning: str = Field(default="", description="执行此步骤的原因")
     expected_output: str = Field(default="", description="期望的输出")
+    violations: List[str] = Field(default_factory=list, description="参数与工具args schema不符的问题列表")
+    memoized: Optional[Dict[str, Any]] = Field(default=None, description="幂等工具在有效期内的已知结果，可跳过执行")
 
 
 class Plan(BaseModel):
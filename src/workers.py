@@ -0,0 +1,158 @@
+"""WorkerRouter - 多worker部署时按context_id将工具调用路由到归属worker"""
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from .shared_state import SharedStateStore
+
+# 不绑定单个Context、在任意worker本地处理的工具
+_LOCAL_TOOLS = frozenset({"create_context", "search_tools", "batch"})
+
+WORKER_TOKEN_HEADER = "X-Worker-Token"
+
+
+class WorkerRouter:
+    """Worker路由器 - 每个Context归属一个worker，其记忆工作区只存在于该worker进程中
+
+    非归属worker收到的调用通过本机HTTP转发给归属worker的内部端点。
+    """
+
+    def __init__(self, worker_id: int, worker_ports: List[int], store: SharedStateStore,
+                 token: str, host: str = "127.0.0.1", timeout: float = 300.0):
+        """初始化路由器
+
+        Args:
+            worker_id: 当前worker编号
+            worker_ports: 各worker监听的端口，下标即worker编号
+            store: 共享状态存储，记录Context的归属worker
+            token: worker间转发使用的共享令牌
+            host: worker监听的本机地址
+            timeout: 转发超时（秒）
+        """
+        self.worker_id = worker_id
+        self.worker_ports = worker_ports
+        self.store = store
+        self.token = token
+        self.host = host
+        self.timeout = timeout
+        # 归属关系一旦登记不再变化，可永久缓存
+        self._owners: Dict[str, int] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats = {"local": 0, "forwarded": 0, "forward_errors": 0, "proxied": 0, "proxy_errors": 0}
+
+    @classmethod
+    def from_env(cls, store: SharedStateStore) -> Optional["WorkerRouter"]:
+        """从worker进程环境变量（由 --workers 启动时设置）创建，单进程部署时返回None"""
+        ports = os.getenv("TASK_PLAN_WORKER_PORTS")
+        if not ports:
+            return None
+        return cls(
+            worker_id=int(os.getenv("TASK_PLAN_WORKER_ID", "0")),
+            worker_ports=[int(p) for p in ports.split(",")],
+            store=store,
+            token=os.getenv("TASK_PLAN_WORKER_TOKEN", ""),
+        )
+
+    def owner_of(self, context_id: str) -> int:
+        """获取Context的归属worker编号"""
+        owner = self._owners.get(context_id)
+        if owner is None:
+            owner = self.store.claim_owner(context_id, len(self.worker_ports))
+            self._owners[context_id] = owner
+        return owner
+
+    def route(self, name: str, arguments: Dict[str, Any]) -> Optional[int]:
+        """判断调用是否需要转发
+
+        Returns:
+            需要转发时返回归属worker编号，否则返回None
+        """
+        context_id = arguments.get("context_id") if isinstance(arguments, dict) else None
+        if name in _LOCAL_TOOLS or not context_id:
+            self._stats["local"] += 1
+            return None
+        owner = self.owner_of(context_id)
+        if owner == self.worker_id:
+            self._stats["local"] += 1
+            return None
+        return owner
+
+    def is_forwarded(self, headers) -> bool:
+        """请求是否为其他worker转发而来（携带共享令牌），转发来的请求总在本地处理"""
+        return bool(self.token) and headers.get(WORKER_TOKEN_HEADER) == self.token
+
+    def _client(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def proxy(self, worker_id: int, method: str, path: str, params: Dict[str, Any]) -> Any:
+        """将HTTP API请求原样转发给指定worker的同一端点
+
+        Args:
+            worker_id: 目标worker编号
+            method: HTTP方法
+            path: 请求路径
+            params: 查询参数
+
+        Returns:
+            目标worker返回的JSON
+        """
+        url = f"http://{self.host}:{self.worker_ports[worker_id]}{path}"
+        self._stats["proxied"] += 1
+        try:
+            async with self._client().request(method, url, params=params,
+                                              headers={WORKER_TOKEN_HEADER: self.token}) as response:
+                return await response.json()
+        except Exception:
+            self._stats["proxy_errors"] += 1
+            raise
+
+    async def gather(self, path: str, params: Optional[Dict[str, Any]] = None) -> List[Any]:
+        """向其他全部worker的同一端点发起GET，用于汇总各进程的统计（失败的worker跳过）
+
+        Returns:
+            各worker返回的JSON
+        """
+        others = [worker_id for worker_id in range(len(self.worker_ports)) if worker_id != self.worker_id]
+        results = await asyncio.gather(*(self.proxy(worker_id, "GET", path, params or {}) for worker_id in others),
+                                       return_exceptions=True)
+        reports = []
+        for worker_id, result in zip(others, results):
+            if isinstance(result, Exception):
+                print(f"Error gathering {path} from worker {worker_id}: {str(result)}")
+            else:
+                reports.append(result)
+        return reports
+
+    async def forward(self, worker_id: int, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """将调用转发给指定worker
+
+        Args:
+            worker_id: 目标worker编号
+            name: 工具名
+            arguments: 工具参数
+
+        Returns:
+            目标worker的处理结果
+        """
+        url = f"http://{self.host}:{self.worker_ports[worker_id]}/internal/tool_call"
+        self._stats["forwarded"] += 1
+        try:
+            async with self._client().post(url, json={"name": name, "arguments": arguments},
+                                          headers={WORKER_TOKEN_HEADER: self.token}) as response:
+                return await response.json()
+        except Exception:
+            self._stats["forward_errors"] += 1
+            raise
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "worker_id": self.worker_id, "workers": len(self.worker_ports)}
@@ -2,6 +2,7 @@ import { createApp } from 'vue'
 import { createPinia } from 'pinia'
 import App from './App.vue'
 import router from './router'
+import { useContextStore } from './stores/context'
 
 import './assets/main.css'
 
@@ -10,4 +11,6 @@ const app = createApp(App)
 app.use(createPinia())
 app.use(router)
 
+useContextStore().connectEvents()
+
 app.mount('#app')
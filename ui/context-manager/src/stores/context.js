@@ -8,6 +8,13 @@ export const useContextStore = defineStore('context', () => {
   const memoryLoading = ref(false)
   const loading = ref(false)
   const error = ref(null)
+  // 已加载的上下文详情缓存，由事件流增量更新
+  const contextDetails = ref({})
+  const live = ref(false)
+  const contextsLoaded = ref(false)
+  let eventSource = null
+  // 最近一次请求详情的上下文，切换后先前请求的结果不再覆盖当前详情
+  let requestedContextId = null
 
   const sortedContexts = computed(() => {
     return [...contexts.value].sort((a, b) => 
@@ -23,6 +30,7 @@ export const useContextStore = defineStore('context', () => {
       if (!response.ok) throw new Error('获取上下文列表失败')
       const data = await response.json()
       contexts.value = data.contexts || []
+      contextsLoaded.value = true
     } catch (e) {
       error.value = e.message
       console.error('Failed to fetch contexts:', e)
@@ -31,19 +39,40 @@ export const useContextStore = defineStore('context', () => {
     }
   }
 
+  async function ensureContexts() {
+    // 事件流在线时列表由增量事件维护，无需重复拉取
+    if (live.value && contextsLoaded.value) return
+    await fetchContexts()
+  }
+
   async function fetchContextDetail(contextId) {
-    loading.value = true
+    // 先显示缓存的详情，同时重新拉取，避免展示事件未覆盖的过期内容
+    requestedContextId = contextId
+    const cached = contextDetails.value[contextId]
+    if (cached) {
+      currentContext.value = cached
+    } else {
+      loading.value = true
+    }
     error.value = null
     try {
       const response = await fetch(`/api/contexts/${contextId}`)
       if (!response.ok) throw new Error('获取上下文详情失败')
       const data = await response.json()
-      currentContext.value = data
+      if (!data.error) {
+        contextDetails.value[contextId] = data
+      } else {
+        delete contextDetails.value[contextId]
+      }
+      // 拉取期间已切换到其他上下文时不覆盖
+      if (requestedContextId === contextId) {
+        currentContext.value = data
+      }
       return data
     } catch (e) {
       error.value = e.message
       console.error('Failed to fetch context detail:', e)
-      return null
+      return cached || null
     } finally {
       loading.value = false
     }
@@ -80,6 +109,79 @@ export const useContextStore = defineStore('context', () => {
     combinedMemory.value = null
   }
 
+  function upsertContext(config) {
+    const index = contexts.value.findIndex(ctx => ctx.context_id === config.context_id)
+    if (index >= 0) {
+      contexts.value[index] = { ...contexts.value[index], ...config }
+    } else {
+      contexts.value.push(config)
+    }
+  }
+
+  function updateContextDetail(contextId, patch) {
+    const detail = contextDetails.value[contextId]
+    if (!detail) return
+    const updated = { ...detail, ...patch }
+    contextDetails.value[contextId] = updated
+    if (currentContext.value?.context_id === contextId) {
+      currentContext.value = updated
+    }
+  }
+
+  function removeContext(contextId) {
+    contexts.value = contexts.value.filter(ctx => ctx.context_id !== contextId)
+    delete contextDetails.value[contextId]
+    if (currentContext.value?.context_id === contextId) {
+      currentContext.value = null
+      combinedMemory.value = null
+    }
+  }
+
+  async function resync() {
+    contextDetails.value = {}
+    await fetchContexts()
+    if (currentContext.value?.context_id) {
+      await fetchContextDetail(currentContext.value.context_id)
+    }
+  }
+
+  const eventHandlers = {
+    'context.created': (contextId, data) => upsertContext(data),
+    'context.deleted': (contextId) => removeContext(contextId),
+    'tools.changed': (contextId, data) => updateContextDetail(contextId, { tools: data.tools }),
+    resync: () => resync()
+  }
+
+  function connectEvents() {
+    if (eventSource || typeof EventSource === 'undefined') return
+    eventSource = new EventSource('/api/events')
+    eventSource.onopen = () => {
+      live.value = true
+    }
+    eventSource.onerror = () => {
+      // 断线期间的变更由重连后的补发或resync事件覆盖，EventSource会自动重连
+      live.value = false
+    }
+    for (const [kind, handler] of Object.entries(eventHandlers)) {
+      eventSource.addEventListener(kind, (event) => {
+        try {
+          const payload = JSON.parse(event.data)
+          handler(payload.context_id, payload.data)
+        } catch (e) {
+          console.error(`Failed to apply ${kind} event:`, e)
+        }
+      })
+    }
+  }
+
+  function disconnectEvents() {
+    if (eventSource) {
+      eventSource.close()
+      eventSource = null
+    }
+    live.value = false
+  }
+
   return {
     contexts,
     currentContext,
@@ -87,11 +189,16 @@ export const useContextStore = defineStore('context', () => {
     memoryLoading,
     loading,
     error,
+    contextDetails,
+    live,
     sortedContexts,
+    ensureContexts,
     fetchContexts,
     fetchContextDetail,
     fetchCombinedMemory,
     clearCombinedMemory,
-    clearCurrentContext
+    clearCurrentContext,
+    connectEvents,
+    disconnectEvents
   }
 })